@@ -1,17 +1,94 @@
 import uvicorn
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from contextlib import asynccontextmanager, aclosing
+from pydantic import BaseModel, Field
+import json
 import time
 
 # --- ¡LA CONEXIÓN CLAVE! ---
 # Importamos tu función principal desde el archivo en la carpeta /scrapers
-from scrapers.farmacia_scrapers import comparar_precios_playwright
+from scrapers.farmacia_scrapers import (
+    SITIOS,
+    comparar_precios_detallado,
+    comparar_precios_stream,
+    comparar_precios_lote,
+    en_cache,
+    precalentar_keyword,
+    configurar_trabajadores,
+    obtener_trabajadores,
+)
+from scrapers.navegador import PoolNavegadores, configurar_pool
+from scrapers.http_rapido import cerrar_cliente
+from scrapers.cache import cache_resultados
+from scrapers.coalescencia import vuelos_busquedas, vuelos_sitios
+from scrapers.salud import salud_farmacias
+from scrapers.admision import Saturado, VigilanteMemoria, control_admision, control_lotes
+from scrapers.indice import indice_precios
+from scrapers.sugerencias import MAX_SUGERENCIAS, indice_sugerencias
+from scrapers.precalentador import Precalentador
+from scrapers.modelo import Farmacia, ORDENES, a_centimos, ordenar_y_filtrar
+from scrapers.emparejamiento import agrupar_productos
+from scrapers.trabajadores import ClienteTrabajadores
+from scrapers.config import LOTE_MAX_KEYWORDS, PRECALENTAR, SUGERENCIAS_MAX_ENTRADAS, TRABAJADORES
+from scrapers import metricas, recursos
 # --------------------------------
 
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Lanza el pool de Chromium una sola vez al arrancar la API
+    y lo cierra al apagarla. Los scrapers piden contextos al pool
+    en lugar de lanzar un navegador por llamada. También arranca el
+    vigilante de memoria (MEMORIA_MAX_MB) y el precalentador de keywords
+    populares (PRECALENTAR), y precarga las sugerencias con lo que ya
+    está en el índice de precios.
+
+    Con TRABAJADORES > 0 no se abre Chromium aquí: los scrapes se mandan
+    a los procesos trabajadores (ver scrapers/trabajadores.py), lanzando
+    el despachador si ningún otro worker de uvicorn lo hizo ya.
+    """
+    pool = None
+    cliente = None
+    if TRABAJADORES > 0:
+        cliente = ClienteTrabajadores()
+        await cliente.iniciar()
+        configurar_trabajadores(cliente)
+    else:
+        pool = PoolNavegadores()
+        await pool.iniciar()
+        configurar_pool(pool)
+    # Sin pool propio, el reciclaje se pide a los procesos trabajadores
+    vigilante = VigilanteMemoria(control_admision, pool or cliente)
+    vigilante.iniciar()
+    # Del más viejo al más reciente: ante un desalojo se conserva lo último
+    for keyword, productos in reversed(await indice_precios.ultimos_resultados(SUGERENCIAS_MAX_ENTRADAS)):
+        indice_sugerencias.registrar(keyword, productos)
+    precalentador = Precalentador(precalentar_keyword, list(SITIOS))
+    if PRECALENTAR:
+        precalentador.iniciar()
+    try:
+        yield
+    finally:
+        await precalentador.detener()
+        await vigilante.detener()
+        if cliente is not None:
+            configurar_trabajadores(None)
+            await cliente.cerrar()
+        else:
+            configurar_pool(None)
+            await pool.cerrar()
+        await cerrar_cliente()
+        indice_precios.cerrar()
+
+
 app = FastAPI(
     title="API de Scraper de Farmacias",
     description="Una API que compara precios de productos en farmacias peruanas usando Playwright.",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # --- CONFIGURACIÓN DE CORS ---
@@ -34,18 +111,109 @@ app.add_middleware(
 # -----------------------------
 
 
+@app.exception_handler(Saturado)
+async def servicio_saturado(request: Request, exc: Saturado):
+    """429 (cola llena) o 503 (espera agotada / memoria alta) con Retry-After."""
+    return JSONResponse(
+        status_code=exc.codigo,
+        content={"detail": "El servicio está ocupado, intenta de nuevo en unos segundos.", "motivo": exc.motivo},
+        headers={"Retry-After": str(exc.reintentar_s)},
+    )
+
+
 @app.get("/")
 def read_root():
     """Ruta raíz para verificar que el servidor está funcionando."""
     return {"status": "ok", "message": "Bienvenido al Scraper API de Farmacias"}
 
 
+@app.get("/estadisticas")
+def estadisticas():
+    """Contadores internos de la caché, de las búsquedas coalescidas, de la admisión y del filtro de peticiones."""
+    trabajadores = obtener_trabajadores()
+    return {
+        "cache": cache_resultados.estadisticas(),
+        "recursos": recursos.estadisticas(),
+        "indice": indice_precios.estadisticas(),
+        "sugerencias": indice_sugerencias.estadisticas(),
+        "admision": control_admision.estadisticas(),
+        "admision_lotes": control_lotes.estadisticas(),
+        "coalescencia": {
+            "busquedas": vuelos_busquedas.estadisticas(),
+            "sitios": vuelos_sitios.estadisticas(),
+        },
+        "trabajadores": trabajadores.estadisticas() if trabajadores is not None else None,
+    }
+
+
+@app.get("/salud")
+def salud():
+    """Estado del circuit breaker de cada farmacia: closed / open / half_open, tasa de error y latencia."""
+    return {"farmacias": salud_farmacias.estado()}
+
+
+@app.post("/salud/reiniciar")
+def reiniciar_salud(farmacia: str = None):
+    """Cierra a mano el circuito de una farmacia (o de todas si no se indica)."""
+    salud_farmacias.reiniciar(farmacia)
+    return {"status": "ok", "farmacias": salud_farmacias.estado()}
+
+
+@app.get("/metrics")
+def metrics():
+    """Métricas en formato Prometheus (latencia por farmacia y etapa, errores, en curso)."""
+    cuerpo, content_type = metricas.exportar()
+    return Response(content=cuerpo, media_type=content_type)
+
+
+@app.get("/sugerencias")
+async def sugerencias(
+    prefix: str = Query(..., min_length=1, max_length=100),
+    limite: int = Query(10, ge=1, le=MAX_SUGERENCIAS),
+):
+    """
+    Autocompletado instantáneo con lo ya scrapeado: keywords buscados antes
+    y nombres de productos que empiezan con 'prefix' (sin importar acentos
+    ni mayúsculas), los más populares primero. Buscar el 'keyword' de una
+    sugerencia suele responderse desde la caché o el índice de precios,
+    sin esperar un scrape. Con menos de 2 caracteres no hay sugerencias.
+    """
+    return {"prefix": prefix, "sugerencias": indice_sugerencias.sugerir(prefix, limite)}
+
+
+# Valores aceptados en el parámetro 'orden' (precio, -precio, descuento)
+_PATRON_ORDEN = "^(" + "|".join(ORDENES) + ")$"
+
+
 # --- ESTE ES TU ENDPOINT PRINCIPAL ---
 @app.get("/buscar_productos")
-async def buscar_productos(keyword: str):
+async def buscar_productos(
+    keyword: str,
+    max_items: int = Query(15, ge=1, le=100),
+    deadline_ms: int = Query(None, ge=100, le=300000),
+    orden: str = Query(None, pattern=_PATRON_ORDEN),
+    precio_min: float = Query(None, ge=0),
+    precio_max: float = Query(None, ge=0),
+    farmacia: list[Farmacia] = Query(None),
+    top: int = Query(None, ge=1, le=500),
+    agrupar: bool = False,
+):
     """
     Recibe un 'keyword' (término de búsqueda) y devuelve una lista 
     de productos encontrados en las diferentes farmacias.
+    En 'sitios' se indica por farmacia si el resultado vino en vivo,
+    de la caché o del índice de precios ('fuente') y su antigüedad ('edad_s').
+    Con 'deadline_ms' la respuesta llega como mucho en ese tiempo, con
+    las farmacias que no alcanzaron marcadas como 'timeout'.
+
+    Cada producto trae además sus precios en céntimos y el descuento (%).
+    Filtros opcionales: 'farmacia' (repetible; solo se scrapean esas),
+    'precio_min' / 'precio_max' en soles, 'orden' (precio, -precio,
+    descuento) y 'top' (los N primeros tras ordenar).
+
+    Con 'agrupar', 'grupos' junta el mismo producto de distintas farmacias
+    (mismo nombre base, concentración y unidades) con el precio mínimo y
+    máximo de cada uno.
     """
     
     if not keyword or not keyword.strip():
@@ -53,11 +221,27 @@ async def buscar_productos(keyword: str):
         
     print(f"--- 🚀 INICIANDO BÚSQUEDA PARA: {keyword} ---")
     start_time = time.time()
+    indice_precios.registrar_consulta(keyword)
+    
+    metricas.BUSQUEDAS_EN_CURSO.labels("buscar_productos").inc()
     
     try:
         # Llamamos a tu función de scraping asíncrona
         # Esta es la función que lanza los 5 scrapers en paralelo
-        resultados = await comparar_precios_playwright(keyword)
+        # (si hay que scrapear en vivo, espera turno en el control de admisión)
+        comparacion = await comparar_precios_detallado(
+            keyword, max_items, deadline_ms=deadline_ms, farmacias=farmacia, admision=control_admision
+        )
+        # Lista nueva: el resultado puede estar compartido con otras peticiones
+        resultados = ordenar_y_filtrar(
+            comparacion["productos"],
+            orden=orden,
+            precio_min_centimos=a_centimos(precio_min),
+            precio_max_centimos=a_centimos(precio_max),
+            top=top,
+        )
+        # Estado por farmacia: ok / empty / error / timeout
+        sitios = comparacion["sitios"]
         
         end_time = time.time()
         total_time = end_time - start_time
@@ -65,10 +249,15 @@ async def buscar_productos(keyword: str):
         
         if not resultados:
             # Si la lista está vacía, igual damos una respuesta exitosa
-            return {"data": [], "message": "No se encontraron productos para este término."}
-        
-        return {"data": resultados, "message": f"Se encontraron {len(resultados)} productos."}
+            respuesta = {"data": [], "sitios": sitios, "message": "No se encontraron productos para este término."}
+        else:
+            respuesta = {"data": resultados, "sitios": sitios, "message": f"Se encontraron {len(resultados)} productos."}
+        if agrupar:
+            respuesta["grupos"] = agrupar_productos(resultados)
+        return respuesta
 
+    except Saturado:
+        raise
     except Exception as e:
         end_time = time.time()
         total_time = end_time - start_time
@@ -78,6 +267,150 @@ async def buscar_productos(keyword: str):
             status_code=500,
             detail=f"Ocurrió un error interno en el servidor: {str(e)}"
         )
+    finally:
+        metricas.BUSQUEDAS_EN_CURSO.labels("buscar_productos").dec()
+        metricas.BUSQUEDA_SEGUNDOS.labels("buscar_productos").observe(time.time() - start_time)
+# --------------------------------------
+
+
+def _evento(tipo: str, datos: dict, formato: str) -> str:
+    """Serializa un evento como línea NDJSON o como mensaje SSE."""
+    if formato == "sse":
+        return f"event: {tipo}\ndata: {json.dumps(datos, ensure_ascii=False)}\n\n"
+    return json.dumps({"tipo": tipo, **datos}, ensure_ascii=False) + "\n"
+
+
+# --- VERSIÓN EN STREAMING DEL ENDPOINT PRINCIPAL ---
+@app.get("/buscar_productos/stream")
+async def buscar_productos_stream(
+    request: Request,
+    keyword: str,
+    max_items: int = Query(15, ge=1, le=100),
+    formato: str = Query("ndjson", pattern="^(ndjson|sse)$"),
+    deadline_ms: int = Query(None, ge=100, le=300000),
+    precio_min: float = Query(None, ge=0),
+    precio_max: float = Query(None, ge=0),
+    farmacia: list[Farmacia] = Query(None),
+):
+    """
+    Igual que /buscar_productos, pero envía los productos de cada farmacia
+    apenas termina su scraper (NDJSON o Server-Sent Events) y cierra con
+    un evento 'resumen' con tiempos y errores por sitio. Acepta los mismos
+    filtros 'farmacia' y 'precio_min' / 'precio_max' (el orden global no
+    aplica: cada evento trae solo una farmacia).
+    Si el cliente se desconecta, se cancelan los scrapers pendientes.
+    Si el servicio se satura después de aceptar la petición, el stream
+    termina con un evento 'error'.
+    """
+    if not keyword or not keyword.strip():
+        raise HTTPException(status_code=400, detail="El parámetro 'keyword' es requerido y no puede estar vacío.")
+
+    # Rechazo temprano con 429/503 si hay que scrapear; el turno se toma dentro del stream
+    if not en_cache(keyword, max_items, farmacia):
+        control_admision.verificar()
+    print(f"--- 🚀 INICIANDO BÚSQUEDA (STREAM) PARA: {keyword} ---")
+    indice_precios.registrar_consulta(keyword)
+
+    async def eventos():
+        start_time = time.time()
+        total = 0
+        sitios = []
+        en_curso = metricas.BUSQUEDAS_EN_CURSO.labels("buscar_productos_stream")
+        en_curso.inc()
+        try:
+            resultados = comparar_precios_stream(
+                keyword, max_items, deadline_ms=deadline_ms, farmacias=farmacia, admision=control_admision
+            )
+            async with aclosing(resultados):
+                async for resultado in resultados:
+                    if await request.is_disconnected():
+                        print(f"--- ⚠️ Cliente desconectado, cancelando búsqueda de {keyword} ---")
+                        return
+                    productos = ordenar_y_filtrar(
+                        resultado.productos,
+                        precio_min_centimos=a_centimos(precio_min),
+                        precio_max_centimos=a_centimos(precio_max),
+                    )
+                    total += len(productos)
+                    sitios.append(resultado.resumen())
+                    yield _evento("sitio", {**resultado.resumen(), "data": productos}, formato)
+
+            total_time = time.time() - start_time
+            print(f"--- ✅ BÚSQUEDA (STREAM) FINALIZADA. {total} productos en {total_time:.2f} segundos. ---")
+            yield _evento("resumen", {"total": total, "tiempo_s": round(total_time, 2), "sitios": sitios}, formato)
+        except Saturado as e:
+            yield _evento("error", {"motivo": e.motivo, "reintentar_s": e.reintentar_s}, formato)
+        finally:
+            en_curso.dec()
+            metricas.BUSQUEDA_SEGUNDOS.labels("buscar_productos_stream").observe(time.time() - start_time)
+
+    media_type = "text/event-stream" if formato == "sse" else "application/x-ndjson"
+    return StreamingResponse(eventos(), media_type=media_type, headers={"Cache-Control": "no-cache"})
+# --------------------------------------
+
+
+class SolicitudLote(BaseModel):
+    keywords: list[str] = Field(..., min_length=1, max_length=LOTE_MAX_KEYWORDS)
+    max_items: int = Field(15, ge=1, le=100)
+
+
+# --- BÚSQUEDA POR LOTE (muchos keywords en una llamada) ---
+@app.post("/buscar_productos/lote")
+async def buscar_productos_lote(
+    request: Request,
+    solicitud: SolicitudLote,
+    formato: str = Query("ndjson", pattern="^(ndjson|sse)$"),
+):
+    """
+    Busca una lista de keywords en todas las farmacias (p. ej. una receta
+    o una sincronización de catálogo) reutilizando los mismos navegadores.
+    Envía un evento 'keyword' con los productos y el estado por farmacia
+    apenas termina cada keyword, y cierra con un evento 'resumen'.
+    Cada farmacia recibe como mucho LOTE_CONCURRENCIA_POR_SITIO scrapes
+    a la vez, separados por LOTE_INTERVALO_MS.
+    """
+    keywords = [k for k in solicitud.keywords if k and k.strip()]
+    if not keywords:
+        raise HTTPException(status_code=400, detail="El lote no tiene ningún keyword válido.")
+
+    control_lotes.verificar()
+    print(f"--- 🚀 INICIANDO LOTE DE {len(keywords)} KEYWORDS ---")
+
+    async def eventos():
+        start_time = time.time()
+        total = 0
+        procesados = 0
+        en_curso = metricas.BUSQUEDAS_EN_CURSO.labels("buscar_productos_lote")
+        en_curso.inc()
+        try:
+            async with control_lotes.admitir():
+                resultados = comparar_precios_lote(keywords, solicitud.max_items)
+                async with aclosing(resultados):
+                    async for keyword, sitios in resultados:
+                        if await request.is_disconnected():
+                            print("--- ⚠️ Cliente desconectado, cancelando el lote ---")
+                            return
+                        productos = [p for sitio in sitios for p in sitio.productos]
+                        total += len(productos)
+                        procesados += 1
+                        yield _evento("keyword", {
+                            "keyword": keyword,
+                            "productos": len(productos),
+                            "sitios": [sitio.resumen() for sitio in sitios],
+                            "data": productos,
+                        }, formato)
+
+            total_time = time.time() - start_time
+            print(f"--- ✅ LOTE FINALIZADO. {procesados} keywords, {total} productos en {total_time:.2f} segundos. ---")
+            yield _evento("resumen", {"keywords": procesados, "total": total, "tiempo_s": round(total_time, 2)}, formato)
+        except Saturado as e:
+            yield _evento("error", {"motivo": e.motivo, "reintentar_s": e.reintentar_s}, formato)
+        finally:
+            en_curso.dec()
+            metricas.BUSQUEDA_SEGUNDOS.labels("buscar_productos_lote").observe(time.time() - start_time)
+
+    media_type = "text/event-stream" if formato == "sse" else "application/x-ndjson"
+    return StreamingResponse(eventos(), media_type=media_type, headers={"Cache-Control": "no-cache"})
 # --------------------------------------
 
 
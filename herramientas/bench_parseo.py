@@ -0,0 +1,112 @@
+"""
+Benchmark offline del parseo de cada farmacia.
+
+Modo parseo (por defecto): corre las funciones puras de scrapers/parsers.py
+sobre los HTML sintéticos de herramientas/fixtures/ (escritos a mano, más
+limpios que las páginas reales) y reporta, por sitio, tiempo por parseo,
+pico de memoria asignada y productos extraídos:
+
+    python -m herramientas.bench_parseo --iteraciones 200 --max-items 15
+
+Modo e2e: levanta el servidor local de farmacias simuladas, apunta los
+scrapers a él y mide el tiempo de punta a punta de cada sitio
+(navegador / HTTP directo + espera + extracción). Necesita Chromium:
+
+    python -m herramientas.bench_parseo --e2e --iteraciones 5
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import time
+import tracemalloc
+
+from herramientas.servidor_farmacias import FIXTURES_DIR, iniciar_servidor, variables_entorno
+
+
+def _casos_parseo():
+    from scrapers import parsers
+    return [
+        ("Inkafarma", "inkafarma_sintetico.html", lambda html, n: parsers.parsear_inkafarma_html(html, "Inkafarma", n)),
+        ("Mifarma", "mifarma_sintetico.html", lambda html, n: parsers.parsear_inkafarma_html(html, "Mifarma", n)),
+        ("BoticasPeru", "boticasperu_sintetico.html", parsers.parsear_boticasperu_html),
+        ("Boticas y Salud", "boticasysalud_sintetico.html", parsers.parsear_boticasysalud_html),
+        ("Farmacia Universal", "farmaciauniversal_sintetico.html", parsers.parsear_farmaciauniversal_html),
+    ]
+
+
+def _percentil(valores: list, p: float) -> float:
+    ordenados = sorted(valores)
+    indice = min(len(ordenados) - 1, max(0, round(p / 100 * (len(ordenados) - 1))))
+    return ordenados[indice]
+
+
+def _fila(sitio, productos, tiempos_ms, extra=""):
+    print(f"{sitio:<20} {productos:>9} {statistics.mean(tiempos_ms):>10.2f} "
+          f"{_percentil(tiempos_ms, 50):>10.2f} {_percentil(tiempos_ms, 95):>10.2f} {extra}")
+
+
+def bench_parseo(iteraciones: int, max_items: int):
+    print("Parseo sobre HTML sintético (herramientas/fixtures/*_sintetico.html), no sobre páginas reales")
+    print(f"{'sitio':<20} {'productos':>9} {'media ms':>10} {'p50 ms':>10} {'p95 ms':>10} {'pico KiB':>10}")
+    for sitio, archivo, parsear in _casos_parseo():
+        with open(os.path.join(FIXTURES_DIR, archivo), encoding="utf-8") as f:
+            html = f.read()
+
+        productos = parsear(html, max_items)  # calentamiento
+
+        tiempos_ms = []
+        for _ in range(iteraciones):
+            inicio = time.perf_counter()
+            parsear(html, max_items)
+            tiempos_ms.append((time.perf_counter() - inicio) * 1000)
+
+        # Memoria en una pasada aparte: tracemalloc distorsiona los tiempos
+        tracemalloc.start()
+        parsear(html, max_items)
+        _, pico = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        _fila(sitio, len(productos), tiempos_ms, f"{pico / 1024:>10.0f}")
+
+
+async def _bench_e2e(iteraciones: int, max_items: int, keyword: str):
+    # Importar después de fijar las *_URL: la config se lee al importar
+    from scrapers.farmacia_scrapers import SITIOS
+
+    print(f"{'sitio':<20} {'productos':>9} {'media ms':>10} {'p50 ms':>10} {'p95 ms':>10}")
+    for sitio, scraper in SITIOS.items():
+        tiempos_ms = []
+        productos = []
+        for _ in range(iteraciones):
+            inicio = time.perf_counter()
+            try:
+                productos = await scraper(keyword, max_items)
+            except Exception as e:
+                print(f"   ❌ {sitio}: {e}")
+                productos = []
+            tiempos_ms.append((time.perf_counter() - inicio) * 1000)
+        _fila(sitio, len(productos), tiempos_ms)
+
+
+def bench_e2e(iteraciones: int, max_items: int, keyword: str):
+    servidor = iniciar_servidor()
+    os.environ.update(variables_entorno(servidor))
+    try:
+        asyncio.run(_bench_e2e(iteraciones, max_items, keyword))
+    finally:
+        servidor.shutdown()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iteraciones", type=int, default=100)
+    parser.add_argument("--max-items", type=int, default=15)
+    parser.add_argument("--e2e", action="store_true", help="mide scrapers completos contra el servidor local")
+    parser.add_argument("--keyword", default="paracetamol")
+    args = parser.parse_args()
+
+    if args.e2e:
+        bench_e2e(args.iteraciones, args.max_items, args.keyword)
+    else:
+        bench_parseo(args.iteraciones, args.max_items)
@@ -0,0 +1,333 @@
+"""
+Prueba de carga de /buscar_productos contra farmacias simuladas.
+
+Levanta el servidor local de farmacias (herramientas/servidor_farmacias.py)
+con la demora, el render diferido y la tasa de fallos pedidos, arranca la
+API (uvicorn app:app) apuntando sus *_URL a ese servidor y la carga con:
+
+  - usuarios concurrentes: N usuarios que buscan uno tras otro
+        python -m herramientas.prueba_carga --concurrencia 4 --duracion 60
+  - tasa fija (lazo abierto): una búsqueda cada 1/T segundos, haya o no
+    respuesta a las anteriores
+        python -m herramientas.prueba_carga --tasa 0.5 --peticiones 40 --render-ms 2000
+
+Reporta throughput, latencia p50/p95/p99, tasa de error (por código HTTP
+y por farmacia) y el pico de RSS de la API y de los procesos del
+navegador (driver de Playwright + Chromium), leído de /proc. Cada
+búsqueda usa un keyword distinto para no medir la caché (--con-cache
+repite los keywords). La configuración de la API se ajusta con --env:
+
+    python -m herramientas.prueba_carga --concurrencia 8 --duracion 120 \\
+        --env POOL_MAX_CONTEXTOS=8 --env ADMISION_MAX_BUSQUEDAS=4 --json carga.json
+
+Con --url no se arranca la API: debe tener sus *_URL apuntando al
+servidor simulado (fijar su puerto con --puerto-farmacias); el RSS se
+mide solo si se indica su --pid.
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import signal
+import socket
+import subprocess
+import sys
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+
+import httpx
+
+from herramientas.bench_parseo import _percentil
+from herramientas.servidor_farmacias import (
+    agregar_argumentos_simulacion,
+    iniciar_servidor,
+    simulacion_desde_argumentos,
+    variables_entorno,
+)
+from scrapers.admision import rss_procesos
+from scrapers.planificador import ESTADO_ERROR, ESTADO_TIMEOUT
+
+RAIZ_REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Nombres de proceso (/proc/<pid>/stat, truncados a 15 caracteres) que
+# cuentan como navegador: Chromium y el driver de Playwright (node)
+_PREFIJOS_NAVEGADOR = ("chrom", "headless_shell", "node")
+
+
+@dataclass
+class Medicion:
+    latencia_s: float
+    codigo: object                                    # 200, 503, ... o el nombre de la excepción
+    sitios_con_error: list = field(default_factory=list)
+
+    @property
+    def ok(self) -> bool:
+        return self.codigo == 200
+
+
+@dataclass
+class PicoRSS:
+    app_mb: float = 0.0
+    navegador_mb: float = 0.0
+    total_mb: float = 0.0
+    procesos: int = 0
+    muestras: int = 0
+
+
+# =============================================
+# API BAJO PRUEBA
+# =============================================
+def _puerto_libre() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def arrancar_api(entorno: dict, puerto: int, workers: int, log: str) -> subprocess.Popen:
+    """uvicorn app:app en un proceso (y grupo de procesos) propio."""
+    comando = [sys.executable, "-m", "uvicorn", "app:app", "--host", "127.0.0.1", "--port", str(puerto),
+               "--workers", str(workers)]
+    salida = open(log, "w")
+    return subprocess.Popen(comando, cwd=RAIZ_REPO, env=entorno, stdout=salida, stderr=subprocess.STDOUT,
+                            start_new_session=True)
+
+
+def detener_api(proceso: subprocess.Popen, espera_s: float = 20):
+    """SIGTERM (cierra el pool de navegadores en el lifespan); SIGKILL al grupo si no termina."""
+    if proceso.poll() is not None:
+        return
+    proceso.terminate()
+    try:
+        proceso.wait(espera_s)
+    except subprocess.TimeoutExpired:
+        os.killpg(proceso.pid, signal.SIGKILL)
+        proceso.wait()
+
+
+async def esperar_api(url: str, proceso: subprocess.Popen = None, espera_s: float = 90):
+    limite = time.monotonic() + espera_s
+    async with httpx.AsyncClient(base_url=url, timeout=5) as cliente:
+        while time.monotonic() < limite:
+            if proceso is not None and proceso.poll() is not None:
+                raise RuntimeError(f"La API terminó al arrancar (código {proceso.returncode})")
+            try:
+                if (await cliente.get("/")).status_code == 200:
+                    return
+            except httpx.HTTPError:
+                pass
+            await asyncio.sleep(0.5)
+    raise RuntimeError(f"La API no respondió en {espera_s:.0f}s")
+
+
+# =============================================
+# MEDICIÓN
+# =============================================
+async def muestrear_rss(pid: int, pico: PicoRSS, intervalo_s: float = 0.5):
+    """Actualiza `pico` con el RSS de `pid` y sus descendientes hasta ser cancelada."""
+    while True:
+        procesos = await asyncio.to_thread(rss_procesos, pid)
+        navegador = sum(mb for _, nombre, mb in procesos if nombre.startswith(_PREFIJOS_NAVEGADOR))
+        total = sum(mb for _, _, mb in procesos)
+        pico.app_mb = max(pico.app_mb, total - navegador)
+        pico.navegador_mb = max(pico.navegador_mb, navegador)
+        pico.total_mb = max(pico.total_mb, total)
+        pico.procesos = max(pico.procesos, len(procesos))
+        pico.muestras += 1
+        await asyncio.sleep(intervalo_s)
+
+
+async def buscar(cliente: httpx.AsyncClient, keyword: str, max_items: int, deadline_ms: int = None) -> Medicion:
+    params = {"keyword": keyword, "max_items": max_items}
+    if deadline_ms:
+        params["deadline_ms"] = deadline_ms
+    inicio = time.perf_counter()
+    try:
+        respuesta = await cliente.get("/buscar_productos", params=params)
+        codigo = respuesta.status_code
+        sitios = respuesta.json().get("sitios", []) if codigo == 200 else []
+    except httpx.HTTPError as e:
+        codigo, sitios = type(e).__name__, []
+    return Medicion(
+        time.perf_counter() - inicio,
+        codigo,
+        [s["farmacia"] for s in sitios if s.get("estado") in (ESTADO_ERROR, ESTADO_TIMEOUT)],
+    )
+
+
+# =============================================
+# GENERADORES DE CARGA
+# =============================================
+def _keywords(base: list, con_cache: bool):
+    """Keywords cíclicos; sin caché cada uno lleva un número distinto."""
+    for n, keyword in enumerate(itertools.cycle(base)):
+        yield keyword if con_cache else f"{keyword} {n}"
+
+
+async def carga_concurrente(cliente, keywords, args, fin: float) -> list:
+    """`concurrencia` usuarios que lanzan la siguiente búsqueda al recibir la anterior."""
+    mediciones = []
+    lanzadas = itertools.count()
+
+    async def usuario():
+        while time.monotonic() < fin:
+            if args.peticiones and next(lanzadas) >= args.peticiones:
+                return
+            mediciones.append(await buscar(cliente, next(keywords), args.max_items, args.deadline_ms))
+
+    await asyncio.gather(*(usuario() for _ in range(args.concurrencia)))
+    return mediciones
+
+
+async def carga_tasa(cliente, keywords, args, fin: float) -> list:
+    """Una búsqueda cada 1/tasa segundos, sin esperar respuestas (lazo abierto)."""
+    tareas = []
+    siguiente = time.monotonic()
+    while time.monotonic() < fin and not (args.peticiones and len(tareas) >= args.peticiones):
+        tareas.append(asyncio.create_task(buscar(cliente, next(keywords), args.max_items, args.deadline_ms)))
+        siguiente += 1 / args.tasa
+        await asyncio.sleep(max(0.0, siguiente - time.monotonic()))
+    return list(await asyncio.gather(*tareas))
+
+
+# =============================================
+# REPORTE
+# =============================================
+def resumir(mediciones: list, duracion_s: float, pico: PicoRSS, fallos_inyectados: dict) -> dict:
+    latencias_ms = [m.latencia_s * 1000 for m in mediciones] or [0.0]
+    correctas = [m for m in mediciones if m.ok]
+    resumen = {
+        "peticiones": len(mediciones),
+        "correctas": len(correctas),
+        "tasa_error_pct": round(100 * (1 - len(correctas) / len(mediciones)), 2) if mediciones else 0.0,
+        "duracion_s": round(duracion_s, 2),
+        "throughput_rps": round(len(correctas) / duracion_s, 3) if duracion_s else 0.0,
+        "latencia_ms": {
+            "p50": round(_percentil(latencias_ms, 50), 1),
+            "p95": round(_percentil(latencias_ms, 95), 1),
+            "p99": round(_percentil(latencias_ms, 99), 1),
+            "max": round(max(latencias_ms), 1),
+        },
+        "codigos": {str(c): n for c, n in Counter(m.codigo for m in mediciones).most_common()},
+        "sitios_con_error": dict(Counter(f for m in correctas for f in m.sitios_con_error).most_common()),
+        "fallos_inyectados": {s: c["fallos"] for s, c in sorted(fallos_inyectados.items()) if c["fallos"]},
+    }
+    if pico.muestras:
+        resumen["rss_pico_mb"] = {
+            "app": round(pico.app_mb, 1),
+            "navegador": round(pico.navegador_mb, 1),
+            "total": round(pico.total_mb, 1),
+            "procesos": pico.procesos,
+        }
+    return resumen
+
+
+def imprimir_resumen(r: dict):
+    lat = r["latencia_ms"]
+    print()
+    print(f"peticiones          {r['peticiones']} ({r['correctas']} correctas, {r['tasa_error_pct']} % error)")
+    print(f"duración            {r['duracion_s']} s")
+    print(f"throughput          {r['throughput_rps']} búsquedas/s")
+    print(f"latencia ms         p50 {lat['p50']}  p95 {lat['p95']}  p99 {lat['p99']}  max {lat['max']}")
+    print(f"códigos             {', '.join(f'{c}: {n}' for c, n in r['codigos'].items()) or '-'}")
+    print(f"sitios con error    {', '.join(f'{s}: {n}' for s, n in r['sitios_con_error'].items()) or '-'}")
+    print(f"503 inyectados      {', '.join(f'{s}: {n}' for s, n in r['fallos_inyectados'].items()) or '-'}")
+    if "rss_pico_mb" in r:
+        rss = r["rss_pico_mb"]
+        print(f"RSS pico MB         app {rss['app']}  navegador {rss['navegador']}  "
+              f"total {rss['total']} ({rss['procesos']} procesos)")
+
+
+# =============================================
+# PRINCIPAL
+# =============================================
+async def prueba_carga(args) -> dict:
+    simulacion, simulaciones = simulacion_desde_argumentos(args)
+    contadores = {}
+    servidor = iniciar_servidor(puerto=args.puerto_farmacias, simulacion=simulacion, simulaciones=simulaciones, contadores=contadores)
+
+    proceso = None
+    pid = args.pid
+    url = args.url
+    try:
+        if url is None:
+            entorno = dict(os.environ)
+            entorno.update(variables_entorno(servidor))
+            # Sin índice ni precalentamiento: solo se miden las búsquedas de la prueba
+            entorno.update({"INDICE_DB": "", "PRECALENTAR": "0", "PYTHONUNBUFFERED": "1"})
+            entorno.update(dict(par.split("=", 1) for par in args.env))
+            puerto = _puerto_libre()
+            url = f"http://127.0.0.1:{puerto}"
+            print(f"🚀 Arrancando la API en {url} (log en {args.log})")
+            proceso = arrancar_api(entorno, puerto, args.workers, args.log)
+            pid = proceso.pid
+        else:
+            print(f"🎯 API externa en {url}; sus *_URL deben apuntar a:")
+            for variable, valor in variables_entorno(servidor).items():
+                print(f"   {variable}={valor}")
+        await esperar_api(url, proceso)
+
+        pico = PicoRSS()
+        muestreo = asyncio.create_task(muestrear_rss(pid, pico)) if pid else None
+        limites = httpx.Limits(max_connections=None, max_keepalive_connections=max(args.concurrencia, 10))
+        keywords = _keywords(args.keywords.split(","), args.con_cache)
+        async with httpx.AsyncClient(base_url=url, timeout=args.timeout_s, limits=limites) as cliente:
+            for _ in range(args.calentamiento):
+                await buscar(cliente, next(keywords), args.max_items)
+            for cuenta in contadores.values():
+                cuenta["fallos"] = 0
+
+            modo = f"tasa {args.tasa}/s" if args.tasa else f"concurrencia {args.concurrencia}"
+            print(f"📈 Carga: {modo}, duración {args.duracion}s, peticiones {args.peticiones or 'sin límite'}")
+            inicio = time.monotonic()
+            fin = inicio + args.duracion
+            if args.tasa:
+                mediciones = await carga_tasa(cliente, keywords, args, fin)
+            else:
+                mediciones = await carga_concurrente(cliente, keywords, args, fin)
+            duracion = time.monotonic() - inicio
+
+        if muestreo is not None:
+            muestreo.cancel()
+        return resumir(mediciones, duracion, pico, contadores)
+    finally:
+        if proceso is not None:
+            detener_api(proceso)
+        servidor.shutdown()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    modo = parser.add_mutually_exclusive_group()
+    modo.add_argument("--concurrencia", type=int, default=2, help="usuarios simultáneos (por defecto)")
+    modo.add_argument("--tasa", type=float, help="búsquedas por segundo, lazo abierto")
+    parser.add_argument("--duracion", type=float, default=60, help="segundos de carga")
+    parser.add_argument("--peticiones", type=int, default=0, help="tope de búsquedas (0 = solo --duracion)")
+    parser.add_argument("--calentamiento", type=int, default=1, help="búsquedas descartadas antes de medir")
+    parser.add_argument("--keywords", default="paracetamol,ibuprofeno,vitamina c,amoxicilina")
+    parser.add_argument("--con-cache", action="store_true", help="repite keywords (mide caché y coalescencia)")
+    parser.add_argument("--max-items", type=int, default=15)
+    parser.add_argument("--deadline-ms", type=int)
+    parser.add_argument("--timeout-s", type=float, default=180, help="timeout del cliente por búsqueda")
+    parser.add_argument("--url", help="API ya levantada (no se arranca una)")
+    parser.add_argument("--puerto-farmacias", type=int, default=0,
+                        help="puerto del servidor simulado (0 = uno libre; fijo para usar con --url)")
+    parser.add_argument("--pid", type=int, help="pid de la API externa para medir su RSS")
+    parser.add_argument("--workers", type=int, default=1, help="workers de uvicorn")
+    parser.add_argument("--env", action="append", default=[], metavar="CLAVE=VALOR",
+                        help="variable de entorno extra para la API (repetible)")
+    parser.add_argument("--log", default="/tmp/prueba_carga_api.log", help="salida de la API")
+    parser.add_argument("--json", help="guarda el resumen en este archivo")
+    agregar_argumentos_simulacion(parser)
+    args = parser.parse_args()
+
+    try:
+        resumen = asyncio.run(prueba_carga(args))
+    except RuntimeError as e:
+        print(f"❌ {e} (ver {args.log})")
+        sys.exit(1)
+    imprimir_resumen(resumen)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(resumen, f, indent=2, ensure_ascii=False)
@@ -0,0 +1,226 @@
+"""
+Servidor local que imita a las farmacias con páginas sintéticas.
+
+Sirve los archivos de herramientas/fixtures/ (<sitio>_sintetico.*) bajo
+un prefijo por sitio, ignorando la query (siempre la misma respuesta).
+Los fixtures están escritos a mano imitando la estructura de tarjetas de
+cada sitio: no son capturas de los sitios reales (no traen sus scripts,
+trackers ni el marcado irregular), así que los tiempos de parseo medidos
+sobre ellos son optimistas. Sirve para probar los scrapers y el camino HTTP directo sin
+depender de los sitios reales:
+
+    python -m herramientas.servidor_farmacias --puerto 8765
+
+Cada sitio puede simular un sitio real lento o inestable: demora de la
+respuesta, productos que se pintan con JS un tiempo después de cargar la
+página y un porcentaje de respuestas 503 (ver Simulacion):
+
+    python -m herramientas.servidor_farmacias --retraso-ms 300 --render-ms 1500 \\
+        --sitio inkafarma:fallos_pct=10 --sitio farmaciauniversal:render_ms=4000
+
+    INKAFARMA_URL=http://127.0.0.1:8765/inkafarma \\
+    MIFARMA_URL=http://127.0.0.1:8765/mifarma \\
+    BOTICASPERU_URL=http://127.0.0.1:8765/boticasperu \\
+    BOTICASYSALUD_URL=http://127.0.0.1:8765/boticasysalud \\
+    FARMACIAUNIVERSAL_URL=http://127.0.0.1:8765/farmaciauniversal \\
+    uvicorn app:app
+"""
+import argparse
+import json
+import os
+import random
+import threading
+import time
+from dataclasses import asdict, dataclass, fields, replace
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+HTML = "text/html; charset=utf-8"
+
+# (prefijo de ruta, fixture, content-type); gana el primero que coincide
+RUTAS = [
+    ("/inkafarma/buscador", "inkafarma_sintetico.html", HTML),
+    ("/mifarma/buscador", "mifarma_sintetico.html", HTML),
+    ("/boticasperu/catalogsearch/result", "boticasperu_sintetico.html", HTML),
+    ("/boticasysalud/tienda/busqueda", "boticasysalud_sintetico.html", HTML),
+    ("/farmaciauniversal/api/catalog_system/pub/products/search", "farmaciauniversal_api_sintetico.json", "application/json; charset=utf-8"),
+    ("/farmaciauniversal/", "farmaciauniversal_sintetico.html", HTML),  # /<keyword>?_q=...&map=ft
+]
+
+# Variable de entorno de la URL base de cada sitio simulado
+SITIOS_SIMULADOS = {
+    "INKAFARMA_URL": "inkafarma",
+    "MIFARMA_URL": "mifarma",
+    "BOTICASPERU_URL": "boticasperu",
+    "BOTICASYSALUD_URL": "boticasysalud",
+    "FARMACIAUNIVERSAL_URL": "farmaciauniversal",
+}
+
+
+@dataclass(frozen=True)
+class Simulacion:
+    """Comportamiento de un sitio simulado (por defecto: responde al instante y nunca falla)."""
+    retraso_ms: int = 0       # demora antes de responder (servidor lento)
+    variacion_ms: int = 0     # +- aleatorio sobre retraso_ms
+    render_ms: int = 0        # los productos se insertan con JS N ms después de cargar el HTML
+    fallos_pct: float = 0.0   # porcentaje de respuestas 503
+
+
+def parsear_simulaciones(base: Simulacion, por_sitio: list) -> dict:
+    """
+    Convierte ['inkafarma:render_ms=3000,fallos_pct=5', ...] en
+    {"inkafarma": Simulacion(...)}; lo no indicado se toma de `base`.
+    """
+    tipos = {campo.name: type(getattr(base, campo.name)) for campo in fields(Simulacion)}
+    simulaciones = {}
+    for texto in por_sitio or []:
+        sitio, _, ajustes = texto.partition(":")
+        cambios = {}
+        for ajuste in filter(None, ajustes.split(",")):
+            campo, _, valor = ajuste.partition("=")
+            if campo.strip() not in tipos:
+                raise ValueError(f"Ajuste desconocido {campo!r}; válidos: {', '.join(tipos)}")
+            cambios[campo.strip()] = tipos[campo.strip()](valor)
+        sitio = sitio.strip()
+        simulaciones[sitio] = replace(simulaciones.get(sitio, base), **cambios)
+    return simulaciones
+
+
+def _con_render_diferido(cuerpo: bytes, render_ms: int) -> bytes:
+    """
+    Mueve el contenido del <body> a un <template> que un script inserta
+    `render_ms` después de cargar: como un SPA, las tarjetas no existen en
+    el DOM al llegar a 'domcontentloaded'. Tampoco las ve el camino HTTP
+    directo (BeautifulSoup ignora el texto de un <template>), que cae al
+    navegador como con un sitio sin SSR.
+    """
+    html = cuerpo.decode("utf-8")
+    inicio = html.find(">", html.find("<body")) + 1
+    fin = html.rfind("</body>")
+    if inicio <= 0 or fin < inicio:
+        return cuerpo
+    script = (
+        "<script>setTimeout(function(){"
+        "document.body.replaceChildren(document.getElementById('render-diferido').content.cloneNode(true));"
+        f"}}, {int(render_ms)});</script>"
+    )
+    html = f'{html[:inicio]}<template id="render-diferido">{html[inicio:fin]}</template>{script}{html[fin:]}'
+    return html.encode("utf-8")
+
+
+class ManejadorFarmacias(BaseHTTPRequestHandler):
+    rutas = RUTAS
+    # Simulación por defecto y por sitio (primer segmento de la ruta)
+    simulacion = Simulacion()
+    simulaciones = {}
+    contadores = None  # dict compartido {sitio: {"respuestas": n, "fallos": n}} si se quiere contar
+
+    def _simular(self, sitio: str) -> Simulacion:
+        simulacion = self.simulaciones.get(sitio, self.simulacion)
+        if simulacion.retraso_ms or simulacion.variacion_ms:
+            variacion = random.uniform(-simulacion.variacion_ms, simulacion.variacion_ms)
+            time.sleep(max(0.0, simulacion.retraso_ms + variacion) / 1000)
+        return simulacion
+
+    def _contar(self, sitio: str, fallo: bool):
+        if self.contadores is not None:
+            cuenta = self.contadores.setdefault(sitio, {"respuestas": 0, "fallos": 0})
+            cuenta["respuestas"] += 1
+            cuenta["fallos"] += fallo
+
+    def do_GET(self):
+        ruta = urlsplit(self.path).path
+        sitio = ruta.strip("/").split("/", 1)[0]
+        for prefijo, archivo, content_type in self.rutas:
+            if ruta.startswith(prefijo):
+                simulacion = self._simular(sitio)
+                if simulacion.fallos_pct and random.uniform(0, 100) < simulacion.fallos_pct:
+                    self._contar(sitio, True)
+                    self.send_error(503, "Falla simulada")
+                    return
+                with open(os.path.join(FIXTURES_DIR, archivo), "rb") as f:
+                    cuerpo = f.read()
+                if simulacion.render_ms and content_type == HTML:
+                    cuerpo = _con_render_diferido(cuerpo, simulacion.render_ms)
+                self._contar(sitio, False)
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(cuerpo)))
+                self.end_headers()
+                self.wfile.write(cuerpo)
+                return
+        self.send_error(404, "Sin fixture para esta ruta")
+
+    def log_message(self, format, *args):
+        pass  # silencioso: se usa en benchmarks y pruebas
+
+
+class ServidorFarmacias(ThreadingHTTPServer):
+    # La cola de conexiones por defecto (5) se desborda con varias búsquedas
+    # simultáneas: 5 sitios x N navegadores conectando a la vez
+    request_queue_size = 256
+
+
+def iniciar_servidor(host: str = "127.0.0.1", puerto: int = 0, manejador=ManejadorFarmacias,
+                     simulacion: Simulacion = None, simulaciones: dict = None, contadores: dict = None):
+    """
+    Arranca el servidor en un hilo y lo devuelve.
+    Con puerto=0 el sistema elige uno libre (ver servidor.server_address).
+    `simulacion` aplica a todos los sitios y `simulaciones` la reemplaza
+    por sitio ({"inkafarma": Simulacion(...)}).
+    """
+    if simulacion is not None or simulaciones or contadores is not None:
+        manejador = type("ManejadorSimulado", (manejador,), {
+            "simulacion": simulacion or manejador.simulacion,
+            "simulaciones": simulaciones or {},
+            "contadores": contadores,
+        })
+    servidor = ServidorFarmacias((host, puerto), manejador)
+    hilo = threading.Thread(target=servidor.serve_forever, daemon=True)
+    hilo.start()
+    return servidor
+
+
+def url_base(servidor, sitio: str) -> str:
+    host, puerto = servidor.server_address[:2]
+    return f"http://{host}:{puerto}/{sitio}"
+
+
+def variables_entorno(servidor) -> dict:
+    """Variables *_URL que apuntan todos los scrapers a este servidor."""
+    return {variable: url_base(servidor, sitio) for variable, sitio in SITIOS_SIMULADOS.items()}
+
+
+def agregar_argumentos_simulacion(parser):
+    """Opciones de Simulacion compartidas por este servidor y la prueba de carga."""
+    parser.add_argument("--retraso-ms", type=int, default=0, help="demora de cada respuesta")
+    parser.add_argument("--variacion-ms", type=int, default=0, help="+- aleatorio sobre --retraso-ms")
+    parser.add_argument("--render-ms", type=int, default=0, help="los productos aparecen N ms después de cargar")
+    parser.add_argument("--fallos-pct", type=float, default=0.0, help="porcentaje de respuestas 503")
+    parser.add_argument("--sitio", action="append", default=[], metavar="SITIO:CAMPO=VALOR,...",
+                        help="ajustes de un sitio, p. ej. inkafarma:render_ms=3000,fallos_pct=5 (repetible)")
+
+
+def simulacion_desde_argumentos(args) -> tuple:
+    simulacion = Simulacion(args.retraso_ms, args.variacion_ms, args.render_ms, args.fallos_pct)
+    return simulacion, parsear_simulaciones(simulacion, args.sitio)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--puerto", type=int, default=8765)
+    agregar_argumentos_simulacion(parser)
+    args = parser.parse_args()
+
+    simulacion, simulaciones = simulacion_desde_argumentos(args)
+    servidor = iniciar_servidor(args.host, args.puerto, simulacion=simulacion, simulaciones=simulaciones)
+    print(f"Farmacias simuladas en http://{args.host}:{args.puerto}/<sitio>")
+    for sitio in SITIOS_SIMULADOS.values():
+        print(f"   {sitio:<18} {json.dumps(asdict(simulaciones.get(sitio, simulacion)))}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        servidor.shutdown()
@@ -0,0 +1,232 @@
+import asyncio
+import math
+import os
+import time
+from contextlib import asynccontextmanager
+from typing import Optional
+
+from scrapers.config import (
+    ADMISION_MAX_BUSQUEDAS,
+    ADMISION_MAX_COLA,
+    ADMISION_ESPERA_S,
+    MEMORIA_MAX_MB,
+    MEMORIA_INTERVALO_S,
+    LOTE_MAX_EN_CURSO,
+    LOTE_MAX_COLA,
+)
+
+# Motivos de rechazo (también se usan como etiqueta en las métricas)
+COLA_LLENA = "cola_llena"
+ESPERA_AGOTADA = "espera_agotada"
+MEMORIA_ALTA = "memoria_alta"
+PLAZO_AGOTADO = "plazo_agotado"   # se acabó el presupuesto (deadline_ms) de la búsqueda en la cola
+
+
+class Saturado(Exception):
+    """La búsqueda no se admite; la API responde `codigo` con Retry-After."""
+
+    def __init__(self, motivo: str, codigo: int, reintentar_s: int):
+        super().__init__(motivo)
+        self.motivo = motivo
+        self.codigo = codigo
+        self.reintentar_s = reintentar_s
+
+
+class ControlAdmision:
+    """
+    Limita las búsquedas que se scrapean a la vez.
+
+    Como mucho `max_busquedas` corren en paralelo y hasta `max_cola`
+    esperan turno (en orden de llegada). Con la cola llena se rechaza
+    con 429; si la espera supera `espera_s`, o la memoria está por
+    encima del umbral (ver VigilanteMemoria), con 503. En ambos casos
+    se sugiere un Retry-After a partir de la duración media reciente.
+    """
+
+    def __init__(self, max_busquedas: int = ADMISION_MAX_BUSQUEDAS, max_cola: int = ADMISION_MAX_COLA,
+                 espera_s: float = ADMISION_ESPERA_S):
+        self.max_busquedas = max(1, max_busquedas)
+        self.max_cola = max(0, max_cola)
+        self.espera_s = espera_s
+        self._semaforo = asyncio.Semaphore(self.max_busquedas)
+        self.en_curso = 0
+        self.en_cola = 0
+        self.memoria_alta = False
+        self.duracion_media_s = 5.0   # media móvil de lo que tarda una búsqueda
+        self.admitidas = 0
+        self.rechazos = {COLA_LLENA: 0, ESPERA_AGOTADA: 0, MEMORIA_ALTA: 0, PLAZO_AGOTADO: 0}
+
+    def reintentar_en(self) -> int:
+        """Segundos sugeridos para Retry-After según la cola y la duración media."""
+        tandas = 1 + self.en_cola / self.max_busquedas
+        return max(1, math.ceil(self.duracion_media_s * tandas))
+
+    def _rechazar(self, motivo: str, codigo: int):
+        self.rechazos[motivo] += 1
+        print(f"   🚦 Búsqueda rechazada ({motivo}): {self.en_curso} en curso, {self.en_cola} en cola")
+        raise Saturado(motivo, codigo, self.reintentar_en())
+
+    def verificar(self):
+        """Rechaza de inmediato (Saturado) si ahora mismo no se podría admitir."""
+        if self.memoria_alta:
+            self._rechazar(MEMORIA_ALTA, 503)
+        if self.en_curso + self.en_cola >= self.max_busquedas + self.max_cola:
+            self._rechazar(COLA_LLENA, 429)
+
+    @asynccontextmanager
+    async def admitir(self, espera_s: Optional[float] = None):
+        """
+        async with control.admitir(): ... (espera turno o lanza Saturado).
+
+        Con `espera_s` (lo que le queda del presupuesto a la búsqueda) se
+        espera como mucho eso; si se agota antes que `self.espera_s`, el
+        motivo del rechazo es PLAZO_AGOTADO.
+        """
+        self.verificar()
+        motivo = ESPERA_AGOTADA
+        limite = self.espera_s
+        if espera_s is not None and espera_s < limite:
+            motivo, limite = PLAZO_AGOTADO, max(0.0, espera_s)
+        self.en_cola += 1
+        try:
+            if self._semaforo.locked():
+                await asyncio.wait_for(self._semaforo.acquire(), limite)
+            else:
+                await self._semaforo.acquire()
+        except asyncio.TimeoutError:
+            self._rechazar(motivo, 503)
+        finally:
+            self.en_cola -= 1
+
+        self.en_curso += 1
+        self.admitidas += 1
+        inicio = time.monotonic()
+        try:
+            yield
+        finally:
+            self.en_curso -= 1
+            self._semaforo.release()
+            self.duracion_media_s = 0.8 * self.duracion_media_s + 0.2 * (time.monotonic() - inicio)
+
+    def estadisticas(self) -> dict:
+        return {
+            "en_curso": self.en_curso,
+            "en_cola": self.en_cola,
+            "max_busquedas": self.max_busquedas,
+            "max_cola": self.max_cola,
+            "memoria_alta": self.memoria_alta,
+            "admitidas": self.admitidas,
+            "rechazos": dict(self.rechazos),
+            "duracion_media_s": round(self.duracion_media_s, 2),
+        }
+
+
+def _rss_kb(pid: str) -> int:
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for linea in f:
+                if linea.startswith("VmRSS:"):
+                    return int(linea.split()[1])
+    except (OSError, ValueError):
+        pass
+    return 0
+
+
+def rss_procesos(pid: Optional[int] = None) -> list:
+    """
+    [(pid, nombre, rss_mb)] de `pid` (por defecto este proceso) y todos
+    sus descendientes (driver de Playwright y procesos de Chromium),
+    leído de /proc. Devuelve [] donde no hay /proc.
+    """
+    hijos = {}
+    nombres = {}
+    try:
+        pids = [p for p in os.listdir("/proc") if p.isdigit()]
+    except OSError:
+        return []
+    for p in pids:
+        try:
+            with open(f"/proc/{p}/stat") as f:
+                # El nombre va entre paréntesis y puede tener espacios
+                nombre, resto = f.read().split("(", 1)[1].rsplit(")", 1)
+                ppid = resto.split()[1]
+        except (OSError, IndexError, ValueError):
+            continue
+        nombres[p] = nombre
+        hijos.setdefault(ppid, []).append(p)
+
+    procesos = []
+    pendientes = [str(pid or os.getpid())]
+    while pendientes:
+        p = pendientes.pop()
+        procesos.append((int(p), nombres.get(p, "?"), _rss_kb(p) / 1024))
+        pendientes.extend(hijos.get(p, []))
+    return procesos
+
+
+def rss_total_mb(pid: Optional[int] = None) -> float:
+    """
+    RSS de este proceso (o de `pid`) más todos sus descendientes. Suma la
+    memoria compartida de cada proceso, así que sobreestima un poco: sirve
+    como umbral conservador. Devuelve 0 donde no hay /proc.
+    """
+    return sum(rss_mb for _, _, rss_mb in rss_procesos(pid))
+
+
+class VigilanteMemoria:
+    """
+    Mide el RSS cada `intervalo_s` segundos. Por encima de `max_mb` deja
+    de admitir búsquedas (503) y recicla los navegadores de `pool` (un
+    PoolNavegadores o, con TRABAJADORES, el ClienteTrabajadores, que lo
+    pide a los procesos trabajadores); vuelve a admitir cuando baja del
+    90 % del umbral.
+    """
+
+    def __init__(self, control: ControlAdmision, pool=None, max_mb: int = MEMORIA_MAX_MB,
+                 intervalo_s: float = MEMORIA_INTERVALO_S):
+        self.control = control
+        self.pool = pool
+        self.max_mb = max_mb
+        self.intervalo_s = max(1, intervalo_s)
+        self.rss_mb = 0.0
+        self.reciclajes = 0
+        self._tarea = None
+
+    def iniciar(self):
+        if self.max_mb > 0 and self._tarea is None:
+            self._tarea = asyncio.create_task(self._vigilar())
+            print(f"   🐕 Vigilando memoria (umbral {self.max_mb} MB)")
+
+    async def detener(self):
+        if self._tarea is not None:
+            self._tarea.cancel()
+            await asyncio.gather(self._tarea, return_exceptions=True)
+            self._tarea = None
+
+    async def _vigilar(self):
+        while True:
+            await asyncio.sleep(self.intervalo_s)
+            try:
+                await self.revisar()
+            except Exception as e:
+                print(f"   ⚠️ Error en el vigilante de memoria: {e}")
+
+    async def revisar(self):
+        self.rss_mb = await asyncio.to_thread(rss_total_mb)
+        if self.rss_mb > self.max_mb:
+            if not self.control.memoria_alta:
+                print(f"   🐕 Memoria alta ({self.rss_mb:.0f} MB > {self.max_mb} MB): pausando admisión")
+            self.control.memoria_alta = True
+            if self.pool is not None:
+                # Los Chromium se cierran al devolver sus contextos prestados
+                await self.pool.reciclar()
+                self.reciclajes += 1
+        elif self.control.memoria_alta and self.rss_mb < self.max_mb * 0.9:
+            print(f"   🐕 Memoria normal ({self.rss_mb:.0f} MB): admitiendo búsquedas")
+            self.control.memoria_alta = False
+
+
+# Control de admisión compartido por toda la API; los lotes tienen el
+# suyo para no quitarle turnos a las búsquedas interactivas
+control_admision = ControlAdmision()
+control_lotes = ControlAdmision(LOTE_MAX_EN_CURSO, LOTE_MAX_COLA)
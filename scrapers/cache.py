@@ -0,0 +1,148 @@
+import asyncio
+import json
+import time
+from collections import OrderedDict
+
+from scrapers.config import (
+    CACHE_MAX_ENTRADAS,
+    CACHE_MAX_MB,
+    CACHE_TTL_S,
+    CACHE_TTL_POR_FARMACIA,
+    CACHE_STALE_S,
+)
+from scrapers.texto import normalizar_keyword
+
+# Frescura de un resultado servido desde la caché
+FRESCO = "fresco"
+VENCIDO = "stale"
+
+
+class _Entrada:
+    __slots__ = ("productos", "creado", "tamano")
+
+    def __init__(self, productos: list, tamano: int):
+        self.productos = productos
+        self.creado = time.monotonic()
+        self.tamano = tamano
+
+
+class CacheResultados:
+    """
+    Caché LRU de productos por (keyword normalizado, max_items, farmacia).
+
+    Cada farmacia tiene su propio TTL. Pasado el TTL, la entrada se sigue
+    sirviendo como 'stale' durante `stale_s` segundos mientras se lanza
+    un único refresco en segundo plano. La caché se acota por número de
+    entradas y por bytes (tamaño aproximado del JSON de los productos).
+    """
+
+    def __init__(
+        self,
+        max_entradas: int = CACHE_MAX_ENTRADAS,
+        max_bytes: int = CACHE_MAX_MB * 1024 * 1024,
+        ttl_s: int = CACHE_TTL_S,
+        ttl_por_farmacia: dict = None,
+        stale_s: int = CACHE_STALE_S,
+    ):
+        self.max_entradas = max(1, max_entradas)
+        self.max_bytes = max(1, max_bytes)
+        self.ttl_s = ttl_s
+        self.ttl_por_farmacia = dict(CACHE_TTL_POR_FARMACIA if ttl_por_farmacia is None else ttl_por_farmacia)
+        self.stale_s = stale_s
+
+        self._entradas = OrderedDict()
+        self._bytes = 0
+        self._refrescos = {}  # clave -> tarea de refresco en curso
+
+        self.aciertos = 0
+        self.aciertos_stale = 0
+        self.fallos = 0
+        self.desalojos = 0
+
+    @staticmethod
+    def clave(keyword: str, max_items: int, farmacia: str) -> tuple:
+        return (normalizar_keyword(keyword), max_items, farmacia)
+
+    def ttl(self, farmacia: str) -> int:
+        return self.ttl_por_farmacia.get(farmacia, self.ttl_s)
+
+    def obtener(self, keyword: str, max_items: int, farmacia: str):
+        """
+        Devuelve (productos, edad_s, frescura) o None si no hay nada utilizable.
+        frescura es FRESCO o VENCIDO (servir y refrescar).
+        """
+        clave = self.clave(keyword, max_items, farmacia)
+        entrada = self._entradas.get(clave)
+        if entrada is None:
+            self.fallos += 1
+            return None
+
+        edad = time.monotonic() - entrada.creado
+        ttl = self.ttl(farmacia)
+        if edad > ttl + self.stale_s:
+            self._quitar(clave)
+            self.fallos += 1
+            return None
+
+        self._entradas.move_to_end(clave)
+        if edad <= ttl:
+            self.aciertos += 1
+            return entrada.productos, edad, FRESCO
+        self.aciertos_stale += 1
+        return entrada.productos, edad, VENCIDO
+
+    def contiene(self, keyword: str, max_items: int, farmacia: str) -> bool:
+        """True si `obtener` respondería (fresco o stale), sin contar aciertos ni tocar el orden LRU."""
+        entrada = self._entradas.get(self.clave(keyword, max_items, farmacia))
+        return entrada is not None and time.monotonic() - entrada.creado <= self.ttl(farmacia) + self.stale_s
+
+    def guardar(self, keyword: str, max_items: int, farmacia: str, productos: list):
+        clave = self.clave(keyword, max_items, farmacia)
+        tamano = len(json.dumps(productos, ensure_ascii=False))
+        if tamano > self.max_bytes:
+            return
+        self._quitar(clave)
+        self._entradas[clave] = _Entrada(productos, tamano)
+        self._bytes += tamano
+
+        # Desalojo LRU hasta volver a los límites
+        while len(self._entradas) > self.max_entradas or self._bytes > self.max_bytes:
+            clave_vieja, _ = next(iter(self._entradas.items()))
+            self._quitar(clave_vieja)
+            self.desalojos += 1
+
+    def _quitar(self, clave):
+        entrada = self._entradas.pop(clave, None)
+        if entrada is not None:
+            self._bytes -= entrada.tamano
+
+    def refrescar(self, keyword: str, max_items: int, farmacia: str, corrutina_factory):
+        """
+        Lanza un refresco en segundo plano si no hay otro en curso para la misma clave.
+        `corrutina_factory()` debe devolver la corrutina que scrapea y guarda el resultado.
+        """
+        clave = self.clave(keyword, max_items, farmacia)
+        if clave in self._refrescos:
+            return
+        tarea = asyncio.create_task(corrutina_factory())
+        self._refrescos[clave] = tarea
+        tarea.add_done_callback(lambda _t: self._refrescos.pop(clave, None))
+
+    def limpiar(self):
+        self._entradas.clear()
+        self._bytes = 0
+
+    def estadisticas(self) -> dict:
+        return {
+            "entradas": len(self._entradas),
+            "bytes": self._bytes,
+            "aciertos": self.aciertos,
+            "aciertos_stale": self.aciertos_stale,
+            "fallos": self.fallos,
+            "desalojos": self.desalojos,
+            "refrescos_en_curso": len(self._refrescos),
+        }
+
+
+# Caché compartida por toda la API
+cache_resultados = CacheResultados()
@@ -0,0 +1,73 @@
+import asyncio
+
+
+class _Vuelo:
+    """Una ejecución en curso y cuántos la están esperando."""
+    __slots__ = ("tarea", "esperando")
+
+    def __init__(self, tarea):
+        self.tarea = tarea
+        self.esperando = 0
+
+
+class Coalescedor:
+    """
+    Deduplica trabajos idénticos en curso ("single-flight").
+
+    Si llegan varias peticiones con la misma clave mientras la primera
+    sigue corriendo, todas esperan la misma tarea en lugar de lanzar
+    otra. Cada espera va protegida con `asyncio.shield`, así que si un
+    cliente se desconecta solo se cancela su espera; la tarea compartida
+    se cancela únicamente cuando ya no queda nadie esperándola.
+    """
+
+    def __init__(self, nombre: str):
+        self.nombre = nombre
+        self._vuelos = {}
+        self.ejecuciones = 0   # tareas realmente lanzadas
+        self.coalescidas = 0   # peticiones que se unieron a una tarea en curso
+        self.canceladas = 0    # tareas canceladas por quedarse sin esperas
+
+    def en_curso(self, clave) -> bool:
+        return clave in self._vuelos
+
+    async def ejecutar(self, clave, corrutina_factory):
+        """Devuelve el resultado de `corrutina_factory()`, compartido por clave."""
+        vuelo = self._vuelos.get(clave)
+        if vuelo is None:
+            vuelo = _Vuelo(asyncio.create_task(corrutina_factory()))
+            self._vuelos[clave] = vuelo
+            vuelo.tarea.add_done_callback(lambda t: self._terminar(clave, vuelo))
+            self.ejecuciones += 1
+        else:
+            self.coalescidas += 1
+
+        vuelo.esperando += 1
+        try:
+            return await asyncio.shield(vuelo.tarea)
+        finally:
+            vuelo.esperando -= 1
+            if vuelo.esperando == 0 and not vuelo.tarea.done():
+                # Nadie más lo espera: liberar navegador y memoria
+                vuelo.tarea.cancel()
+                self.canceladas += 1
+
+    def _terminar(self, clave, vuelo):
+        if self._vuelos.get(clave) is vuelo:
+            del self._vuelos[clave]
+        # Marca la excepción como leída aunque ya no quede nadie esperando
+        if not vuelo.tarea.cancelled():
+            vuelo.tarea.exception()
+
+    def estadisticas(self) -> dict:
+        return {
+            "en_curso": len(self._vuelos),
+            "ejecuciones": self.ejecuciones,
+            "coalescidas": self.coalescidas,
+            "canceladas": self.canceladas,
+        }
+
+
+# Búsquedas completas (keyword + max_items) y trabajos por sitio
+vuelos_busquedas = Coalescedor("busquedas")
+vuelos_sitios = Coalescedor("sitios")
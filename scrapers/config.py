@@ -0,0 +1,211 @@
+import os
+
+# Configuración del servicio leída desde variables de entorno
+# (Railway / Docker). Cada valor tiene un defecto pensado para
+# el servidor gratuito.
+
+
+def _env_int(nombre: str, defecto: int) -> int:
+    """Lee un entero desde el entorno; si no existe o es inválido usa el defecto."""
+    valor = os.getenv(nombre)
+    if valor is None or not valor.strip():
+        return defecto
+    try:
+        return int(valor)
+    except ValueError:
+        print(f"   ⚠️ Valor inválido para {nombre}={valor!r}, usando {defecto}")
+        return defecto
+
+
+def _env_str(nombre: str, defecto: str) -> str:
+    valor = os.getenv(nombre)
+    return valor.strip() if valor and valor.strip() else defecto
+
+
+def _env_dict_int(nombre: str) -> dict:
+    """Lee 'Clave:valor,Otra clave:valor' desde el entorno como {clave: int}."""
+    resultado = {}
+    for par in (os.getenv(nombre) or "").split(","):
+        if ":" not in par:
+            continue
+        clave, valor = par.rsplit(":", 1)
+        try:
+            resultado[clave.strip()] = int(valor)
+        except ValueError:
+            print(f"   ⚠️ Valor inválido en {nombre}: {par!r}")
+    return resultado
+
+
+# =============================================
+# POOL DE NAVEGADORES
+# =============================================
+# Número de procesos Chromium que se mantienen abiertos
+POOL_NAVEGADORES = _env_int("POOL_NAVEGADORES", 1)
+# Máximo de contextos prestados a la vez (entre todos los navegadores)
+POOL_MAX_CONTEXTOS = _env_int("POOL_MAX_CONTEXTOS", 5)
+# Un contexto se cierra y se recrea después de N usos
+POOL_USOS_POR_CONTEXTO = _env_int("POOL_USOS_POR_CONTEXTO", 20)
+# Un navegador se recicla después de crear N contextos (limita fugas de memoria)
+POOL_CONTEXTOS_POR_NAVEGADOR = _env_int("POOL_CONTEXTOS_POR_NAVEGADOR", 200)
+# 1 = mantener una sesión "caliente" (contexto + página) por farmacia que
+# conserva cookies, caché HTTP y service workers entre búsquedas
+SESIONES_CALIENTES = _env_int("SESIONES_CALIENTES", 0)
+# Una sesión caliente se descarta tras N búsquedas o M segundos de vida
+SESION_USOS_MAX = _env_int("SESION_USOS_MAX", 50)
+SESION_VIDA_S = _env_int("SESION_VIDA_S", 900)
+
+# =============================================
+# PLANIFICADOR DE SCRAPERS
+# =============================================
+# Sitios que se scrapean a la vez (2 en el servidor gratuito, 5 en uno grande)
+SCRAPER_CONCURRENCIA = _env_int("SCRAPER_CONCURRENCIA", 2)
+# Presupuesto de RAM para scrapers en paralelo (0 = sin límite)
+SCRAPER_MEMORIA_MB = _env_int("SCRAPER_MEMORIA_MB", 0)
+# Memoria estimada que consume un sitio mientras se scrapea
+SCRAPER_MB_POR_SITIO = _env_int("SCRAPER_MB_POR_SITIO", 250)
+# Tiempo máximo de un sitio antes de marcarlo como "timeout"
+SCRAPER_TIMEOUT_S = _env_int("SCRAPER_TIMEOUT_S", 90)
+# Presupuesto total de una búsqueda por defecto (0 = sin presupuesto);
+# se puede pedir otro por petición con ?deadline_ms=
+SCRAPER_DEADLINE_MS = _env_int("SCRAPER_DEADLINE_MS", 0)
+
+# =============================================
+# PROCESOS TRABAJADORES DE SCRAPING
+# =============================================
+# 0 = los scrapers corren dentro del proceso de la API (como siempre).
+# N > 0 = la API solo encola trabajos; un despachador local reparte los
+# scrapes entre N procesos, cada uno con su propio Chromium. Todos los
+# workers de uvicorn comparten el mismo despachador (un solo socket).
+TRABAJADORES = _env_int("TRABAJADORES", 0)
+TRABAJADORES_SOCKET = _env_str("TRABAJADORES_SOCKET", "/tmp/farmacias_trabajadores.sock")
+# Scrapes simultáneos por proceso trabajador
+TRABAJADORES_TRABAJOS = _env_int("TRABAJADORES_TRABAJOS", 2)
+
+# =============================================
+# CONTROL DE ADMISIÓN Y MEMORIA
+# =============================================
+# Búsquedas que se atienden a la vez; las demás esperan en cola
+ADMISION_MAX_BUSQUEDAS = _env_int("ADMISION_MAX_BUSQUEDAS", 2)
+# Búsquedas que pueden esperar turno; con la cola llena se responde 429
+ADMISION_MAX_COLA = _env_int("ADMISION_MAX_COLA", 10)
+# Espera máxima en la cola antes de responder 503
+ADMISION_ESPERA_S = _env_int("ADMISION_ESPERA_S", 30)
+# RSS total (API + Chromium) a partir del cual no se admiten búsquedas
+# y se reciclan los navegadores (0 = sin vigilancia)
+MEMORIA_MAX_MB = _env_int("MEMORIA_MAX_MB", 0)
+# Cada cuántos segundos se mide la memoria
+MEMORIA_INTERVALO_S = _env_int("MEMORIA_INTERVALO_S", 5)
+
+# =============================================
+# BÚSQUEDAS POR LOTE (POST /buscar_productos/lote)
+# =============================================
+# Máximo de keywords por lote
+LOTE_MAX_KEYWORDS = _env_int("LOTE_MAX_KEYWORDS", 500)
+# Keywords de un lote que se procesan a la vez
+LOTE_VENTANA = _env_int("LOTE_VENTANA", 10)
+# Scrapes de lote simultáneos contra una misma farmacia y pausa mínima
+# entre dos arranques seguidos (para no castigar a los sitios)
+LOTE_CONCURRENCIA_POR_SITIO = _env_int("LOTE_CONCURRENCIA_POR_SITIO", 1)
+LOTE_INTERVALO_MS = _env_int("LOTE_INTERVALO_MS", 1000)
+# Lotes que se atienden a la vez y lotes en espera
+LOTE_MAX_EN_CURSO = _env_int("LOTE_MAX_EN_CURSO", 1)
+LOTE_MAX_COLA = _env_int("LOTE_MAX_COLA", 2)
+
+# =============================================
+# CIRCUIT BREAKER POR FARMACIA
+# =============================================
+# Fallos seguidos (error / timeout) que abren el circuito de un sitio
+CIRCUITO_FALLOS = _env_int("CIRCUITO_FALLOS", 3)
+# Segundos con el circuito abierto antes de dejar pasar una prueba
+CIRCUITO_ABIERTO_S = _env_int("CIRCUITO_ABIERTO_S", 60)
+# Resultados recientes usados para la tasa de error y la latencia
+CIRCUITO_VENTANA = _env_int("CIRCUITO_VENTANA", 20)
+
+# =============================================
+# CACHÉ DE RESULTADOS
+# =============================================
+# Límites de la caché (lo que se alcance primero)
+CACHE_MAX_ENTRADAS = _env_int("CACHE_MAX_ENTRADAS", 2000)
+CACHE_MAX_MB = _env_int("CACHE_MAX_MB", 64)
+# Vida de un resultado fresco (segundos) y TTL por farmacia, p. ej.
+# CACHE_TTL_POR_FARMACIA="Inkafarma:900,Boticas y Salud:300"
+CACHE_TTL_S = _env_int("CACHE_TTL_S", 600)
+CACHE_TTL_POR_FARMACIA = _env_dict_int("CACHE_TTL_POR_FARMACIA")
+# Tiempo extra en que un resultado vencido se sirve mientras se refresca
+CACHE_STALE_S = _env_int("CACHE_STALE_S", 1800)
+
+# =============================================
+# ÍNDICE LOCAL DE PRECIOS (SQLite) Y PRECALENTAMIENTO
+# =============================================
+# Archivo SQLite con los últimos precios por keyword y farmacia, p. ej.
+# INDICE_DB=/var/lib/farmacias/precios.db ("" = sin índice, por defecto)
+INDICE_DB = os.getenv("INDICE_DB", "").strip()
+# Edad máxima de un resultado del índice para responder sin scrapear (nunca
+# más que el TTL de caché de esa farmacia)
+INDICE_FRESCO_S = _env_int("INDICE_FRESCO_S", 1800)
+# Contador en memoria de las búsquedas (popularidad): keywords distintos
+# que puede juntar antes de volcarse a SQLite y cada cuánto se vuelca
+INDICE_CONSULTAS_MAX = _env_int("INDICE_CONSULTAS_MAX", 2000)
+INDICE_VOLCAR_S = _env_int("INDICE_VOLCAR_S", 60)
+# 1 = re-scrapear en segundo plano los keywords populares (requiere INDICE_DB)
+PRECALENTAR = _env_int("PRECALENTAR", 0)
+PRECALENTAR_INTERVALO_S = _env_int("PRECALENTAR_INTERVALO_S", 300)
+# Keywords fijos, más los `PRECALENTAR_TOP` más buscados con al menos
+# `PRECALENTAR_MIN_CONSULTAS` consultas
+PRECALENTAR_KEYWORDS = [k.strip() for k in _env_str("PRECALENTAR_KEYWORDS", "paracetamol,ibuprofeno,vitamina c").split(",") if k.strip()]
+PRECALENTAR_TOP = _env_int("PRECALENTAR_TOP", 10)
+PRECALENTAR_MIN_CONSULTAS = _env_int("PRECALENTAR_MIN_CONSULTAS", 3)
+# Productos por farmacia que guarda el precalentador
+PRECALENTAR_MAX_ITEMS = _env_int("PRECALENTAR_MAX_ITEMS", 30)
+
+# =============================================
+# EMPAREJAMIENTO DE PRODUCTOS ENTRE FARMACIAS
+# =============================================
+# Similitud mínima (%) entre nombres base para considerar dos productos
+# el mismo (además de coincidir concentración y unidades)
+EMPAREJAR_SIMILITUD_PCT = _env_int("EMPAREJAR_SIMILITUD_PCT", 60)
+
+# =============================================
+# AUTOCOMPLETADO (/sugerencias)
+# =============================================
+# Nombres de productos y keywords que guarda el índice de sugerencias;
+# al pasarse se descartan los menos populares
+SUGERENCIAS_MAX_ENTRADAS = _env_int("SUGERENCIAS_MAX_ENTRADAS", 20000)
+# Caracteres mínimos del prefijo (uno solo casa con casi todo el índice)
+SUGERENCIAS_MIN_PREFIJO = _env_int("SUGERENCIAS_MIN_PREFIJO", 2)
+
+# =============================================
+# EXTRACCIÓN DE PRODUCTOS
+# =============================================
+# "js": extrae dentro de la página con page.evaluate (rápido, poca memoria)
+# "bs4": page.content() + BeautifulSoup (camino original, más tolerante)
+EXTRACCION_MODO = os.getenv("EXTRACCION_MODO", "js").strip().lower()
+
+# =============================================
+# FILTRO DE PETICIONES Y CACHÉ DE SCRIPTS
+# =============================================
+# Hosts o patrones de URL extra a bloquear en todos los sitios, p. ej.
+# RECURSOS_BLOQUEAR="zopim.com,*/recaptcha/*"
+RECURSOS_BLOQUEAR = [h.strip() for h in (os.getenv("RECURSOS_BLOQUEAR") or "").split(",") if h.strip()]
+# Caché en disco de los bundles JS propios de cada sitio (0 MB = desactivada)
+RECURSOS_CACHE_DIR = _env_str("RECURSOS_CACHE_DIR", "/tmp/farmacias_scripts")
+RECURSOS_CACHE_MB = _env_int("RECURSOS_CACHE_MB", 100)
+
+# =============================================
+# URLs BASE DE LAS FARMACIAS
+# =============================================
+# Se pueden apuntar a un servidor local con páginas sintéticas
+# (ver herramientas/servidor_farmacias.py)
+INKAFARMA_URL = _env_str("INKAFARMA_URL", "https://inkafarma.pe").rstrip("/")
+MIFARMA_URL = _env_str("MIFARMA_URL", "https://www.mifarma.com.pe").rstrip("/")
+BOTICASPERU_URL = _env_str("BOTICASPERU_URL", "https://boticasperu.pe").rstrip("/")
+BOTICASYSALUD_URL = _env_str("BOTICASYSALUD_URL", "https://www.boticasysalud.com").rstrip("/")
+FARMACIAUNIVERSAL_URL = _env_str("FARMACIAUNIVERSAL_URL", "https://www.farmaciauniversal.com").rstrip("/")
+
+# =============================================
+# CAMINO RÁPIDO HTTP (sin navegador)
+# =============================================
+# 1 = probar primero la búsqueda por HTTP directo en los sitios que lo permiten
+HTTP_RAPIDO = _env_int("HTTP_RAPIDO", 1)
+HTTP_TIMEOUT_S = _env_int("HTTP_TIMEOUT_S", 15)
+HTTP_MAX_CONEXIONES = _env_int("HTTP_MAX_CONEXIONES", 20)
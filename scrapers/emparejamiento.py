@@ -0,0 +1,228 @@
+import math
+import re
+from collections import Counter, defaultdict
+from dataclasses import dataclass
+from functools import lru_cache
+
+from scrapers.config import EMPAREJAR_SIMILITUD_PCT
+from scrapers.modelo import CAMPO_OFERTA_CENTIMOS, con_precios_numericos
+from scrapers.texto import normalizar_keyword
+
+# =============================================
+# EMPAREJAMIENTO DE PRODUCTOS ENTRE FARMACIAS
+# =============================================
+# "Panadol Antigripal 500mg x 100", "PANADOL ANTIGRIPAL 500 MG TABLETAS CAJA X 100"
+# y "Panadol Antigripal Tab. 500mg (100 und)" son el mismo producto. Cada
+# nombre se reduce a una firma (nombre base, concentración, unidades) y se
+# agrupan los que tienen la misma concentración y unidades y un nombre base
+# parecido (Jaccard de trigramas de caracteres >= EMPAREJAR_SIMILITUD_PCT).
+
+# "500mg", "500 mg", "120mg/5ml", "0,5 g", "10%"
+_RE_CONCENTRACION = re.compile(
+    r"(\d+(?:[.,]\d+)?)\s*(mg|mcg|ug|g|ml|ui|%)(?:\s*/\s*(\d+(?:[.,]\d+)?)\s*(mg|ml|g))?(?![a-z])"
+)
+# "x 100", "x100", "100 tabletas", "(100 und)"
+_RE_UNIDADES = re.compile(
+    r"\bx\s*(\d+)\b|\b(\d+)\s*(?:tabletas?|tabs?|comprimidos?|capsulas?|caps?|sobres?|unidades|und|un|grageas?|ampollas?)\b"
+)
+_RE_NO_ALFANUMERICO = re.compile(r"[^a-z0-9]+")
+
+# Palabras de empaque o de forma que cada farmacia escribe a su manera
+_PALABRAS_VACIAS = {
+    "x", "de", "del", "la", "el", "los", "las", "con", "en", "por", "para", "y",
+    "caja", "cja", "frasco", "fco", "blister", "sobre", "sobres", "unidad", "unidades", "und", "un",
+    "tableta", "tabletas", "tab", "tabs", "comprimido", "comprimidos", "comp",
+    "capsula", "capsulas", "cap", "caps", "gragea", "grageas", "recubierta", "recubiertas",
+}
+
+
+@dataclass(frozen=True)
+class Firma:
+    """Forma comparable del nombre de un producto."""
+    base: str                  # nombre sin concentración, unidades ni empaque
+    concentracion: tuple       # ("500mg",) / ("120mg/5ml", "60ml") / ()
+    unidades: int              # 100 para "x 100"; None si no se indica
+    rasgos: frozenset          # trigramas de caracteres del nombre base
+
+    def compatible(self, otra: "Firma") -> bool:
+        """Misma concentración y unidades cuando ambas las indican."""
+        if self.concentracion and otra.concentracion and self.concentracion != otra.concentracion:
+            return False
+        if self.unidades is not None and otra.unidades is not None and self.unidades != otra.unidades:
+            return False
+        return True
+
+
+# Unidades que se expresan en otra para comparar: 1 g = 1000 mg, 1 ug = 1 mcg
+_CONVERSIONES = {"g": (1000, "mg"), "ug": (1, "mcg")}
+
+
+def _numero(texto: str) -> float:
+    """'0,50' -> 0.5"""
+    return float(texto.replace(",", "."))
+
+
+def _cantidad(numero: str, unidad: str) -> str:
+    """('1', 'g') -> '1000mg', ('0,5', 'g') -> '500mg', ('500', 'mg') -> '500mg'"""
+    factor, unidad = _CONVERSIONES.get(unidad, (1, unidad))
+    return f"{_numero(numero) * factor:g}{unidad}"
+
+
+def _trigramas(tokens: list) -> frozenset:
+    rasgos = set()
+    for token in tokens:
+        relleno = f" {token} "
+        rasgos.update(relleno[i:i + 3] for i in range(len(relleno) - 2))
+    return frozenset(rasgos)
+
+
+@lru_cache(maxsize=8192)
+def firma(nombre: str) -> Firma:
+    """Firma de un nombre de producto (cacheada: los nombres se repiten entre búsquedas)."""
+    texto = normalizar_keyword(nombre)
+
+    concentracion = []
+    for m in _RE_CONCENTRACION.finditer(texto):
+        valor = _cantidad(m.group(1), m.group(2))
+        if m.group(3):
+            valor += "/" + _cantidad(m.group(3), m.group(4))
+        concentracion.append(valor)
+    texto = _RE_CONCENTRACION.sub(" ", texto)
+
+    unidades = None
+    m = _RE_UNIDADES.search(texto)
+    if m:
+        unidades = int(m.group(1) or m.group(2))
+        texto = _RE_UNIDADES.sub(" ", texto)
+
+    tokens = [t for t in _RE_NO_ALFANUMERICO.split(texto) if t and t not in _PALABRAS_VACIAS]
+    return Firma(" ".join(tokens), tuple(sorted(concentracion)), unidades, _trigramas(tokens))
+
+
+def _jaccard(a: frozenset, b: frozenset) -> float:
+    if not a and not b:
+        return 1.0
+    comunes = len(a & b)
+    return comunes / (len(a) + len(b) - comunes)
+
+
+class _Conjuntos:
+    """
+    Union-find con compresión de caminos que recuerda la concentración y
+    las unidades indicadas por cada grupo. Dos grupos solo se unen si no
+    se contradicen: así un nombre sin unidades ("Panadol 500mg") no puede
+    juntar "500mg x 12" con "500mg x 100" (la compatibilidad entre pares
+    no es transitiva).
+    """
+
+    def __init__(self, firmas: list):
+        self.padre = list(range(len(firmas)))
+        self.concentracion = [f.concentracion for f in firmas]
+        self.unidades = [f.unidades for f in firmas]
+
+    def raiz(self, i: int) -> int:
+        while self.padre[i] != i:
+            self.padre[i] = self.padre[self.padre[i]]
+            i = self.padre[i]
+        return i
+
+    def unir(self, a: int, b: int) -> bool:
+        """Une los grupos de `a` y `b` si son compatibles; devuelve si quedaron juntos."""
+        a, b = self.raiz(a), self.raiz(b)
+        if a == b:
+            return True
+        ca, cb = self.concentracion[a], self.concentracion[b]
+        ua, ub = self.unidades[a], self.unidades[b]
+        if (ca and cb and ca != cb) or (ua is not None and ub is not None and ua != ub):
+            return False
+        raiz, otra = min(a, b), max(a, b)
+        self.padre[otra] = raiz
+        self.concentracion[raiz] = ca or cb
+        self.unidades[raiz] = ua if ua is not None else ub
+        return True
+
+
+def emparejar(firmas: list, umbral: float) -> list:
+    """
+    Agrupa índices de `firmas` equivalentes. Devuelve [[i, j, ...], ...]
+    en el orden de la primera aparición de cada grupo. Un grupo nunca
+    mezcla concentraciones ni unidades distintas (ver _Conjuntos).
+
+    No compara todos contra todos: es un join por similitud con filtro de
+    prefijo. Los trigramas de cada firma se ordenan del más raro al más
+    común y solo los primeros `len - ceil(umbral * len) + 1` entran al
+    índice invertido; dos conjuntos con Jaccard >= umbral comparten
+    necesariamente uno de esos trigramas, así que los candidatos salen
+    del índice y los trigramas comunes (los del keyword, presentes en
+    casi todos los productos) no generan comparaciones.
+    """
+    frecuencia = Counter(r for f in firmas for r in f.rasgos)
+    indice = defaultdict(list)   # trigrama -> índices con ese trigrama en su prefijo
+    conjuntos = _Conjuntos(firmas)
+
+    for i, f in enumerate(firmas):
+        rasgos = sorted(f.rasgos, key=lambda r: (frecuencia[r], r))
+        prefijo = rasgos[:len(rasgos) - math.ceil(umbral * len(rasgos)) + 1]
+        candidatos = set()
+        for rasgo in prefijo:
+            candidatos.update(indice[rasgo])
+        # Los más parecidos primero: un nombre sin unidades se une a su mejor pareja
+        parecidos = []
+        for j in candidatos:
+            otra = firmas[j]
+            if f.compatible(otra):
+                similitud = _jaccard(f.rasgos, otra.rasgos)
+                if similitud >= umbral:
+                    parecidos.append((-similitud, j))
+        for _, j in sorted(parecidos):
+            conjuntos.unir(i, j)
+        for rasgo in prefijo:
+            indice[rasgo].append(i)
+
+    grupos = {}
+    for i in range(len(firmas)):
+        grupos.setdefault(conjuntos.raiz(i), []).append(i)
+    return list(grupos.values())
+
+
+def agrupar_productos(productos: list, umbral: float = EMPAREJAR_SIMILITUD_PCT / 100) -> list:
+    """
+    Agrupa los productos equivalentes de distintas farmacias. Cada grupo:
+
+        {"producto", "concentracion", "unidades", "farmacias",
+         "precio_min_centimos", "precio_max_centimos", "mejor_farmacia",
+         "productos": [... del más barato al más caro]}
+
+    Primero los grupos presentes en más farmacias y, a igualdad, los más
+    baratos. No modifica `productos` (salvo agregar los precios numéricos).
+    """
+    productos = [con_precios_numericos(p) for p in productos]
+    firmas = [firma(p.get("Producto") or "") for p in productos]
+
+    # Los nombres idénticos tras normalizar (lo más común) se emparejan una sola vez
+    por_firma = {}
+    for i, f in enumerate(firmas):
+        por_firma.setdefault(f, []).append(i)
+    unicas = list(por_firma)
+
+    grupos = []
+    for indices_unicos in emparejar(unicas, umbral):
+        indices = [i for u in indices_unicos for i in por_firma[unicas[u]]]
+        miembros = sorted(
+            (productos[i] for i in indices),
+            key=lambda p: (p[CAMPO_OFERTA_CENTIMOS] is None, p[CAMPO_OFERTA_CENTIMOS] or 0),
+        )
+        precios = [p[CAMPO_OFERTA_CENTIMOS] for p in miembros if p[CAMPO_OFERTA_CENTIMOS] is not None]
+        grupos.append({
+            "producto": miembros[0].get("Producto"),
+            "concentracion": next((" ".join(firmas[i].concentracion) for i in indices if firmas[i].concentracion), None),
+            "unidades": next((firmas[i].unidades for i in indices if firmas[i].unidades is not None), None),
+            "farmacias": len({p.get("Farmacia") for p in miembros}),
+            "precio_min_centimos": min(precios) if precios else None,
+            "precio_max_centimos": max(precios) if precios else None,
+            "mejor_farmacia": miembros[0].get("Farmacia") if precios else None,
+            "productos": miembros,
+        })
+
+    grupos.sort(key=lambda g: (-g["farmacias"], g["precio_min_centimos"] is None, g["precio_min_centimos"] or 0))
+    return grupos
@@ -0,0 +1,112 @@
+import time
+from playwright.async_api import TimeoutError as PlaywrightTimeoutError
+
+from scrapers.metricas import observar_etapa
+
+# Cuenta productos distintos en la página: solo las coincidencias más
+# externas del selector (una tarjeta con tarjetas anidadas cuenta una vez)
+# y, si la coincidencia es un enlace, un producto por href.
+_JS_CONTAR = """
+(selector) => {
+    const vistos = new Set();
+    for (const e of document.querySelectorAll(selector)) {
+        if (e.parentElement && e.parentElement.closest(selector)) continue;
+        vistos.add(e.tagName === 'A' ? e.href : e);
+    }
+    return vistos.size;
+}
+"""
+
+# Igual que _JS_CONTAR pero como condición: true cuando hay más de `n`
+_JS_CRECIO = """
+([selector, n]) => {
+    const vistos = new Set();
+    for (const e of document.querySelectorAll(selector)) {
+        if (e.parentElement && e.parentElement.closest(selector)) continue;
+        vistos.add(e.tagName === 'A' ? e.href : e);
+    }
+    return vistos.size > n;
+}
+"""
+
+# Páginas de desafío anti-bot / bloqueo (Cloudflare, PerimeterX, reCAPTCHA...)
+_JS_DESAFIO = """
+() => {
+    const titulo = (document.title || '').toLowerCase();
+    if (['just a moment', 'attention required', 'access denied', 'un momento'].some((t) => titulo.includes(t))) {
+        return true;
+    }
+    return !!document.querySelector(
+        '#challenge-form, #cf-challenge-running, #px-captcha, .g-recaptcha, '
+        + 'iframe[src*="challenges.cloudflare.com"], iframe[src*="captcha"]'
+    );
+}
+"""
+
+
+async def contar_tarjetas(page, selector: str) -> int:
+    return await page.evaluate(_JS_CONTAR, selector)
+
+
+async def es_desafio(page) -> bool:
+    """True si la página es un desafío anti-bot o un bloqueo en lugar de la búsqueda."""
+    try:
+        return bool(await page.evaluate(_JS_DESAFIO))
+    except Exception:
+        return False
+
+
+async def esperar_productos(
+    page,
+    selector: str,
+    max_items: int,
+    techo_s: float,
+    espera_crecimiento_ms: int = 1500,
+    rondas_estables: int = 2,
+    farmacia: str = None,
+) -> int:
+    """
+    Espera a que la grilla de productos esté lista en lugar de dormir
+    tiempos fijos:
+
+    1. Espera la primera tarjeta (`selector`).
+    2. Hace scroll solo mientras el número de tarjetas siga creciendo.
+    3. Termina al haber `max_items` tarjetas, cuando el conteo no cambia
+       durante `rondas_estables` scrolls seguidos, o al llegar a `techo_s`
+       (techo duro por sitio, como red de seguridad).
+
+    Devuelve cuántas tarjetas había al terminar. Con `farmacia`, registra
+    las etapas 'espera' y 'scroll' en las métricas.
+    """
+    limite = time.monotonic() + techo_s
+    inicio = time.perf_counter()
+
+    def restante_ms() -> float:
+        return max(0.0, (limite - time.monotonic()) * 1000)
+
+    try:
+        await page.wait_for_selector(selector, state="attached", timeout=restante_ms() or 1)
+    except PlaywrightTimeoutError:
+        print(f"   ⚠️ No aparecieron tarjetas ({selector}) en {techo_s}s")
+        observar_etapa(farmacia, "espera", inicio)
+        return 0
+    observar_etapa(farmacia, "espera", inicio)
+
+    inicio = time.perf_counter()
+    conteo = await contar_tarjetas(page, selector)
+    estables = 0
+    while conteo < max_items and estables < rondas_estables and restante_ms() > 0:
+        await page.evaluate("window.scrollTo(0, document.body.scrollHeight)")
+        try:
+            # Vuelve apenas aparecen tarjetas nuevas (lazy-load / scroll infinito)
+            await page.wait_for_function(
+                _JS_CRECIO, arg=[selector, conteo],
+                timeout=min(espera_crecimiento_ms, restante_ms()) or 1,
+            )
+            estables = 0
+        except PlaywrightTimeoutError:
+            estables += 1
+        conteo = await contar_tarjetas(page, selector)
+
+    observar_etapa(farmacia, "scroll", inicio)
+    return conteo
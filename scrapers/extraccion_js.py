@@ -0,0 +1,200 @@
+from scrapers.config import EXTRACCION_MODO
+from scrapers.metricas import medir_etapa
+
+# =============================================
+# EXTRACCIÓN DENTRO DEL NAVEGADOR (page.evaluate)
+# =============================================
+# En lugar de serializar todo el DOM con page.content() y parsearlo con
+# BeautifulSoup, un único script recorre las tarjetas en la propia página
+# y devuelve solo la lista compacta de productos. No tiene nada propio de
+# ningún sitio: recibe la EspecSitio traducida a datos (`espec.args_js`)
+# y aplica la misma lógica (enlace -> nombre -> imagen -> precios) que
+# `parsers.extraer_productos`, que sigue disponible como respaldo
+# (EXTRACCION_MODO=bs4).
+
+MODO_JS = "js"
+MODO_BS4 = "bs4"
+
+# Ayudantes comunes, equivalentes a limpiar_precio, get_text(strip=True),
+# urljoin y class_=re.compile(...) del lado Python.
+_JS_AYUDANTES = r"""
+    const NO_DISP = "No disponible";
+    const RE_PRECIO = /S\/\s*[\d,\.]+/;
+    const limpiarPrecio = (t) => {
+        if (!t) return NO_DISP;
+        const m = t.match(/S\/\s*([\d,\.]+)/);
+        if (!m) return NO_DISP;
+        const num = m[1].replace(/,/g, '');
+        const v = Number(num);
+        return Number.isNaN(v) ? `S/ ${num}` : `S/ ${v.toFixed(2)}`;
+    };
+    const texto = (el) => {
+        if (!el) return '';
+        const w = document.createTreeWalker(el, NodeFilter.SHOW_TEXT);
+        let s = '', n;
+        while ((n = w.nextNode())) {
+            const p = n.parentElement && n.parentElement.tagName;
+            if (p === 'SCRIPT' || p === 'STYLE') continue;
+            s += n.nodeValue.trim();
+        }
+        return s;
+    };
+    const unir = (href) => {
+        try { return new URL(href || '', args.baseUrl).href; } catch (e) { return href; }
+    };
+    const regex = (r, extra = '') => (r ? new RegExp(r.fuente, r.flags + extra) : null);
+    const conClase = (el, re) => [...el.classList].some((c) => re.test(c));
+    const textoConPrecio = (el) => {
+        const w = document.createTreeWalker(el, NodeFilter.SHOW_TEXT);
+        let n;
+        while ((n = w.nextNode())) { if (RE_PRECIO.test(n.nodeValue)) return n.nodeValue.trim(); }
+        return null;
+    };
+    const colapsar = (t) => (t || '').replace(/\s{2,}/g, ' ').trim();
+"""
+
+# Reglas de parsers.py (Css, PorClase, Ancestro, Texto, EnteroYFraccion)
+# convertidas en funciones a partir de su descripción `js()`.
+_JS_REGLAS = r"""
+    const buscador = (b) => {
+        if (b.css) return (el) => el.querySelector(b.css);
+        const re = regex(b.clase);
+        return (el) => {
+            for (const e of el.querySelectorAll(b.tags)) { if (conClase(e, re)) return e; }
+            return null;
+        };
+    };
+    const ancestro = (a) => {
+        const tag = a.tag.toUpperCase(), re = regex(a.clase);
+        return (el) => {
+            for (let p = el.parentElement; p; p = p.parentElement) {
+                if (p.tagName === tag && (!re || conClase(p, re))) return p;
+            }
+            return null;
+        };
+    };
+    const reglaPrecio = (r) => {
+        if (r.texto) {
+            const buscar = buscador(r.texto);
+            return (el) => { const e = buscar(el); return e ? texto(e) : null; };
+        }
+        const entero = buscador(r.entero), fraccion = buscador(r.fraccion);
+        return (el) => {
+            const e = entero(el);
+            if (!e) return null;
+            let valor = texto(e);
+            const f = fraccion(el);
+            if (f) valor += '.' + texto(f);
+            return `S/ ${valor}`;
+        };
+    };
+"""
+
+# Equivalente a parsers._extraer_tarjeta + extraer_productos
+_JS_EXTRACTOR = r"""
+    const espec = args.espec;
+    const enlacePatron = regex(espec.enlacePatron);
+    const tarjetaDe = espec.tarjeta ? ancestro(espec.tarjeta) : null;
+    const reglasNombre = espec.nombreReglas.map(buscador);
+    const nombreQuitar = regex(espec.nombreQuitar, 'g');  // re.sub quita todas las apariciones
+    const imagenDe = buscador(espec.imagen);
+    const regularDe = espec.regular ? reglaPrecio(espec.regular) : null;
+    const reglasOferta = espec.oferta.map(reglaPrecio);
+    const vistos = new Set();
+
+    const extraer = (item) => {
+        // 1. ENLACE
+        const enlace = item.tagName === 'A' ? item : item.querySelector('a[href]');
+        if (!enlace) return null;
+        const crudo = (enlace.getAttribute('href') || '').trim();
+        if (!crudo || (enlacePatron && !enlacePatron.test(crudo))) return null;
+        const href = espec.enlaceAbsoluto ? unir(crudo) : crudo;
+        if (vistos.has(href) || (espec.enlaceMinRuta && href.length < args.baseUrl.length + espec.enlaceMinRuta)) return null;
+        vistos.add(href);
+
+        const tarjeta = (tarjetaDe && item.tagName === 'A' && tarjetaDe(item)) || item;
+
+        // 2. NOMBRE
+        let nombre = '';
+        for (const regla of reglasNombre) {
+            const el = regla(tarjeta);
+            if (el) { nombre = texto(el); break; }
+        }
+        if (nombre.length < 3) nombre = texto(enlace);
+        if (nombreQuitar) nombre = nombre.replace(nombreQuitar, '').trim();
+        nombre = colapsar(nombre);
+        if (nombre.length < 3) return null;
+
+        // 3. IMAGEN
+        let imagen = NO_DISP;
+        const img = imagenDe(tarjeta);
+        if (img) imagen = unir(espec.imagenAtributos.map((a) => img.getAttribute(a)).find((v) => v));
+
+        // 4. PRECIOS
+        let regular = NO_DISP;
+        if (regularDe) {
+            const t = regularDe(tarjeta);
+            if (t !== null) regular = limpiarPrecio(t);
+        }
+        let oferta = NO_DISP;
+        for (const regla of reglasOferta) {
+            let t = regla(tarjeta);
+            if (t === null) continue;
+            // A veces el regular está dentro del mismo bloque: se quitan todas sus apariciones
+            if (espec.quitarRegularDeOferta && regular !== NO_DISP) t = t.replaceAll(regular.replace('S/ ', ''), '');
+            oferta = limpiarPrecio(t);
+            if (oferta !== NO_DISP) break;
+        }
+        if (oferta === NO_DISP && espec.precioEnTexto) {
+            const t = textoConPrecio(tarjeta);
+            if (t) oferta = limpiarPrecio(t);
+        }
+        if (espec.intercambiarPrecios && oferta === NO_DISP && regular !== NO_DISP) {
+            oferta = regular;
+            regular = NO_DISP;
+        }
+        if (espec.descartarRegularIgual && oferta === regular) regular = NO_DISP;
+        return {Producto: nombre, Precio_Oferta: oferta, Precio_Regular: regular, Imagen_URL: imagen, Enlace: href};
+    };
+
+    // Los selectores siguientes solo se consultan si los anteriores no alcanzaron
+    function* candidatos() {
+        for (const selector of espec.candidatos) yield* document.querySelectorAll(selector);
+    }
+    const productos = [];
+    for (const item of candidatos()) {
+        if (productos.length >= args.maxItems) break;
+        let p = null;
+        try { p = extraer(item); } catch (err) { continue; }
+        if (p) productos.push(p);
+    }
+    return productos;
+"""
+
+SCRIPT_EXTRACCION = "(args) => {" + _JS_AYUDANTES + _JS_REGLAS + _JS_EXTRACTOR + "}"
+
+
+async def extraer_en_navegador(page, espec, max_items: int, modo: str = None, base_url: str = None):
+    """
+    Ejecuta el extractor genérico dentro de la página con las reglas de
+    `espec` (una parsers.EspecSitio) y devuelve los productos ya armados
+    (con 'Farmacia'); [] si la página no tiene productos.
+
+    Devuelve None si el modo es 'bs4' o si el script falla; en esos casos
+    el scraper cae al camino page.content() + BS4.
+    """
+    if (modo or EXTRACCION_MODO) != MODO_JS:
+        return None
+    try:
+        with medir_etapa(espec.nombre, "extraccion"):
+            productos = await page.evaluate(
+                SCRIPT_EXTRACCION,
+                {"baseUrl": base_url or espec.base_url, "maxItems": max_items, "espec": espec.args_js},
+            )
+    except Exception as e:
+        print(f"   ⚠️ Extracción JS falló en {espec.nombre}, usando BeautifulSoup: {e}")
+        return None
+
+    for producto in productos:
+        producto["Farmacia"] = espec.nombre
+    return productos
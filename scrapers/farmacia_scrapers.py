@@ -1,528 +1,304 @@
-import asyncio
-import re
-from urllib.parse import urljoin, quote_plus
-from playwright.async_api import async_playwright
-from bs4 import BeautifulSoup
+import time
+from contextlib import aclosing, nullcontext
+from functools import partial
+
+# Helpers del navegador (se re-exportan por compatibilidad)
+from scrapers.navegador import (
+    USER_AGENT,
+    block_resources_async,
+    crear_contexto_navegador,
+    descartar_sesion,
+    obtener_contexto,
+    obtener_pagina,
+)
+from scrapers.espera import es_desafio, esperar_productos
+from scrapers.metricas import medir_etapa
+from scrapers.extraccion_js import extraer_en_navegador
+from scrapers.planificador import ejecutar_sitios, ejecutar_lote, resultados_sin_turno, LimitadorSitios
+from scrapers.admision import PLAZO_AGOTADO, Saturado
+from scrapers.cache import cache_resultados
+from scrapers.coalescencia import vuelos_busquedas, vuelos_sitios
+from scrapers.salud import salud_farmacias
+from scrapers.indice import indice_precios
+from scrapers.sugerencias import indice_sugerencias
+from scrapers.texto import normalizar_keyword
+from scrapers.config import SCRAPER_DEADLINE_MS
+from scrapers.parsers import (
+    ESPECS,
+    EspecSitio,
+    extraer_productos,
+    limpiar_precio,
+)
+from scrapers.http_rapido import FETCHERS, con_respaldo_http
 
 # NOTA: Pandas, ipywidgets, etc., no son necesarios aquí
 # solo las librerías para el scraping en sí.
 
-# User-Agent estándar para evitar bloqueos
-USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
-
-def limpiar_precio(texto: str) -> str:
-    """Extrae y formatea el primer precio 'S/ XX.XX' encontrado."""
-    if not texto:
-        return "No disponible"
-
-    # Busca el patrón S/ seguido de números, comas y puntos
-    match = re.search(r'S/\s*([\d,\.]+)', texto)
-    if match:
-        precio_num = match.group(1).replace(',', '') # Quita comas de miles
-        try:
-            # Formatea a dos decimales
-            return f"S/ {float(precio_num):.2f}"
-        except ValueError:
-            return f"S/ {precio_num}" # Devuelve lo que encontró si no puede castear
-
-    return "No disponible"
-
-# Helper (ayudante) asíncrono para bloquear recursos
-async def block_resources_async(route):
-    """Bloquea la carga de imágenes, CSS, fuentes y medios"""
-    if route.request.resource_type in ["image", "stylesheet", "font", "media"]:
-        await route.abort()
-    else:
-        await route.continue_()
-
-async def crear_contexto_navegador(playwright_instance):
-    """
-    Lanza el navegador y crea un contexto con configuración anti-bot
-    Y CON BLOQUEO DE RECURSOS.
-    """
-    browser = await playwright_instance.chromium.launch(
-        headless=True,
-        args=[
-            "--no-sandbox",
-            "--disable-setuid-sandbox",
-            "--disable-dev-shm-usage",
-            "--disable-gpu",
-            "--single-process"
-        ]
-    )
-    context = await browser.new_context(
-        user_agent=USER_AGENT,
-        java_script_enabled=True,
-        bypass_csp=True
-    )
-
-    # --- ¡ESTA ES LA LÍNEA MÁGICA DE OPTIMIZACIÓN! ---
-    # Intercepta todas las peticiones y aplica la función de bloqueo
-    await context.route("**/*", block_resources_async)
-    # --------------------------------------------------
-
-    await context.add_init_script("Object.defineProperty(navigator, 'webdriver', {get: () => undefined});")
-    return browser, context
-
 # =============================================
-# SCRAPER INKAFARMA Y MIFARMA
+# SCRAPER GENÉRICO (uno para todas las farmacias)
 # =============================================
-async def scrape_farmacia_playwright(url: str, farmacia: str, max_items: int = 15):
+# Lo que cambia entre sitios (URL de búsqueda, tarjetas a esperar, techo de
+# espera y reglas de extracción, usadas tanto por el extractor del navegador
+# como por el parseo con BS4) vive en la EspecSitio de cada farmacia, en
+# scrapers/parsers.py.
+async def scrape_sitio_playwright(espec: EspecSitio, keyword: str, max_items: int = 15):
+    farmacia = espec.nombre
     print(f"   Cargando {farmacia}...")
     productos = []
-    base_url = "https://inkafarma.pe" if farmacia == "Inkafarma" else "https://www.mifarma.com.pe"
 
     try:
-        async with async_playwright() as p:
-            browser, context = await crear_contexto_navegador(p)
-            page = await context.new_page()
-            await page.goto(url, wait_until="domcontentloaded", timeout=45000)
-
-            await page.wait_for_timeout(5000) # Espera para contenido dinámico
-
-            # Scroll más agresivo
-            for _ in range(5):
-                await page.evaluate("window.scrollTo(0, document.body.scrollHeight)")
-                await page.wait_for_timeout(2000)
-
-            content = await page.content()
-            await browser.close()
-
-            soup = BeautifulSoup(content, 'html.parser')
-
-            # Múltiples selectores para encontrar 'cards' de productos
-            selectors = [
-                'div[data-testid="product-card"]', 'article[class*="product"]',
-                'div.product-card', 'div.product-item', 'div[class*="ProductCard"]',
-                'li.product', 'a[href*="/producto/"]', 'a[href*="/p/"]'
-            ]
-            cards = []
-            for selector in selectors:
-                cards.extend(soup.select(selector))
-
-            unique_cards = list(dict.fromkeys(cards)) # Eliminar duplicados
-            print(f"   📦 {len(unique_cards)} elementos detectados en {farmacia}")
-
-            seen_urls = set()
-            for item in unique_cards:
-                try:
-                    # 1. ENLACE
-                    link_elem = item.find('a', href=True) if item.name != 'a' else item
-                    if not link_elem or not link_elem.get('href'):
-                        continue
-
-                    href = urljoin(base_url, link_elem['href'].strip())
-                    if href in seen_urls or len(href) < len(base_url) + 5:
-                        continue
-                    seen_urls.add(href)
-
-                    # 2. NOMBRE
-                    nombre = ""
-                    nombre_elem = item.find(['h1', 'h2', 'h3', 'h4'], class_=re.compile(r'name|title', re.I))
-                    if nombre_elem:
-                        nombre = nombre_elem.get_text(strip=True)
-                    if not nombre or len(nombre) < 3:
-                        nombre = link_elem.get_text(strip=True)
-
-                    nombre = re.sub(r'\s{2,}', ' ', nombre).strip()
-                    if not nombre or len(nombre) < 3:
-                        continue
-
-                    # 3. IMAGEN
-                    img_elem = item.find('img', src=True)
-                    img_url = "No disponible"
-                    if img_elem:
-                        img_url = urljoin(base_url, img_elem.get('src', 'No disponible'))
-
-                    # 4. PRECIOS
-                    precio_oferta = "No disponible"
-                    precio_regular = "No disponible"
-
-                    # Precio Regular (tachado)
-                    reg_price_elem = item.find(class_=re.compile(r'old|original|list-price|line-through', re.I))
-                    if reg_price_elem:
-                        precio_regular = limpiar_precio(reg_price_elem.get_text(strip=True))
-
-                    # Precio Oferta (principal)
-                    oferta_elem = item.find(class_=re.compile(r'price|precio', re.I))
-                    if oferta_elem:
-                         # A veces el regular está dentro del mismo div, lo quitamos
-                         texto_precio = oferta_elem.get_text(strip=True)
-                         if precio_regular != "No disponible":
-                             texto_precio = texto_precio.replace(precio_regular.replace("S/ ", ""), "")
-                         precio_oferta = limpiar_precio(texto_precio)
-
-                    # Fallback si no se encontró con clase
-                    if precio_oferta == "No disponible":
-                        precio_match = item.find(string=re.compile(r'S/\s*[\d,\.]+'))
-                        if precio_match:
-                            precio_oferta = limpiar_precio(precio_match.strip())
-
-                    # Lógica de ajuste
-                    if precio_oferta == "No disponible" and precio_regular != "No disponible":
-                        precio_oferta = precio_regular
-                        precio_regular = "No disponible"
-                    if precio_oferta == precio_regular:
-                        precio_regular = "No disponible"
-
-
-                    productos.append({
-                        "Producto": nombre,
-                        "Precio_Oferta": precio_oferta,
-                        "Precio_Regular": precio_regular,
-                        "Imagen_URL": img_url,
-                        "Enlace": href,
-                        "Farmacia": farmacia
-                    })
-
-                    if len(productos) >= max_items:
-                        break
-                except Exception:
-                    continue
-
-            print(f"   ✅ {len(productos)} productos extraídos de {farmacia}")
+        async with obtener_pagina(farmacia) as page:
+            with medir_etapa(farmacia, "goto"):
+                await page.goto(espec.url(keyword), wait_until="domcontentloaded", timeout=espec.goto_timeout_ms)
+
+            # Espera a la grilla; scroll solo mientras sigan apareciendo tarjetas
+            tarjetas = await esperar_productos(page, espec.selector_listo, max_items, farmacia=farmacia,
+                                               techo_s=espec.techo_s)
+            if not tarjetas:
+                # Grilla que no cargó (desafío anti-bot, sesión rota...): no reusar la sesión caliente.
+                # Se decide aquí, mientras la sesión sigue prestada a este scraper.
+                motivo = "desafío anti-bot" if await es_desafio(page) else "la grilla no cargó"
+                await descartar_sesion(page, motivo)
+
+            # Una búsqueda sin resultados con la grilla cargada no invalida la sesión
+            # ni se repite con BS4: solo se cae a BS4 si el extractor JS no corrió
+            productos = await extraer_en_navegador(page, espec, max_items)
+            if productos is None:
+                with medir_etapa(farmacia, "extraccion"):
+                    content = await page.content()
+
+        if productos is not None:
+            print(f"   ✅ {len(productos)} productos extraídos de {farmacia} (JS)")
             return productos
-    except Exception as e:
-        print(f"   ❌ Error en {farmacia}: {e}")
-        return []
 
-# =============================================
-# SCRAPER BOTICAS PERU
-# =============================================
-async def scrape_boticasperu_playwright(keyword: str, max_items: int = 15):
-    url = f"https://boticasperu.pe/catalogsearch/result/?q={quote_plus(keyword)}"
-    print(f"   Cargando BoticasPeru...")
-    productos = []
-    base_url = "https://boticasperu.pe"
-
-    try:
-        async with async_playwright() as p:
-            browser, context = await crear_contexto_navegador(p)
-            page = await context.new_page()
-            await page.goto(url, wait_until="domcontentloaded", timeout=40000)
-
-            await page.wait_for_timeout(3000)
-            for _ in range(4):
-                await page.evaluate("window.scrollTo(0, document.body.scrollHeight)")
-                await page.wait_for_timeout(1500)
-
-            content = await page.content()
-            await browser.close()
-
-            soup = BeautifulSoup(content, 'html.parser')
-            cards = soup.select("li.item.product, div.product-item")
-            print(f"   📦 {len(cards)} productos detectados en BoticasPeru")
-
-            seen = set()
-            for card in cards:
-                try:
-                    # 1. ENLACE
-                    a_tag = card.find('a', href=True)
-                    if not a_tag: continue
-                    href = a_tag.get('href', '').strip()
-                    if not href or href in seen or '.html' not in href:
-                        continue
-                    seen.add(href)
-
-                    # 2. NOMBRE
-                    nombre_elem = card.find(class_='product-item-link')
-                    nombre = nombre_elem.get_text(strip=True) if nombre_elem else a_tag.get_text(strip=True)
-                    nombre = re.sub(r'\s{2,}', ' ', nombre).strip()
-                    if not nombre or len(nombre) < 3:
-                        continue
-
-                    # 3. IMAGEN
-                    img_elem = card.find('img', class_='product-image-photo')
-                    img_url = "No disponible"
-                    if img_elem:
-                        img_url = img_elem.get('src') or img_elem.get('data-src')
-                        img_url = urljoin(base_url, img_url)
-
-                    # 4. PRECIOS (Magento: old-price, special-price, price)
-                    precio_oferta = "No disponible"
-                    precio_regular = "No disponible"
-
-                    reg_elem = card.find('span', class_='old-price')
-                    if reg_elem:
-                        precio_regular = limpiar_precio(reg_elem.find('span', class_='price').get_text(strip=True))
-
-                    oferta_elem = card.find('span', class_='special-price')
-                    if oferta_elem:
-                        precio_oferta = limpiar_precio(oferta_elem.find('span', class_='price').get_text(strip=True))
-
-                    if precio_oferta == "No disponible":
-                        norm_elem = card.find('span', class_='price-wrapper', attrs={'data-price-type': 'finalPrice'})
-                        if norm_elem:
-                            precio_oferta = limpiar_precio(norm_elem.find('span', class_='price').get_text(strip=True))
-
-                    if precio_oferta == "No disponible": # Fallback
-                        precio_elem = card.find('span', class_='price')
-                        if precio_elem:
-                            precio_oferta = limpiar_precio(precio_elem.get_text(strip=True))
-
-                    productos.append({
-                        "Producto": nombre,
-                        "Precio_Oferta": precio_oferta,
-                        "Precio_Regular": precio_regular,
-                        "Imagen_URL": img_url,
-                        "Enlace": href,
-                        "Farmacia": "BoticasPeru"
-                    })
-                    if len(productos) >= max_items:
-                        break
-                except Exception:
-                    continue
-            print(f"   ✅ {len(productos)} productos extraídos de BoticasPeru")
-            return productos
+        with medir_etapa(farmacia, "parseo"):
+            productos = extraer_productos(content, espec, max_items)
+        print(f"   ✅ {len(productos)} productos extraídos de {farmacia}")
+        return productos
     except Exception as e:
-        print(f"   ❌ Error en BoticasPeru: {e}")
-        return []
+        print(f"   ❌ Error en {farmacia}: {e}")
+        raise # El planificador lo reporta como estado "error" del sitio
 
 # =============================================
-# SCRAPER BOTICAS Y SALUD
+# REGISTRO DE SITIOS
 # =============================================
-async def scrape_boticasysalud_playwright(keyword: str, max_items: int = 15):
-    url = f"https://www.boticasysalud.com/tienda/busqueda?q={quote_plus(keyword)}"
-    print(f"   Cargando Boticas y Salud...")
-    productos = []
-    base_url = "https://www.boticasysalud.com"
+def scraper_de(espec: EspecSitio):
+    """
+    scraper(keyword, max_items) de una farmacia: Playwright con su
+    EspecSitio y, si la espec tiene `http_rapido`, primero HTTP directo.
+    """
+    scraper = partial(scrape_sitio_playwright, espec)
+    if espec.http_rapido:
+        scraper = con_respaldo_http(partial(FETCHERS[espec.http_rapido], espec), scraper, espec.nombre)
+    return scraper
 
-    try:
-        async with async_playwright() as p:
-            browser, context = await crear_contexto_navegador(p)
-            page = await context.new_page()
-            await page.goto(url, wait_until="domcontentloaded", timeout=40000)
-
-            await page.wait_for_timeout(5000) # Espera larga para React
-            for _ in range(8): # Scroll agresivo
-                await page.evaluate("window.scrollTo(0, document.body.scrollHeight)")
-                await page.wait_for_timeout(1500)
-
-            content = await page.content()
-            await browser.close()
-            soup = BeautifulSoup(content, 'html.parser')
-
-            links = soup.find_all('a', href=re.compile(r'/tienda/productos/'))
-            print(f"   📦 {len(links)} productos detectados en Boticas y Salud")
-
-            seen = set()
-            for link in links:
-                try:
-                    # 1. ENLACE
-                    href = link.get('href', '').strip()
-                    if not href or href in seen: continue
-                    seen.add(href)
-                    href = urljoin(base_url, href)
-
-                    card = link.find_parent('div', class_=re.compile(r'product')) or link
-
-                    # 2. NOMBRE
-                    nombre = ""
-                    nombre_elem = card.find('div', class_=re.compile(r'product-card__name|product__name'))
-                    if nombre_elem:
-                        nombre = nombre_elem.get_text(strip=True)
-                    if not nombre:
-                        nombre = link.get_text(strip=True)
-                    nombre = re.sub(r'\s{2,}', ' ', nombre).strip()
-                    if not nombre or len(nombre) < 3: continue
-
-                    # 3. IMAGEN
-                    img_elem = card.find('img', src=True)
-                    img_url = "No disponible"
-                    if img_elem:
-                        img_url = urljoin(base_url, img_elem.get('src') or img_elem.get('data-src'))
-
-                    # 4. PRECIOS
-                    precio_oferta = "No disponible"
-                    precio_regular = "No disponible"
-
-                    reg_elem = card.find('div', class_=re.compile(r'price-original|old-price|list-price', re.I))
-                    if reg_elem:
-                        precio_regular = limpiar_precio(reg_elem.get_text(strip=True))
-
-                    oferta_elem = card.find('div', class_=re.compile(r'price|precio'))
-                    if oferta_elem:
-                        texto_precio = oferta_elem.get_text(strip=True)
-                        if precio_regular != "No disponible":
-                            texto_precio = texto_precio.replace(precio_regular.replace("S/ ", ""), "")
-                        precio_oferta = limpiar_precio(texto_precio)
-
-                    if precio_oferta == "No disponible":
-                        precio_match = card.find(string=re.compile(r'S/\s*[\d,\.]+'))
-                        if precio_match:
-                            precio_oferta = limpiar_precio(precio_match.strip())
-
-                    if precio_oferta == "No disponible" and precio_regular != "No disponible":
-                        precio_oferta = precio_regular
-                        precio_regular = "No disponible"
-
-                    productos.append({
-                        "Producto": nombre,
-                        "Precio_Oferta": precio_oferta,
-                        "Precio_Regular": precio_regular,
-                        "Imagen_URL": img_url,
-                        "Enlace": href,
-                        "Farmacia": "Boticas y Salud"
-                    })
-                    if len(productos) >= max_items:
-                        break
-                except Exception:
-                    continue
-            print(f"   ✅ {len(productos)} productos extraídos de Boticas y Salud")
-            return productos
-    except Exception as e:
-        print(f"   ❌ Error en Boticas y Salud: {e}")
-        return []
+# Nombre de la farmacia -> scraper(keyword, max_items), uno por EspecSitio de parsers.ESPECS
+SITIOS = {nombre: scraper_de(espec) for nombre, espec in ESPECS.items()}
 
 # =============================================
-# SCRAPER FARMACIA UNIVERSAL
+# FUNCIÓN PRINCIPAL DE COMPARACIÓN (VERSIÓN CONCURRENTE ACOTADA)
 # =============================================
-async def scrape_farmaciauniversal_playwright(keyword: str, max_items: int = 15):
-    url = f"https://www.farmaciauniversal.com/{quote_plus(keyword)}?_q={quote_plus(keyword)}&map=ft"
-    print(f"   Cargando Farmacia Universal...")
-    productos = []
-    base_url = "https://www.farmaciauniversal.com"
-
-    try:
-        async with async_playwright() as p:
-            browser, context = await crear_contexto_navegador(p)
-            page = await context.new_page()
-            await page.goto(url, wait_until="domcontentloaded", timeout=40000)
-
-            await page.wait_for_timeout(6000) # Espera para VTEX
-            for _ in range(10): # Scroll intensivo para VTEX
-                await page.evaluate("window.scrollTo(0, document.body.scrollHeight)")
-                await page.wait_for_timeout(1500)
-
-            content = await page.content()
-            await browser.close()
-            soup = BeautifulSoup(content, 'html.parser')
-
-            links = soup.find_all('a', href=re.compile(r'/[^/]+/p$'))
-            print(f"   📦 {len(links)} productos detectados en Farmacia Universal")
-
-            seen = set()
-            for link in links:
-                try:
-                    # 1. ENLACE
-                    href = link.get('href', '').strip()
-                    if not href or href in seen:
-                        continue
-                    seen.add(href)
-                    href = urljoin(base_url, href)
-
-                    card = link.find_parent('article') or link
-
-                    # 2. NOMBRE
-                    nombre = ""
-                    nombre_elem = card.find('span', class_=re.compile(r'productBrand|productName'))
-                    if nombre_elem:
-                        nombre = nombre_elem.get_text(strip=True)
-                    if not nombre:
-                        nombre = link.get_text(strip=True)
-
-                    nombre = re.sub(r'(?i)\b(comprar|agregar|ver)\b', '', nombre).strip()
-                    nombre = re.sub(r'\s{2,}', ' ', nombre).strip()
-                    if not nombre or len(nombre) < 3: continue
-
-                    # 3. IMAGEN
-                    img_elem = card.find('img', src=True)
-                    img_url = "No disponible"
-                    if img_elem:
-                        img_url = urljoin(base_url, img_elem.get('src') or img_elem.get('data-src'))
-
-                    # 4. PRECIOS (VTEX)
-                    precio_oferta = "No disponible"
-                    precio_regular = "No disponible"
-
-                    reg_elem = card.find('span', class_=re.compile(r'listPrice|list-price', re.I))
-                    if reg_elem:
-                        precio_regular = limpiar_precio(reg_elem.get_text(strip=True))
-
-                    # VTEX usa 'currencyInteger' y 'currencyFraction'
-                    precio_int = card.find('span', class_=re.compile(r'currencyInteger'))
-                    if precio_int:
-                        precio_valor = precio_int.get_text(strip=True)
-                        precio_frac = card.find('span', class_=re.compile(r'currencyFraction'))
-                        if precio_frac:
-                            precio_valor += "." + precio_frac.get_text(strip=True)
-                        precio_oferta = limpiar_precio(f"S/ {precio_valor}")
-                    else: # Fallback
-                        precio_match = card.find(string=re.compile(r'S/\s*[\d,\.]+'))
-                        if precio_match:
-                            precio_oferta = limpiar_precio(precio_match.strip())
-
-                    if precio_oferta == "No disponible" and precio_regular != "No disponible":
-                        precio_oferta = precio_regular
-                        precio_regular = "No disponible"
-
-                    productos.append({
-                        "Producto": nombre,
-                        "Precio_Oferta": precio_oferta,
-                        "Precio_Regular": precio_regular,
-                        "Imagen_URL": img_url,
-                        "Enlace": href,
-                        "Farmacia": "Farmacia Universal"
-                    })
-                    if len(productos) >= max_items:
-                        break
-                except Exception:
-                    continue
-            print(f"   ✅ {len(productos)} productos extraídos de Farmacia Universal")
-            return productos
-    except Exception as e:
-        print(f"   ❌ Error en Farmacia Universal: {e}")
-        return []
-
-# =============================================
-# FUNCIÓN PRINCIPAL DE COMPARACIÓN (VERSIÓN SECUENCIAL)
-# =============================================
-async def comparar_precios_playwright(keyword: str, max_items: int = 15):
+def _deadline_s(deadline_ms: int = None):
+    """Presupuesto en segundos (None = sin presupuesto), con SCRAPER_DEADLINE_MS por defecto."""
+    if deadline_ms is None:
+        deadline_ms = SCRAPER_DEADLINE_MS
+    return deadline_ms / 1000 if deadline_ms and deadline_ms > 0 else None
+
+# Cliente de los procesos trabajadores (TRABAJADORES > 0); None = scrapear aquí
+_trabajadores = None
+
+def configurar_trabajadores(cliente):
+    """Registra (o quita, con None) el ClienteTrabajadores al que se mandan los scrapes."""
+    global _trabajadores
+    _trabajadores = cliente
+
+def obtener_trabajadores():
+    return _trabajadores
+
+def _restante(inicio: float, deadline_s: float):
+    """Segundos que le quedan al presupuesto de una búsqueda que llegó en `inicio` (None = sin presupuesto)."""
+    if deadline_s is None:
+        return None
+    return deadline_s - (time.monotonic() - inicio)
+
+def _turno(admision, cache, sitios: dict, keyword: str, max_items: int, espera_s: float = None):
+    """
+    Turno del control de admisión para un scrape en vivo, esperando como
+    mucho `espera_s` (lo que quede del presupuesto). Si no hay control o
+    todos los sitios se pueden responder desde la caché, no se toma turno
+    (nullcontext).
+    """
+    if admision is None:
+        return nullcontext()
+    if cache is not None and all(cache.contiene(keyword, max_items, farmacia) for farmacia in sitios):
+        return nullcontext()
+    return admision.admitir(espera_s)
+
+def _sin_turno(sitios: dict, keyword: str, max_items: int, deadline_s: float, inicio: float, cache) -> list:
+    """ResultadoSitio de una búsqueda que agotó su presupuesto en la cola de admisión (caché o "timeout")."""
+    print(f"--- ⏱️ '{keyword}' agotó su presupuesto ({deadline_s}s) esperando turno ---")
+    return resultados_sin_turno(sitios, keyword, max_items, deadline_s, time.monotonic() - inicio, cache)
+
+def en_cache(keyword: str, max_items: int = 15, farmacias: list = None) -> bool:
+    """True si todas las farmacias pedidas tienen un resultado utilizable en `cache_resultados`."""
+    return all(cache_resultados.contiene(keyword, max_items, farmacia) for farmacia in _sitios(farmacias))
+
+def _sitios(farmacias: list = None) -> dict:
+    """
+    SITIOS completo o solo las farmacias pedidas (en el orden de SITIOS).
+    Con trabajadores configurados, cada scraper manda el trabajo a un
+    proceso trabajador en lugar de correr en este proceso.
+    """
+    sitios = SITIOS
+    if farmacias:
+        nombres = {getattr(f, "value", f) for f in farmacias}
+        sitios = {nombre: scraper for nombre, scraper in SITIOS.items() if nombre in nombres}
+    if _trabajadores is not None:
+        sitios = {nombre: _trabajadores.scraper(nombre) for nombre in sitios}
+    return sitios
+
+async def comparar_precios_detallado(keyword: str, max_items: int = 15, concurrencia: int = None, usar_cache: bool = True,
+                                     deadline_ms: int = None, farmacias: list = None, admision=None):
     """
-    Compara precios en las 5 farmacias principales del Perú
-    VERSIÓN SECUENCIAL: Ejecuta un scraper después del otro
-    para no saturar la RAM del servidor gratuito.
+    Compara precios en las 5 farmacias principales del Perú.
+    Los scrapers corren en paralelo hasta el límite de concurrencia
+    (SCRAPER_CONCURRENCIA / SCRAPER_MEMORIA_MB) y los productos se
+    agregan en el orden en que termina cada sitio. Con `usar_cache`,
+    los sitios ya consultados se responden desde `cache_resultados`.
+    Los sitios que vienen fallando seguido se omiten ("skipped") hasta
+    que una prueba muestre que se recuperaron (`salud_farmacias`).
+
+    Con `farmacias`, solo se consultan esas (ver modelo.Farmacia).
+    Con `deadline_ms`, la búsqueda responde como mucho en ese tiempo:
+    los sitios que no terminaron se reportan como "timeout" y se
+    devuelven los productos de los que sí alcanzaron.
+
+    Con `usar_cache`, si el índice SQLite (`indice_precios`) tiene datos
+    frescos de todas las farmacias se responde desde ahí sin scrapear.
+    Los resultados en vivo se guardan en el índice. Cada resultado de un
+    sitio alimenta el autocompletado (`indice_sugerencias`).
+
+    Búsquedas idénticas simultáneas comparten una sola ejecución.
+    El resultado es compartido: no modificarlo en el llamador.
+
+    Con `admision` (ver admision.ControlAdmision), solo la ejecución que
+    scrapea en vivo espera turno: las respuestas desde el índice o la
+    caché y las búsquedas que se suman a una en curso no ocupan turno.
+    El presupuesto de `deadline_ms` se cuenta desde la llamada e incluye
+    esa espera; si se agota en la cola, se responde sin scrapear (lo que
+    haya en la caché y "timeout" para el resto).
+
+    Devuelve {"productos": [...], "sitios": [estado por farmacia]}.
     """
-    url_inka = f"https://inkafarma.pe/buscador?keyword={quote_plus(keyword)}"
-    url_mi = f"https://www.mifarma.com.pe/buscador?keyword={quote_plus(keyword)}"
+    inicio = time.monotonic()
+    sitios = _sitios(farmacias)
+    if usar_cache:
+        desde_indice = await indice_precios.buscar(keyword, max_items, list(sitios))
+        if desde_indice is not None:
+            print(f"--- ⚡ '{keyword}' respondido desde el índice de precios ---")
+            for resultado in desde_indice:
+                indice_sugerencias.registrar(keyword, resultado.productos)
+            return {
+                "productos": [p for resultado in desde_indice for p in resultado.productos],
+                "sitios": [resultado.resumen() for resultado in desde_indice],
+            }
+
+    deadline_s = _deadline_s(deadline_ms)
+    clave = (normalizar_keyword(keyword), max_items, concurrencia, usar_cache, deadline_s, tuple(sitios))
+    return await vuelos_busquedas.ejecutar(
+        clave, lambda: _comparar_precios(keyword, max_items, concurrencia, usar_cache, deadline_s, sitios, admision, inicio)
+    )
 
+async def _comparar_precios(keyword: str, max_items: int, concurrencia: int, usar_cache: bool, deadline_s: float,
+                            sitios: dict, admision=None, inicio: float = None):
     todos_productos = []
+    resultados = []
+    if inicio is None:
+        inicio = time.monotonic()
 
-    # Ejecutamos uno por uno
-    try:
-        print("--- Inciando Scraper 1/5: Inkafarma ---")
-        r1 = await scrape_farmacia_playwright(url_inka, "Inkafarma", max_items)
-        todos_productos.extend(r1)
-    except Exception as e:
-        print(f"--- ❌ Error en Scraper 1 (Inkafarma): {e} ---")
-
-    try:
-        print("--- Inciando Scraper 2/5: Mifarma ---")
-        r2 = await scrape_farmacia_playwright(url_mi, "Mifarma", max_items)
-        todos_productos.extend(r2)
-    except Exception as e:
-        print(f"--- ❌ Error en Scraper 2 (Mifarma): {e} ---")
-
+    cache = cache_resultados if usar_cache else None
     try:
-        print("--- Inciando Scraper 3/5: BoticasPeru ---")
-        r3 = await scrape_boticasperu_playwright(keyword, max_items)
-        todos_productos.extend(r3)
-    except Exception as e:
-        print(f"--- ❌ Error en Scraper 3 (BoticasPeru): {e} ---")
-
-    try:
-        print("--- Inciando Scraper 4/5: Boticas y Salud ---")
-        r4 = await scrape_boticasysalud_playwright(keyword, max_items)
-        todos_productos.extend(r4)
-    except Exception as e:
-        print(f"--- ❌ Error en Scraper 4 (Boticas y Salud): {e} ---")
-
+        async with _turno(admision, cache, sitios, keyword, max_items, _restante(inicio, deadline_s)):
+            async for resultado in ejecutar_sitios(sitios, keyword, max_items, concurrencia=concurrencia,
+                                                   cache=cache, coalescedor=vuelos_sitios, deadline_s=deadline_s,
+                                                   salud=salud_farmacias, inicio=inicio):
+                todos_productos.extend(resultado.productos)
+                resultados.append(resultado)
+                indice_sugerencias.registrar(keyword, resultado.productos)
+    except Saturado as e:
+        if e.motivo != PLAZO_AGOTADO:
+            raise
+        # Nada nuevo que guardar en el índice: solo caché y timeouts
+        resultados = _sin_turno(sitios, keyword, max_items, deadline_s, inicio, cache)
+        return {"productos": [p for resultado in resultados for p in resultado.productos],
+                "sitios": [resultado.resumen() for resultado in resultados]}
+
+    await indice_precios.guardar(keyword, max_items, resultados)
+    print(f"--- ✅ Búsqueda completada ({len(resultados)} sitios) ---")
+    return {"productos": todos_productos, "sitios": [resultado.resumen() for resultado in resultados]}
+
+async def comparar_precios_stream(keyword: str, max_items: int = 15, concurrencia: int = None, usar_cache: bool = True,
+                                  deadline_ms: int = None, farmacias: list = None, admision=None):
+    """
+    Versión en streaming de la comparación: entrega un ResultadoSitio
+    por farmacia apenas termina su scraper. Si el consumidor se va
+    antes de terminar, los scrapers pendientes se cancelan.
+    Con `admision`, espera turno salvo que todo esté en la caché; la
+    espera cuenta dentro del presupuesto de `deadline_ms` (ver
+    `comparar_precios_detallado`).
+    """
+    inicio = time.monotonic()
+    deadline_s = _deadline_s(deadline_ms)
+    cache = cache_resultados if usar_cache else None
+    seleccion = _sitios(farmacias)
     try:
-        print("--- Inciando Scraper 5/5: Farmacia Universal ---")
-        r5 = await scrape_farmaciauniversal_playwright(keyword, max_items)
-        todos_productos.extend(r5)
-    except Exception as e:
-        print(f"--- ❌ Error en Scraper 5 (Farmacia Universal): {e} ---")
+        async with _turno(admision, cache, seleccion, keyword, max_items, _restante(inicio, deadline_s)):
+            sitios = ejecutar_sitios(seleccion, keyword, max_items, concurrencia=concurrencia,
+                                     cache=cache, coalescedor=vuelos_sitios, deadline_s=deadline_s,
+                                     salud=salud_farmacias, inicio=inicio)
+            async with aclosing(sitios):
+                async for resultado in sitios:
+                    indice_sugerencias.registrar(keyword, resultado.productos)
+                    yield resultado
+    except Saturado as e:
+        if e.motivo != PLAZO_AGOTADO:
+            raise
+        for resultado in _sin_turno(seleccion, keyword, max_items, deadline_s, inicio, cache):
+            yield resultado
+
+# Turnos por farmacia compartidos por todos los lotes en curso
+limitador_lote = LimitadorSitios()
+
+async def comparar_precios_lote(keywords: list, max_items: int = 15, usar_cache: bool = True):
+    """
+    Compara precios de muchos keywords en una sola llamada. Entrega
+    (keyword, [ResultadoSitio]) apenas termina cada keyword; los scrapes
+    comparten el pool de navegadores y respetan el límite por farmacia
+    de `limitador_lote`. Los keywords repetidos (tras normalizar) se
+    buscan una sola vez.
+    """
+    unicos = {}
+    for keyword in keywords:
+        if keyword and keyword.strip():
+            unicos.setdefault(normalizar_keyword(keyword), keyword.strip())
+
+    cache = cache_resultados if usar_cache else None
+    resultados = ejecutar_lote(_sitios(), list(unicos.values()), max_items, limitador_lote,
+                               cache=cache, coalescedor=vuelos_sitios, salud=salud_farmacias)
+    async with aclosing(resultados):
+        async for keyword, sitios in resultados:
+            for resultado in sitios:
+                indice_sugerencias.registrar(keyword, resultado.productos)
+            yield keyword, sitios
+
+async def precalentar_keyword(keyword: str, max_items: int):
+    """Scrapea un keyword ignorando cachés e índice (lo usa el Precalentador, que lo guarda en el índice)."""
+    await comparar_precios_detallado(keyword, max_items, usar_cache=False)
 
-    print("--- ✅ Búsqueda secuencial completada ---")
-    return todos_productos
\ No newline at end of file
+async def comparar_precios_playwright(keyword: str, max_items: int = 15):
+    """
+    Compara precios en las 5 farmacias principales del Perú.
+    Devuelve solo la lista de productos (ver `comparar_precios_detallado`).
+    """
+    resultado = await comparar_precios_detallado(keyword, max_items)
+    return resultado["productos"]
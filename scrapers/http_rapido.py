@@ -0,0 +1,146 @@
+import functools
+
+import httpx
+
+from scrapers.config import (
+    HTTP_RAPIDO,
+    HTTP_TIMEOUT_S,
+    HTTP_MAX_CONEXIONES,
+)
+from scrapers.navegador import USER_AGENT
+from scrapers.parsers import HTTP_MAGENTO, HTTP_VTEX, extraer_productos, limpiar_precio
+from scrapers.metricas import medir_etapa
+
+# =============================================
+# CAMINO RÁPIDO HTTP (sin navegador)
+# =============================================
+# Las tiendas VTEX (Farmacia Universal) y Magento (BoticasPeru) responden
+# la búsqueda desde el servidor, así que se pueden consultar con un cliente
+# HTTP liviano. Cada EspecSitio dice en `http_rapido` qué plataforma usa;
+# si la respuesta no trae productos se usa Playwright.
+
+# La API de catálogo de VTEX rechaza rangos de más de 50 productos: se pagina
+_VTEX_PAGINA = 50
+
+_cliente = None
+
+
+def obtener_cliente() -> httpx.AsyncClient:
+    """Cliente HTTP compartido (pool de conexiones keep-alive)."""
+    global _cliente
+    if _cliente is None or _cliente.is_closed:
+        _cliente = httpx.AsyncClient(
+            headers={"User-Agent": USER_AGENT, "Accept-Language": "es-PE,es;q=0.9"},
+            timeout=HTTP_TIMEOUT_S,
+            follow_redirects=True,
+            limits=httpx.Limits(
+                max_connections=HTTP_MAX_CONEXIONES,
+                max_keepalive_connections=HTTP_MAX_CONEXIONES,
+            ),
+        )
+    return _cliente
+
+
+async def cerrar_cliente():
+    global _cliente
+    if _cliente is not None:
+        await _cliente.aclose()
+        _cliente = None
+
+
+def _precio_vtex(valor) -> str:
+    if not valor:
+        return "No disponible"
+    return limpiar_precio(f"S/ {valor}")
+
+
+async def _pagina_vtex(base_url: str, keyword: str, desde: int, cantidad: int) -> list:
+    respuesta = await obtener_cliente().get(
+        f"{base_url}/api/catalog_system/pub/products/search",
+        params={"ft": keyword, "_from": desde, "_to": desde + cantidad - 1},
+    )
+    respuesta.raise_for_status()
+    items = respuesta.json()
+    if not isinstance(items, list):
+        raise ValueError(f"Respuesta inesperada de VTEX: {type(items).__name__}")
+    return items
+
+
+async def buscar_vtex_http(espec, keyword: str, max_items: int = 15, base_url: str = None):
+    """Búsqueda por la API pública de catálogo de VTEX (JSON), de a 50 productos por página."""
+    base_url = base_url or espec.base_url
+    items = []
+    while len(items) < max_items:
+        cantidad = min(_VTEX_PAGINA, max_items - len(items))
+        pagina = await _pagina_vtex(base_url, keyword, len(items), cantidad)
+        items.extend(pagina)
+        if len(pagina) < cantidad:
+            break
+
+    productos = []
+    for item in items:
+        nombre = (item.get("productName") or "").strip()
+        link_text = item.get("linkText")
+        skus = item.get("items") or []
+        if not nombre or not link_text or not skus:
+            continue
+
+        sku = skus[0]
+        imagenes = sku.get("images") or []
+        vendedores = sku.get("sellers") or []
+        oferta = (vendedores[0].get("commertialOffer") or {}) if vendedores else {}
+
+        precio_oferta = _precio_vtex(oferta.get("Price"))
+        precio_regular = "No disponible"
+        if (oferta.get("ListPrice") or 0) > (oferta.get("Price") or 0):
+            precio_regular = _precio_vtex(oferta.get("ListPrice"))
+
+        productos.append({
+            "Producto": nombre,
+            "Precio_Oferta": precio_oferta,
+            "Precio_Regular": precio_regular,
+            "Imagen_URL": imagenes[0].get("imageUrl", "No disponible") if imagenes else "No disponible",
+            "Enlace": f"{base_url}/{link_text}/p",
+            "Farmacia": espec.nombre
+        })
+        if len(productos) >= max_items:
+            break
+    return productos
+
+
+async def buscar_magento_http(espec, keyword: str, max_items: int = 15, base_url: str = None):
+    """Búsqueda de Magento: la página de resultados ya viene renderizada desde el servidor."""
+    base_url = base_url or espec.base_url
+    respuesta = await obtener_cliente().get(f"{base_url}/catalogsearch/result/", params={"q": keyword})
+    respuesta.raise_for_status()
+    return extraer_productos(respuesta.text, espec, max_items, base_url)
+
+
+# Plataforma (EspecSitio.http_rapido) -> fetcher(espec, keyword, max_items)
+FETCHERS = {
+    HTTP_VTEX: buscar_vtex_http,
+    HTTP_MAGENTO: buscar_magento_http,
+}
+
+
+def con_respaldo_http(fetcher, scraper, farmacia: str):
+    """
+    Combina un fetcher HTTP con su scraper de Playwright: primero se
+    intenta el camino HTTP y solo si falla o no trae productos se abre
+    un navegador. Con HTTP_RAPIDO=0 se va directo a Playwright.
+    """
+    @functools.wraps(scraper)
+    async def buscar(keyword: str, max_items: int = 15):
+        if HTTP_RAPIDO:
+            try:
+                with medir_etapa(farmacia, "http"):
+                    productos = await fetcher(keyword, max_items)
+                if productos:
+                    print(f"   ⚡ {len(productos)} productos de {farmacia} por HTTP directo")
+                    return productos
+                print(f"   ⚠️ {farmacia} no devolvió productos por HTTP, usando Playwright")
+            except Exception as e:
+                print(f"   ⚠️ HTTP directo falló en {farmacia} ({e}), usando Playwright")
+        return await scraper(keyword, max_items)
+
+    return buscar
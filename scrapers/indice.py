@@ -0,0 +1,315 @@
+import asyncio
+import json
+import sqlite3
+import threading
+import time
+from collections import Counter
+
+from scrapers.cache import cache_resultados
+from scrapers.config import INDICE_DB, INDICE_FRESCO_S, INDICE_CONSULTAS_MAX, INDICE_VOLCAR_S
+from scrapers.planificador import ResultadoSitio, ESTADO_OK, ESTADO_VACIO, FUENTE_VIVO
+from scrapers.texto import normalizar_keyword
+
+# De dónde salió el resultado de un sitio (además de live / cache / stale)
+FUENTE_INDICE = "index"
+
+_ESQUEMA = """
+CREATE TABLE IF NOT EXISTS sitios (
+    keyword     TEXT NOT NULL,
+    farmacia    TEXT NOT NULL,
+    estado      TEXT NOT NULL,
+    max_items   INTEGER NOT NULL,
+    productos   INTEGER NOT NULL,
+    actualizado REAL NOT NULL,
+    PRIMARY KEY (keyword, farmacia)
+);
+CREATE TABLE IF NOT EXISTS productos (
+    keyword  TEXT NOT NULL,
+    farmacia TEXT NOT NULL,
+    posicion INTEGER NOT NULL,
+    enlace   TEXT,
+    datos    TEXT NOT NULL,
+    PRIMARY KEY (keyword, farmacia, posicion)
+);
+CREATE INDEX IF NOT EXISTS idx_productos_farmacia ON productos (farmacia);
+CREATE INDEX IF NOT EXISTS idx_productos_enlace ON productos (enlace);
+CREATE TABLE IF NOT EXISTS consultas (
+    keyword TEXT PRIMARY KEY,
+    texto   TEXT NOT NULL,
+    veces   INTEGER NOT NULL,
+    ultima  REAL NOT NULL
+);
+"""
+
+
+class IndicePrecios:
+    """
+    Índice persistente (SQLite) con los últimos productos por keyword
+    normalizado y farmacia.
+
+    Lo alimentan las búsquedas en vivo y el precalentador; permite
+    responder /buscar_productos sin scrapear cuando todas las farmacias
+    tienen un resultado fresco: de menos de `fresco_s` segundos y de no
+    más que el TTL de esa farmacia en `cache` (el índice no sirve datos
+    que la caché ya consideraría vencidos). También lleva la cuenta de
+    qué keywords se buscan más (ver `populares`): las consultas se
+    cuentan en memoria, hasta `max_consultas` keywords distintos, y se
+    vuelcan a SQLite cada `volcar_s` segundos al guardar un resultado.
+
+    Todas las operaciones corren en un hilo (asyncio.to_thread) sobre una
+    única conexión protegida con un lock.
+    """
+
+    def __init__(self, ruta: str = INDICE_DB, fresco_s: float = INDICE_FRESCO_S, cache=cache_resultados,
+                 max_consultas: int = INDICE_CONSULTAS_MAX, volcar_s: float = INDICE_VOLCAR_S):
+        self.ruta = ruta
+        self.fresco_s = fresco_s
+        self.cache = cache
+        self.max_consultas = max(1, max_consultas)
+        self.volcar_s = volcar_s
+        self._conexion = None
+        self._lock = threading.Lock()
+        self._consultas = Counter()   # keyword normalizado -> consultas sin guardar
+        self._textos = {}             # keyword normalizado -> texto original
+        self._volcado = time.monotonic()
+
+        self.aciertos = 0
+        self.fallos = 0
+        self.consultas_descartadas = 0
+
+    @property
+    def activo(self) -> bool:
+        return bool(self.ruta)
+
+    def fresco(self, farmacia: str) -> float:
+        """Segundos que un resultado de `farmacia` se considera fresco."""
+        if self.cache is None:
+            return self.fresco_s
+        return min(self.fresco_s, self.cache.ttl(farmacia))
+
+    def _db(self) -> sqlite3.Connection:
+        if self._conexion is None:
+            self._conexion = sqlite3.connect(self.ruta, check_same_thread=False)
+            self._conexion.execute("PRAGMA journal_mode=WAL")
+            self._conexion.execute("PRAGMA synchronous=NORMAL")
+            self._conexion.executescript(_ESQUEMA)
+        return self._conexion
+
+    def cerrar(self):
+        with self._lock:
+            if self._conexion is not None:
+                self._conexion.close()
+                self._conexion = None
+
+    # ---------- lectura ----------
+
+    def _buscar(self, clave: str, max_items: int, farmacias: list):
+        db = self._db()
+        filas = db.execute(
+            "SELECT farmacia, estado, max_items, productos, actualizado FROM sitios WHERE keyword = ?",
+            (clave,),
+        ).fetchall()
+        sitios = {f[0]: f for f in filas}
+        ahora = time.time()
+
+        resultados = []
+        for farmacia in farmacias:
+            fila = sitios.get(farmacia)
+            if fila is None or ahora - fila[4] > self.fresco(farmacia):
+                return None
+            _, estado, guardados_max, guardados, actualizado = fila
+            # Se guardaron menos de los que se piden y el sitio llenó el cupo: puede tener más
+            if guardados_max < max_items and guardados >= guardados_max:
+                return None
+            productos = [
+                json.loads(datos)
+                for (datos,) in db.execute(
+                    "SELECT datos FROM productos WHERE keyword = ? AND farmacia = ? ORDER BY posicion LIMIT ?",
+                    (clave, farmacia, max_items),
+                )
+            ]
+            resultados.append(ResultadoSitio(farmacia, estado, productos, fuente=FUENTE_INDICE, edad_s=ahora - actualizado))
+        return resultados
+
+    async def buscar(self, keyword: str, max_items: int, farmacias: list):
+        """
+        [ResultadoSitio] de todas las `farmacias` si todas tienen datos
+        frescos y suficientes en el índice; si falta alguna, None.
+        """
+        if not self.activo:
+            return None
+
+        def leer():
+            with self._lock:
+                return self._buscar(normalizar_keyword(keyword), max_items, farmacias)
+
+        try:
+            resultados = await asyncio.to_thread(leer)
+        except sqlite3.Error as e:
+            print(f"   ⚠️ Error leyendo el índice de precios: {e}")
+            return None
+        if resultados is None:
+            self.fallos += 1
+        else:
+            self.aciertos += 1
+        return resultados
+
+    async def edad(self, keyword: str, farmacias: list):
+        """Segundos desde la actualización más vieja del keyword (None si falta alguna farmacia)."""
+        def leer():
+            with self._lock:
+                return dict(self._db().execute(
+                    "SELECT farmacia, actualizado FROM sitios WHERE keyword = ?", (normalizar_keyword(keyword),)
+                ).fetchall())
+
+        actualizados = await asyncio.to_thread(leer)
+        if any(f not in actualizados for f in farmacias):
+            return None
+        return time.time() - min(actualizados[f] for f in farmacias)
+
+    def _ultimos_resultados(self, limite: int) -> list:
+        filas = self._db().execute(
+            "SELECT COALESCE(c.texto, p.keyword), p.farmacia, p.datos FROM productos p "
+            "JOIN sitios s ON s.keyword = p.keyword AND s.farmacia = p.farmacia "
+            "LEFT JOIN consultas c ON c.keyword = p.keyword "
+            "ORDER BY s.actualizado DESC, p.keyword, p.farmacia, p.posicion LIMIT ?",
+            (limite,),
+        )
+        resultados = {}
+        for texto, farmacia, datos in filas:
+            resultados.setdefault((texto, farmacia), []).append(json.loads(datos))
+        return [(texto, productos) for (texto, _), productos in resultados.items()]
+
+    async def ultimos_resultados(self, limite: int) -> list:
+        """
+        [(keyword, [productos])] por sitio guardado, de lo más reciente a lo
+        más viejo y hasta `limite` productos en total (para precargar las
+        sugerencias al arrancar).
+        """
+        if not self.activo or limite <= 0:
+            return []
+
+        def leer():
+            with self._lock:
+                return self._ultimos_resultados(limite)
+
+        try:
+            return await asyncio.to_thread(leer)
+        except sqlite3.Error as e:
+            print(f"   ⚠️ Error leyendo el índice de precios: {e}")
+            return []
+
+    # ---------- escritura ----------
+
+    def _guardar(self, clave: str, max_items: int, resultados: list):
+        db = self._db()
+        ahora = time.time()
+        with db:
+            for resultado in resultados:
+                db.execute("DELETE FROM productos WHERE keyword = ? AND farmacia = ?", (clave, resultado.farmacia))
+                db.executemany(
+                    "INSERT INTO productos (keyword, farmacia, posicion, enlace, datos) VALUES (?, ?, ?, ?, ?)",
+                    [
+                        (clave, resultado.farmacia, i, p.get("Enlace"), json.dumps(p, ensure_ascii=False))
+                        for i, p in enumerate(resultado.productos)
+                    ],
+                )
+                db.execute(
+                    "INSERT OR REPLACE INTO sitios (keyword, farmacia, estado, max_items, productos, actualizado) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (clave, resultado.farmacia, resultado.estado, max_items, len(resultado.productos), ahora),
+                )
+
+    async def guardar(self, keyword: str, max_items: int, resultados: list):
+        """
+        Guarda los sitios que respondieron en vivo (ok / empty); el resto se
+        ignora. Si pasaron `volcar_s` segundos, vuelca también las consultas.
+        """
+        if not self.activo:
+            return
+        vivos = [r for r in resultados if r.fuente == FUENTE_VIVO and r.estado in (ESTADO_OK, ESTADO_VACIO)]
+        if vivos:
+            def escribir():
+                with self._lock:
+                    self._guardar(normalizar_keyword(keyword), max_items, vivos)
+
+            try:
+                await asyncio.to_thread(escribir)
+            except sqlite3.Error as e:
+                print(f"   ⚠️ Error guardando en el índice de precios: {e}")
+        if time.monotonic() - self._volcado >= self.volcar_s:
+            await self.volcar_consultas()
+
+    # ---------- popularidad ----------
+
+    def registrar_consulta(self, keyword: str):
+        """
+        Cuenta una búsqueda de usuario (en memoria; se vuelca con
+        `volcar_consultas`). Sin índice no se cuenta nada; con el contador
+        lleno, los keywords nuevos se descartan hasta el próximo volcado.
+        """
+        clave = normalizar_keyword(keyword)
+        if not self.activo or not clave:
+            return
+        if clave not in self._consultas and len(self._consultas) >= self.max_consultas:
+            self.consultas_descartadas += 1
+            return
+        self._consultas[clave] += 1
+        self._textos.setdefault(clave, keyword.strip())
+
+    def _volcar(self, consultas: Counter, textos: dict):
+        db = self._db()
+        ahora = time.time()
+        with db:
+            db.executemany(
+                "INSERT INTO consultas (keyword, texto, veces, ultima) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT(keyword) DO UPDATE SET veces = veces + excluded.veces, ultima = excluded.ultima",
+                [(clave, textos[clave], veces, ahora) for clave, veces in consultas.items()],
+            )
+
+    async def volcar_consultas(self):
+        self._volcado = time.monotonic()
+        if not self.activo or not self._consultas:
+            return
+        consultas, textos = self._consultas, self._textos
+        self._consultas, self._textos = Counter(), {}
+
+        def escribir():
+            with self._lock:
+                self._volcar(consultas, textos)
+
+        try:
+            await asyncio.to_thread(escribir)
+        except sqlite3.Error as e:
+            print(f"   ⚠️ Error guardando las consultas populares: {e}")
+
+    async def populares(self, limite: int, min_consultas: int = 1) -> list:
+        """Texto de los keywords más buscados (más consultas primero)."""
+        if not self.activo or limite <= 0:
+            return []
+
+        def leer():
+            with self._lock:
+                return [t for (t,) in self._db().execute(
+                    "SELECT texto FROM consultas WHERE veces >= ? ORDER BY veces DESC, ultima DESC LIMIT ?",
+                    (min_consultas, limite),
+                )]
+
+        try:
+            return await asyncio.to_thread(leer)
+        except sqlite3.Error as e:
+            print(f"   ⚠️ Error leyendo las consultas populares: {e}")
+            return []
+
+    def estadisticas(self) -> dict:
+        return {
+            "activo": self.activo,
+            "aciertos": self.aciertos,
+            "fallos": self.fallos,
+            "consultas_sin_volcar": sum(self._consultas.values()),
+            "consultas_descartadas": self.consultas_descartadas,
+        }
+
+
+# Índice compartido por toda la API
+indice_precios = IndicePrecios()
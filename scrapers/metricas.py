@@ -0,0 +1,167 @@
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from prometheus_client import Counter, Gauge, Histogram, REGISTRY, CONTENT_TYPE_LATEST, generate_latest
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+
+# =============================================
+# MÉTRICAS PROMETHEUS (expuestas en /metrics)
+# =============================================
+# Etapas de un scraper: contexto (pedir navegador), goto, espera (primera
+# tarjeta), scroll, extraccion (JS o page.content), parseo (BS4) y http
+# (camino rápido sin navegador).
+
+_BUCKETS_SEGUNDOS = (0.05, 0.1, 0.25, 0.5, 1, 2, 3, 5, 8, 13, 21, 34, 55, 90)
+
+ETAPA_SEGUNDOS = Histogram(
+    "scraper_etapa_segundos", "Duración de cada etapa del scraper",
+    ["farmacia", "etapa"], buckets=_BUCKETS_SEGUNDOS,
+)
+SITIO_SEGUNDOS = Histogram(
+    "scraper_sitio_segundos", "Duración total del trabajo de un sitio",
+    ["farmacia", "estado"], buckets=_BUCKETS_SEGUNDOS,
+)
+PRODUCTOS_DEVUELTOS = Histogram(
+    "scraper_productos", "Productos devueltos por sitio y búsqueda",
+    ["farmacia"], buckets=(0, 1, 5, 10, 15, 25, 50, 100),
+)
+ERRORES = Counter(
+    "scraper_errores_total", "Sitios terminados con error o timeout",
+    ["farmacia", "tipo"],
+)
+SCRAPERS_EN_CURSO = Gauge(
+    "scrapers_en_curso", "Trabajos de scraping corriendo ahora", ["farmacia"],
+)
+BUSQUEDAS_EN_CURSO = Gauge(
+    "busquedas_en_curso", "Peticiones de búsqueda en curso", ["endpoint"],
+)
+BUSQUEDA_SEGUNDOS = Histogram(
+    "busqueda_segundos", "Latencia de las peticiones de búsqueda",
+    ["endpoint"], buckets=_BUCKETS_SEGUNDOS,
+)
+
+
+# En un proceso trabajador, las etapas de cada trabajo se juntan además en
+# una lista que viaja con la respuesta, para que /metrics de la API las
+# tenga (ver registrar_etapas / importar_etapas y scrapers/trabajadores.py)
+_etapas_trabajo = ContextVar("etapas_trabajo", default=None)
+
+
+def observar_etapa(farmacia: str, etapa: str, inicio: float):
+    """Registra una etapa que empezó en `inicio` (time.perf_counter())."""
+    if farmacia:
+        segundos = time.perf_counter() - inicio
+        ETAPA_SEGUNDOS.labels(farmacia, etapa).observe(segundos)
+        etapas = _etapas_trabajo.get()
+        if etapas is not None:
+            etapas.append((farmacia, etapa, segundos))
+
+
+@contextmanager
+def registrar_etapas():
+    """with registrar_etapas() as etapas: ... -> [(farmacia, etapa, segundos)] medidas dentro del bloque."""
+    etapas = []
+    token = _etapas_trabajo.set(etapas)
+    try:
+        yield etapas
+    finally:
+        _etapas_trabajo.reset(token)
+
+
+def importar_etapas(etapas):
+    """Registra etapas medidas en otro proceso (las que devuelve un trabajador)."""
+    for farmacia, etapa, segundos in etapas:
+        ETAPA_SEGUNDOS.labels(farmacia, etapa).observe(segundos)
+
+
+@contextmanager
+def medir_etapa(farmacia: str, etapa: str):
+    """with medir_etapa("Inkafarma", "goto"): await page.goto(...)"""
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        observar_etapa(farmacia, etapa, inicio)
+
+
+class _ColectorEstado:
+    """Publica los contadores internos (cachés, coalescencia, circuitos, admisión, pool) al momento del scrape."""
+
+    def describe(self):
+        # Evita que REGISTRY.register llame a collect() durante los imports
+        return []
+
+    def collect(self):
+        from scrapers.cache import cache_resultados
+        from scrapers.coalescencia import vuelos_busquedas, vuelos_sitios
+        from scrapers.navegador import obtener_pool
+        from scrapers.salud import salud_farmacias, CERRADO, SEMIABIERTO, ABIERTO
+        from scrapers.admision import control_admision
+        from scrapers import recursos
+
+        cache = cache_resultados.estadisticas()
+        consultas = CounterMetricFamily("cache_consultas", "Consultas a la caché de resultados", labels=["resultado"])
+        consultas.add_metric(["fresco"], cache["aciertos"])
+        consultas.add_metric(["stale"], cache["aciertos_stale"])
+        consultas.add_metric(["fallo"], cache["fallos"])
+        yield consultas
+        yield GaugeMetricFamily("cache_entradas", "Entradas en la caché", value=cache["entradas"])
+        yield GaugeMetricFamily("cache_bytes", "Tamaño aproximado de la caché", value=cache["bytes"])
+
+        coalescidas = CounterMetricFamily("coalescencia_peticiones", "Trabajos lanzados o coalescidos", labels=["nivel", "tipo"])
+        for coalescedor in (vuelos_busquedas, vuelos_sitios):
+            stats = coalescedor.estadisticas()
+            for tipo in ("ejecuciones", "coalescidas", "canceladas"):
+                coalescidas.add_metric([coalescedor.nombre, tipo], stats[tipo])
+        yield coalescidas
+
+        circuitos = GaugeMetricFamily("circuito_estado", "Circuito por farmacia (0 cerrado, 1 semiabierto, 2 abierto)",
+                                      labels=["farmacia"])
+        niveles = {CERRADO: 0, SEMIABIERTO: 1, ABIERTO: 2}
+        for farmacia, estado in salud_farmacias.estado().items():
+            circuitos.add_metric([farmacia], niveles[estado["estado"]])
+        yield circuitos
+
+        admision = control_admision.estadisticas()
+        busquedas = GaugeMetricFamily("admision_busquedas", "Búsquedas en curso y en cola", labels=["estado"])
+        busquedas.add_metric(["en_curso"], admision["en_curso"])
+        busquedas.add_metric(["en_cola"], admision["en_cola"])
+        yield busquedas
+        rechazos = CounterMetricFamily("admision_rechazos", "Búsquedas rechazadas por el control de admisión", labels=["motivo"])
+        for motivo, total in admision["rechazos"].items():
+            rechazos.add_metric([motivo], total)
+        yield rechazos
+        yield GaugeMetricFamily("admision_memoria_alta", "1 si la admisión está pausada por memoria",
+                                value=int(admision["memoria_alta"]))
+
+        filtro = recursos.estadisticas()
+        bloqueadas = CounterMetricFamily("peticiones_bloqueadas", "Peticiones abortadas por el filtro de recursos", labels=["motivo"])
+        for motivo, total in filtro["bloqueadas"].items():
+            bloqueadas.add_metric([motivo], total)
+        yield bloqueadas
+        scripts = filtro["cache_scripts"]
+        consultas_js = CounterMetricFamily("cache_scripts_consultas", "Scripts propios servidos desde disco o desde la red",
+                                           labels=["resultado"])
+        consultas_js.add_metric(["acierto"], scripts["aciertos"])
+        consultas_js.add_metric(["fallo"], scripts["fallos"])
+        yield consultas_js
+        yield GaugeMetricFamily("cache_scripts_bytes", "Tamaño de la caché de scripts en disco", value=scripts["bytes"])
+
+        pool = obtener_pool()
+        if pool is not None:
+            estado = pool.estado()
+            contextos = GaugeMetricFamily("pool_contextos", "Contextos del pool de navegadores", labels=["estado"])
+            contextos.add_metric(["libres"], estado["contextos_libres"])
+            contextos.add_metric(["prestados"], estado["contextos_prestados"])
+            yield contextos
+            yield GaugeMetricFamily("pool_navegadores", "Chromium vivos en el pool", value=estado["navegadores"])
+            yield CounterMetricFamily("pool_lanzamientos", "Chromium lanzados desde el arranque", value=estado["lanzamientos"])
+
+
+REGISTRY.register(_ColectorEstado())
+
+
+def exportar() -> tuple:
+    """(cuerpo, content-type) para el endpoint /metrics."""
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
@@ -0,0 +1,111 @@
+import heapq
+import re
+from enum import Enum
+
+from scrapers.parsers import ESPECS
+from scrapers.texto import quitar_acentos
+
+# =============================================
+# MODELO NUMÉRICO DE PRECIOS
+# =============================================
+# Los productos siguen siendo dicts con los campos de texto de siempre
+# ("Precio_Oferta": "S/ 12.30", "No disponible", ...). Al salir del
+# scraper se les agregan los mismos precios en céntimos (enteros) y el
+# porcentaje de descuento, para ordenar y filtrar sin re-parsear textos.
+
+CAMPO_OFERTA_CENTIMOS = "Precio_Oferta_Centimos"
+CAMPO_REGULAR_CENTIMOS = "Precio_Regular_Centimos"
+CAMPO_DESCUENTO = "Descuento_Pct"
+
+# Criterios de orden aceptados por ordenar_y_filtrar
+ORDEN_PRECIO = "precio"          # más barato primero
+ORDEN_PRECIO_DESC = "-precio"    # más caro primero
+ORDEN_DESCUENTO = "descuento"    # mayor descuento primero
+ORDENES = (ORDEN_PRECIO, ORDEN_PRECIO_DESC, ORDEN_DESCUENTO)
+
+
+# Farmacias soportadas (una por EspecSitio registrada en parsers.ESPECS);
+# el valor es el nombre que va en 'Farmacia': Farmacia.BOTICASYSALUD.value == "Boticas y Salud"
+Farmacia = Enum(
+    "Farmacia",
+    [(re.sub(r"[^A-Z0-9]", "", quitar_acentos(nombre).upper()), nombre) for nombre in ESPECS],
+    type=str,
+    module=__name__,
+)
+
+
+_RE_MONTO = re.compile(r"(\d+(?:\.\d+)?)")
+
+
+def a_centimos(precio) -> int:
+    """'S/ 12.30' -> 1230; None si no hay precio ('No disponible', vacío, basura)."""
+    if precio is None:
+        return None
+    if isinstance(precio, (int, float)):
+        return round(precio * 100)
+    match = _RE_MONTO.search(str(precio).replace(",", ""))
+    if not match:
+        return None
+    return round(float(match.group(1)) * 100)
+
+
+def descuento_pct(oferta_centimos: int, regular_centimos: int) -> int:
+    """Descuento entero de la oferta sobre el precio regular (None si falta alguno)."""
+    if not oferta_centimos or not regular_centimos:
+        return None
+    if regular_centimos <= oferta_centimos:
+        return 0
+    return round((regular_centimos - oferta_centimos) * 100 / regular_centimos)
+
+
+def con_precios_numericos(producto: dict) -> dict:
+    """Agrega (en el mismo dict) los precios en céntimos y el descuento si aún no los tiene."""
+    if CAMPO_OFERTA_CENTIMOS not in producto:
+        oferta = a_centimos(producto.get("Precio_Oferta"))
+        regular = a_centimos(producto.get("Precio_Regular"))
+        producto[CAMPO_OFERTA_CENTIMOS] = oferta
+        producto[CAMPO_REGULAR_CENTIMOS] = regular
+        producto[CAMPO_DESCUENTO] = descuento_pct(oferta, regular)
+    return producto
+
+
+def ordenar_y_filtrar(productos: list, orden: str = None, precio_min_centimos: int = None,
+                      precio_max_centimos: int = None, farmacias=None, top: int = None) -> list:
+    """
+    Devuelve una lista nueva, sin reordenar ni recortar la original (que
+    puede ser compartida):
+
+    - `farmacias`: solo las de ese conjunto.
+    - `precio_min_centimos` / `precio_max_centimos`: rango sobre el precio
+      de oferta; los productos sin precio quedan fuera si hay rango.
+    - `orden`: ORDEN_PRECIO, ORDEN_PRECIO_DESC u ORDEN_DESCUENTO; los
+      productos sin precio (o sin descuento) van al final.
+    - `top`: como mucho esa cantidad, después de ordenar.
+    """
+    seleccion = [con_precios_numericos(p) for p in productos]
+    if farmacias:
+        nombres = {Farmacia(f).value for f in farmacias}
+        seleccion = [p for p in seleccion if p.get("Farmacia") in nombres]
+    if precio_min_centimos is not None or precio_max_centimos is not None:
+        minimo = precio_min_centimos if precio_min_centimos is not None else 0
+        maximo = precio_max_centimos if precio_max_centimos is not None else float("inf")
+        seleccion = [p for p in seleccion
+                     if p[CAMPO_OFERTA_CENTIMOS] is not None and minimo <= p[CAMPO_OFERTA_CENTIMOS] <= maximo]
+
+    if orden is None:
+        return seleccion[:top] if top is not None else seleccion
+    if orden not in _CLAVES_ORDEN:
+        raise ValueError(f"Orden desconocido: {orden!r} (usa {', '.join(ORDENES)})")
+    clave = _CLAVES_ORDEN[orden]
+    if top is not None and top < len(seleccion):
+        # Solo los N primeros: heap en lugar de ordenar todo
+        return heapq.nsmallest(top, seleccion, key=clave)
+    return sorted(seleccion, key=clave)
+
+
+# Claves de orden: los productos sin el dato van siempre al final
+_CLAVES_ORDEN = {
+    ORDEN_PRECIO: lambda p: (p[CAMPO_OFERTA_CENTIMOS] is None, p[CAMPO_OFERTA_CENTIMOS] or 0),
+    ORDEN_PRECIO_DESC: lambda p: (p[CAMPO_OFERTA_CENTIMOS] is None, -(p[CAMPO_OFERTA_CENTIMOS] or 0)),
+    ORDEN_DESCUENTO: lambda p: (p[CAMPO_DESCUENTO] is None, -(p[CAMPO_DESCUENTO] or 0)),
+}
@@ -0,0 +1,491 @@
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from playwright.async_api import async_playwright
+
+from scrapers.config import (
+    POOL_NAVEGADORES,
+    POOL_MAX_CONTEXTOS,
+    POOL_USOS_POR_CONTEXTO,
+    POOL_CONTEXTOS_POR_NAVEGADOR,
+    SESIONES_CALIENTES,
+    SESION_USOS_MAX,
+    SESION_VIDA_S,
+)
+from scrapers.metricas import observar_etapa
+from scrapers.recursos import FiltroRecursos
+
+# User-Agent estándar para evitar bloqueos
+USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
+
+CHROMIUM_ARGS = [
+    "--no-sandbox",
+    "--disable-setuid-sandbox",
+    "--disable-dev-shm-usage",
+    "--disable-gpu",
+    # Sin imágenes también en las sesiones calientes, que no usan route()
+    "--blink-settings=imagesEnabled=false",
+]
+
+INIT_SCRIPT_WEBDRIVER = "Object.defineProperty(navigator, 'webdriver', {get: () => undefined});"
+
+
+# Helper (ayudante) asíncrono para bloquear recursos.
+# Los contextos del pool usan scrapers.recursos.FiltroRecursos, que además
+# filtra hosts de terceros y cachea scripts; este se conserva por compatibilidad.
+async def block_resources_async(route):
+    """Bloquea la carga de imágenes, CSS, fuentes y medios"""
+    if route.request.resource_type in ["image", "stylesheet", "font", "media"]:
+        await route.abort()
+    else:
+        await route.continue_()
+
+
+async def configurar_contexto(browser, bloquear: bool = True):
+    """
+    Crea un contexto con configuración anti-bot y bloqueo de recursos.
+    Con bloquear=False no se intercepta nada: Playwright desactiva la
+    caché HTTP en cuanto hay un route(), y las sesiones calientes la
+    necesitan para no volver a bajar los bundles JS de cada sitio.
+    """
+    context = await browser.new_context(
+        user_agent=USER_AGENT,
+        java_script_enabled=True,
+        bypass_csp=True
+    )
+
+    # --- ¡ESTA ES LA LÍNEA MÁGICA DE OPTIMIZACIÓN! ---
+    # Intercepta todas las peticiones: bloquea recursos y hosts de terceros
+    # y sirve desde disco los scripts propios ya descargados
+    if bloquear:
+        await context.route("**/*", FiltroRecursos())
+    # --------------------------------------------------
+
+    await context.add_init_script(INIT_SCRIPT_WEBDRIVER)
+    return context
+
+
+async def crear_contexto_navegador(playwright_instance):
+    """
+    Lanza el navegador y crea un contexto con configuración anti-bot
+    Y CON BLOQUEO DE RECURSOS.
+    """
+    browser = await playwright_instance.chromium.launch(
+        headless=True,
+        args=CHROMIUM_ARGS + ["--single-process"]
+    )
+    context = await configurar_contexto(browser)
+    return browser, context
+
+
+async def _cerrar_silencioso(objeto):
+    """Cierra un contexto o navegador ignorando errores (p. ej. si ya murió)."""
+    try:
+        await objeto.close()
+    except Exception:
+        pass
+
+
+class _Navegador:
+    """Un proceso Chromium del pool y sus contadores."""
+
+    def __init__(self, browser):
+        self.browser = browser
+        self.vivo = True
+        self.retirado = False
+        self.activos = 0   # contextos prestados en este momento
+        self.creados = 0   # contextos creados en toda su vida
+        browser.on("disconnected", self._on_disconnected)
+
+    def _on_disconnected(self, _browser):
+        self.vivo = False
+
+    def disponible(self) -> bool:
+        return self.vivo and not self.retirado and self.browser.is_connected()
+
+
+class _ContextoPool:
+    """Contexto prestado por el pool junto al navegador que lo creó."""
+
+    def __init__(self, navegador: _Navegador, context):
+        self.navegador = navegador
+        self.context = context
+        self.usos = 0
+
+
+class _SesionSitio:
+    """Contexto y página que se mantienen abiertos para una farmacia."""
+
+    def __init__(self, navegador: _Navegador, context, page):
+        self.navegador = navegador
+        self.context = context
+        self.page = page
+        self.usos = 0
+        self.creada = time.monotonic()
+        self.ocupada = False
+        self.descartar = False   # marcada con descartar_sesion mientras estaba prestada
+
+    def vencida(self, usos_max: int, vida_s: float) -> bool:
+        return (
+            self.usos >= usos_max
+            or time.monotonic() - self.creada >= vida_s
+            or not self.navegador.disponible()
+            or self.page.is_closed()
+        )
+
+
+class PoolNavegadores:
+    """
+    Pool de Chromium de larga vida.
+
+    Se lanza una sola vez (en el lifespan de FastAPI) y presta
+    BrowserContexts aislados que ya tienen el bloqueo de recursos
+    y el script anti-webdriver aplicados. Los contextos se reciclan
+    tras `usos_por_contexto` préstamos y los navegadores tras crear
+    `contextos_por_navegador` contextos. Si un Chromium se cae, se
+    reemplaza de forma transparente en el siguiente préstamo.
+
+    Con `sesiones_calientes`, cada farmacia tiene además una sesión
+    (contexto + página) que no se limpia entre búsquedas: la siguiente
+    búsqueda solo navega a la nueva URL con cookies, caché HTTP y
+    service workers ya cargados. Se descarta tras `sesion_usos_max`
+    usos, `sesion_vida_s` segundos, cualquier error o cuando el scraper
+    la marca con `descartar_sesion` (grilla que no cargó, p. ej. por un
+    desafío anti-bot), y se vuelve a crear en el siguiente uso.
+    """
+
+    def __init__(
+        self,
+        tamano: int = POOL_NAVEGADORES,
+        max_contextos: int = POOL_MAX_CONTEXTOS,
+        usos_por_contexto: int = POOL_USOS_POR_CONTEXTO,
+        contextos_por_navegador: int = POOL_CONTEXTOS_POR_NAVEGADOR,
+        sesiones_calientes: bool = bool(SESIONES_CALIENTES),
+        sesion_usos_max: int = SESION_USOS_MAX,
+        sesion_vida_s: float = SESION_VIDA_S,
+    ):
+        self.tamano = max(1, tamano)
+        self.max_contextos = max(1, max_contextos)
+        self.usos_por_contexto = max(1, usos_por_contexto)
+        self.contextos_por_navegador = max(1, contextos_por_navegador)
+        self.sesiones_calientes = sesiones_calientes
+        self.sesion_usos_max = max(1, sesion_usos_max)
+        self.sesion_vida_s = sesion_vida_s
+
+        self._playwright = None
+        self._slots = [None] * self.tamano   # _Navegador actual de cada slot
+        self._retirados = []                 # navegadores esperando a quedar sin contextos
+        self._libres = []                    # _ContextoPool listos para reutilizar
+        self._sesiones = {}                  # farmacia -> _SesionSitio
+        self._semaforo = asyncio.Semaphore(self.max_contextos)
+        self._lock = asyncio.Lock()
+        self._turno = 0
+        self.lanzamientos = 0
+
+    async def iniciar(self):
+        """Arranca Playwright y lanza los navegadores del pool."""
+        self._playwright = await async_playwright().start()
+        async with self._lock:
+            for i in range(self.tamano):
+                self._slots[i] = await self._lanzar()
+        print(f"   🧭 Pool de navegadores listo ({self.tamano} Chromium, {self.max_contextos} contextos máx.)")
+
+    async def cerrar(self):
+        """Cierra todos los contextos, navegadores y Playwright."""
+        async with self._lock:
+            for ctx in self._libres:
+                await _cerrar_silencioso(ctx.context)
+            self._libres.clear()
+            for sesion in self._sesiones.values():
+                await _cerrar_silencioso(sesion.context)
+            self._sesiones.clear()
+            for nav in self._slots + self._retirados:
+                if nav is not None:
+                    await _cerrar_silencioso(nav.browser)
+            self._slots = [None] * self.tamano
+            self._retirados.clear()
+        if self._playwright is not None:
+            await self._playwright.stop()
+            self._playwright = None
+
+    async def _lanzar(self) -> _Navegador:
+        # Sin --single-process: con varios contextos vivos, un renderer
+        # caído no debe tumbar todo el navegador.
+        browser = await self._playwright.chromium.launch(headless=True, args=CHROMIUM_ARGS)
+        self.lanzamientos += 1
+        return _Navegador(browser)
+
+    async def _retirar(self, nav: _Navegador):
+        """Saca un navegador de servicio; se cierra cuando no tenga contextos prestados."""
+        nav.retirado = True
+        for ctx in [c for c in self._libres if c.navegador is nav]:
+            self._libres.remove(ctx)
+            await _cerrar_silencioso(ctx.context)
+        for farmacia, sesion in list(self._sesiones.items()):
+            if sesion.navegador is nav and not sesion.ocupada:
+                del self._sesiones[farmacia]
+                await _cerrar_silencioso(sesion.context)
+        if nav.activos == 0:
+            await _cerrar_silencioso(nav.browser)
+        else:
+            self._retirados.append(nav)
+
+    async def reciclar(self):
+        """
+        Retira todos los navegadores que ya se usaron (p. ej. por memoria
+        alta). Los nuevos se lanzan recién en el siguiente préstamo.
+        """
+        async with self._lock:
+            for i, nav in enumerate(self._slots):
+                if nav is not None and nav.creados > 0:
+                    await self._retirar(nav)
+                    self._slots[i] = None
+
+    async def _navegador_para_contexto(self) -> _Navegador:
+        """Elige un slot (round-robin), relanzando si el navegador murió o llegó a su límite."""
+        i = self._turno % self.tamano
+        self._turno += 1
+        nav = self._slots[i]
+        if nav is None or not nav.disponible() or nav.creados >= self.contextos_por_navegador:
+            if nav is not None:
+                if not nav.vivo or not nav.browser.is_connected():
+                    print("   ♻️ Chromium caído, lanzando uno nuevo...")
+                await self._retirar(nav)
+            nav = await self._lanzar()
+            self._slots[i] = nav
+        return nav
+
+    async def _prestar(self) -> _ContextoPool:
+        async with self._lock:
+            if self._playwright is None:
+                raise RuntimeError("El pool de navegadores no está iniciado")
+            while self._libres:
+                ctx = self._libres.pop()
+                if ctx.navegador.disponible():
+                    ctx.navegador.activos += 1
+                    return ctx
+                await _cerrar_silencioso(ctx.context)
+
+            for _ in range(2):  # un reintento si el navegador muere al crear el contexto
+                nav = await self._navegador_para_contexto()
+                try:
+                    context = await configurar_contexto(nav.browser)
+                except Exception:
+                    nav.vivo = False
+                    continue
+                nav.creados += 1
+                nav.activos += 1
+                return _ContextoPool(nav, context)
+            raise RuntimeError("No se pudo crear un contexto de navegador")
+
+    async def _devolver(self, ctx: _ContextoPool):
+        async with self._lock:
+            nav = ctx.navegador
+            nav.activos -= 1
+            ctx.usos += 1
+
+            reutilizable = nav.disponible() and ctx.usos < self.usos_por_contexto
+            if reutilizable:
+                try:
+                    # Aislamiento entre préstamos: sin páginas ni cookies del anterior
+                    for page in list(ctx.context.pages):
+                        await page.close()
+                    await ctx.context.clear_cookies()
+                except Exception:
+                    reutilizable = False
+
+            if reutilizable:
+                self._libres.append(ctx)
+            else:
+                await _cerrar_silencioso(ctx.context)
+
+            await self._cerrar_si_retirado(nav)
+
+    async def _cerrar_si_retirado(self, nav: _Navegador):
+        if nav in self._retirados and nav.activos == 0:
+            self._retirados.remove(nav)
+            await _cerrar_silencioso(nav.browser)
+
+    async def _tomar_sesion(self, farmacia: str):
+        """La sesión caliente de la farmacia (creándola si hace falta) o None si está ocupada."""
+        async with self._lock:
+            if self._playwright is None:
+                raise RuntimeError("El pool de navegadores no está iniciado")
+            sesion = self._sesiones.get(farmacia)
+            if sesion is not None and sesion.ocupada:
+                return None
+            if sesion is not None and sesion.vencida(self.sesion_usos_max, self.sesion_vida_s):
+                del self._sesiones[farmacia]
+                await _cerrar_silencioso(sesion.context)
+                sesion = None
+
+            if sesion is None:
+                nav = await self._navegador_para_contexto()
+                try:
+                    context = await configurar_contexto(nav.browser, bloquear=False)
+                    page = await context.new_page()
+                except Exception:
+                    nav.vivo = False
+                    return None
+                nav.creados += 1
+                sesion = _SesionSitio(nav, context, page)
+                self._sesiones[farmacia] = sesion
+                print(f"   🔥 Sesión caliente nueva para {farmacia}")
+
+            sesion.ocupada = True
+            sesion.navegador.activos += 1
+            return sesion
+
+    async def _soltar_sesion(self, farmacia: str, sesion: _SesionSitio, fallo: bool):
+        async with self._lock:
+            nav = sesion.navegador
+            nav.activos -= 1
+            sesion.ocupada = False
+            sesion.usos += 1
+
+            descartar = fallo or sesion.descartar or sesion.vencida(self.sesion_usos_max, self.sesion_vida_s)
+            if not descartar:
+                try:
+                    # Popups u otras pestañas que haya abierto el sitio
+                    for page in list(sesion.context.pages):
+                        if page is not sesion.page:
+                            await page.close()
+                except Exception:
+                    descartar = True
+
+            if descartar:
+                if self._sesiones.get(farmacia) is sesion:
+                    del self._sesiones[farmacia]
+                await _cerrar_silencioso(sesion.context)
+            await self._cerrar_si_retirado(nav)
+
+    async def descartar_sesion(self, page, motivo: str = ""):
+        """
+        Descarta la sesión caliente dueña de `page` (no hace nada si la
+        página no es de una sesión). Si está prestada, se cierra al soltarla.
+        """
+        async with self._lock:
+            for farmacia, sesion in list(self._sesiones.items()):
+                if sesion.page is not page:
+                    continue
+                print(f"   🧊 Sesión caliente de {farmacia} descartada{f' ({motivo})' if motivo else ''}")
+                if sesion.ocupada:
+                    sesion.descartar = True
+                else:
+                    del self._sesiones[farmacia]
+                    await _cerrar_silencioso(sesion.context)
+                return
+
+    @asynccontextmanager
+    async def contexto(self):
+        """Presta un BrowserContext del pool y lo devuelve al salir."""
+        async with self._semaforo:
+            ctx = await self._prestar()
+            try:
+                yield ctx.context
+            finally:
+                # shield: aunque la tarea se cancele, el contexto vuelve al pool
+                await asyncio.shield(self._devolver(ctx))
+
+    @asynccontextmanager
+    async def pagina(self, farmacia: str = None):
+        """
+        Presta una página: la de la sesión caliente de `farmacia` si están
+        activas y libre, o si no una nueva en un contexto del pool.
+        """
+        sesion = None
+        async with self._semaforo:
+            if self.sesiones_calientes and farmacia:
+                sesion = await self._tomar_sesion(farmacia)
+
+            if sesion is None:
+                ctx = await self._prestar()
+                try:
+                    yield await ctx.context.new_page()
+                finally:
+                    await asyncio.shield(self._devolver(ctx))
+                return
+
+            fallo = True
+            try:
+                yield sesion.page
+                fallo = False
+            finally:
+                await asyncio.shield(self._soltar_sesion(farmacia, sesion, fallo))
+
+    def estado(self) -> dict:
+        """Resumen del pool para diagnóstico."""
+        return {
+            "navegadores": sum(1 for n in self._slots if n is not None and n.disponible()),
+            "contextos_libres": len(self._libres),
+            "contextos_prestados": sum(n.activos for n in self._slots + self._retirados if n is not None),
+            "sesiones_calientes": len(self._sesiones),
+            "lanzamientos": self.lanzamientos,
+        }
+
+
+# =============================================
+# POOL GLOBAL (configurado en el lifespan de la API)
+# =============================================
+_pool = None
+
+
+def configurar_pool(pool):
+    """Registra (o quita, con None) el pool que usarán los scrapers."""
+    global _pool
+    _pool = pool
+
+
+def obtener_pool():
+    return _pool
+
+
+async def descartar_sesion(page, motivo: str = ""):
+    """
+    Si `page` es de una sesión caliente del pool global, la descarta para
+    que la próxima búsqueda empiece con una sesión limpia.
+    """
+    if _pool is not None:
+        await _pool.descartar_sesion(page, motivo)
+
+
+@asynccontextmanager
+async def obtener_contexto(farmacia: str = None):
+    """
+    Entrega un BrowserContext listo para usar.
+    Usa el pool global si existe; si no (scripts, pruebas locales),
+    lanza un navegador propio y lo cierra al terminar.
+    Con `farmacia`, registra la etapa 'contexto' en las métricas.
+    """
+    inicio = time.perf_counter()
+    if _pool is not None:
+        async with _pool.contexto() as context:
+            observar_etapa(farmacia, "contexto", inicio)
+            yield context
+        return
+
+    async with async_playwright() as p:
+        browser, context = await crear_contexto_navegador(p)
+        observar_etapa(farmacia, "contexto", inicio)
+        try:
+            yield context
+        finally:
+            await _cerrar_silencioso(browser)
+
+
+@asynccontextmanager
+async def obtener_pagina(farmacia: str = None):
+    """
+    Entrega una página lista para navegar. Con el pool global y
+    SESIONES_CALIENTES, reutiliza la sesión caliente de la farmacia;
+    si no, abre una página nueva en un contexto (ver obtener_contexto).
+    """
+    inicio = time.perf_counter()
+    if _pool is not None:
+        async with _pool.pagina(farmacia) as page:
+            observar_etapa(farmacia, "contexto", inicio)
+            yield page
+        return
+
+    async with obtener_contexto(farmacia) as context:
+        yield await context.new_page()
@@ -0,0 +1,456 @@
+import re
+from dataclasses import dataclass, replace
+from functools import cached_property
+from itertools import chain
+from urllib.parse import quote_plus, urljoin
+
+import soupsieve
+from bs4 import BeautifulSoup
+
+from scrapers.config import (
+    INKAFARMA_URL,
+    MIFARMA_URL,
+    BOTICASPERU_URL,
+    BOTICASYSALUD_URL,
+    FARMACIAUNIVERSAL_URL,
+)
+
+# =============================================
+# PARSEO DE HTML (funciones puras, sin navegador)
+# =============================================
+# Reciben el HTML ya descargado (por Playwright o por HTTP directo)
+# y devuelven la lista de productos. Cada farmacia se describe una vez
+# con una EspecSitio (selectores, reglas de precio, limpieza); los
+# selectores y regex se compilan al importar y un único extractor
+# (`extraer_productos`) recorre las tarjetas de cualquier sitio. La misma
+# EspecSitio se traduce (`EspecSitio.args_js`) para el extractor genérico
+# que corre dentro del navegador (ver scrapers/extraccion_js.py).
+
+NO_DISPONIBLE = "No disponible"
+
+# Plataformas con camino rápido HTTP (EspecSitio.http_rapido, ver scrapers/http_rapido.py)
+HTTP_VTEX = "vtex"
+HTTP_MAGENTO = "magento"
+
+_RE_PRECIO = re.compile(r'S/\s*([\d,\.]+)')
+_RE_TEXTO_CON_PRECIO = re.compile(r'S/\s*[\d,\.]+')
+_RE_ESPACIOS = re.compile(r'\s{2,}')
+
+
+def limpiar_precio(texto: str) -> str:
+    """Extrae y formatea el primer precio 'S/ XX.XX' encontrado."""
+    if not texto:
+        return NO_DISPONIBLE
+
+    # Busca el patrón S/ seguido de números, comas y puntos
+    match = _RE_PRECIO.search(texto)
+    if match:
+        precio_num = match.group(1).replace(',', '') # Quita comas de miles
+        try:
+            # Formatea a dos decimales
+            return f"S/ {float(precio_num):.2f}"
+        except ValueError:
+            return f"S/ {precio_num}" # Devuelve lo que encontró si no puede castear
+
+    return NO_DISPONIBLE
+
+
+# =============================================
+# BUSCADORES Y REGLAS (compilados al crearse)
+# =============================================
+# Cada regla sabe describirse con `js()` para el extractor del navegador.
+def _regex_js(patron: re.Pattern):
+    """re.Pattern -> {"fuente", "flags"} para new RegExp() (sin flags en línea como '(?i)')."""
+    if patron is None:
+        return None
+    return {"fuente": patron.pattern, "flags": "i" if patron.flags & re.IGNORECASE else ""}
+
+
+class Css:
+    """Elementos que cumplen un selector CSS, compilado una sola vez."""
+
+    def __init__(self, selector: str):
+        self.selector = selector
+        self._compilado = soupsieve.compile(selector)
+
+    def __call__(self, elemento):
+        return self._compilado.select_one(elemento)
+
+    def iterar(self, elemento):
+        # Perezoso: las coincidencias se buscan a medida que se consumen
+        return self._compilado.iselect(elemento)
+
+    def js(self) -> dict:
+        return {"css": self.selector}
+
+
+class PorClase:
+    """Como find(tag, class_=re.compile(patron)): la regex se prueba contra cada clase."""
+
+    def __init__(self, tag, patron: str, flags: int = 0):
+        self.tag = tag
+        self.patron = re.compile(patron, flags)
+
+    def __call__(self, elemento):
+        return elemento.find(self.tag, class_=self.patron)
+
+    def js(self) -> dict:
+        if self.tag is True:
+            tags = "*"
+        elif isinstance(self.tag, str):
+            tags = self.tag
+        else:
+            tags = ", ".join(self.tag)
+        return {"tags": tags, "clase": _regex_js(self.patron)}
+
+
+class Ancestro:
+    """Sube desde un enlace hasta su tarjeta (el primer `tag` con clase `patron`)."""
+
+    def __init__(self, tag: str, patron: str = None):
+        self.tag = tag
+        self.patron = re.compile(patron) if patron else None
+
+    def __call__(self, elemento):
+        if self.patron is None:
+            return elemento.find_parent(self.tag)
+        return elemento.find_parent(self.tag, class_=self.patron)
+
+    def js(self) -> dict:
+        return {"tag": self.tag, "clase": _regex_js(self.patron)}
+
+
+class Texto:
+    """Regla de precio: el texto de un elemento (None si no está)."""
+
+    def __init__(self, buscar):
+        self.buscar = buscar
+
+    def __call__(self, tarjeta):
+        elemento = self.buscar(tarjeta)
+        return elemento.get_text(strip=True) if elemento else None
+
+    def js(self) -> dict:
+        return {"texto": self.buscar.js()}
+
+
+class EnteroYFraccion:
+    """Regla de precio VTEX: 'currencyInteger' + 'currencyFraction' -> 'S/ 12.50'."""
+
+    def __init__(self, entero, fraccion):
+        self.entero = entero
+        self.fraccion = fraccion
+
+    def __call__(self, tarjeta):
+        entero = self.entero(tarjeta)
+        if not entero:
+            return None
+        valor = entero.get_text(strip=True)
+        fraccion = self.fraccion(tarjeta)
+        if fraccion:
+            valor += "." + fraccion.get_text(strip=True)
+        return f"S/ {valor}"
+
+    def js(self) -> dict:
+        return {"entero": self.entero.js(), "fraccion": self.fraccion.js()}
+
+
+# =============================================
+# ESPECIFICACIÓN DE UN SITIO
+# =============================================
+@dataclass(frozen=True)
+class EspecSitio:
+    """
+    Todo lo que distingue a una farmacia. Agregar una farmacia nueva es
+    agregar su EspecSitio a ESPECS: de ahí salen el scraper (SITIOS de
+    farmacia_scrapers), los nombres aceptados en ?farmacia= (modelo.Farmacia)
+    y las reglas por defecto del filtro de recursos.
+    """
+    nombre: str
+    base_url: str
+    url_busqueda: str                 # plantilla con {base} y {q} (keyword ya codificado)
+
+    # Tarjetas: se recorren en orden y los siguientes selectores solo se
+    # consultan si los anteriores no alcanzaron max_items
+    candidatos: tuple
+    tarjeta: object = None            # si los candidatos son enlaces: cómo subir a su tarjeta
+    enlace_patron: re.Pattern = None  # el href debe cumplirla
+    enlace_absoluto: bool = True      # urljoin con base_url
+    enlace_min_ruta: int = 0          # caracteres mínimos después de base_url
+
+    nombre_reglas: tuple = ()         # elementos probados antes que el texto del enlace
+    nombre_quitar: re.Pattern = None  # palabras a borrar del nombre ("Comprar", ...)
+    imagen: object = Css("img[src]")
+    imagen_atributos: tuple = ("src", "data-src")
+
+    regular: object = None            # regla del precio tachado
+    oferta: tuple = ()                # reglas del precio de venta, en orden
+    quitar_regular_de_oferta: bool = False  # el bloque de oferta también trae el regular
+    precio_en_texto: bool = False     # respaldo: primer texto con 'S/ ...' de la tarjeta
+    intercambiar_precios: bool = False  # sin oferta pero con regular: el regular es el precio
+    descartar_regular_igual: bool = False
+
+    # Navegador (farmacia_scrapers.scrape_sitio_playwright)
+    selector_listo: str = None        # tarjetas que indican que la grilla se pintó
+    techo_s: float = 15               # espera máxima de la grilla
+    goto_timeout_ms: int = 40000
+
+    # Camino rápido sin navegador: HTTP_VTEX, HTTP_MAGENTO o None
+    http_rapido: str = None
+
+    def url(self, keyword: str) -> str:
+        return self.url_busqueda.format(base=self.base_url, q=quote_plus(keyword))
+
+    @cached_property
+    def args_js(self) -> dict:
+        """Las reglas de extracción como datos JSON para el extractor del navegador."""
+        return {
+            "candidatos": [selector.selector for selector in self.candidatos],
+            "tarjeta": self.tarjeta.js() if self.tarjeta is not None else None,
+            "enlacePatron": _regex_js(self.enlace_patron),
+            "enlaceAbsoluto": self.enlace_absoluto,
+            "enlaceMinRuta": self.enlace_min_ruta,
+            "nombreReglas": [regla.js() for regla in self.nombre_reglas],
+            "nombreQuitar": _regex_js(self.nombre_quitar),
+            "imagen": self.imagen.js(),
+            "imagenAtributos": list(self.imagen_atributos),
+            "regular": self.regular.js() if self.regular is not None else None,
+            "oferta": [regla.js() for regla in self.oferta],
+            "quitarRegularDeOferta": self.quitar_regular_de_oferta,
+            "precioEnTexto": self.precio_en_texto,
+            "intercambiarPrecios": self.intercambiar_precios,
+            "descartarRegularIgual": self.descartar_regular_igual,
+        }
+
+
+# =============================================
+# EXTRACTOR COMPARTIDO
+# =============================================
+def _extraer_tarjeta(espec: EspecSitio, item, base_url: str, farmacia: str, vistos: set):
+    """Producto de una tarjeta (o None si no sirve o el enlace ya se vio)."""
+    # 1. ENLACE
+    enlace = item if item.name == 'a' else item.find('a', href=True)
+    if enlace is None:
+        return None
+    crudo = (enlace.get('href') or '').strip()
+    if not crudo or (espec.enlace_patron is not None and not espec.enlace_patron.search(crudo)):
+        return None
+    href = urljoin(base_url, crudo) if espec.enlace_absoluto else crudo
+    if href in vistos or (espec.enlace_min_ruta and len(href) < len(base_url) + espec.enlace_min_ruta):
+        return None
+    vistos.add(href)
+
+    tarjeta = item
+    if espec.tarjeta is not None and item.name == 'a':
+        tarjeta = espec.tarjeta(item) or item
+
+    # 2. NOMBRE
+    nombre = ""
+    for regla in espec.nombre_reglas:
+        elemento = regla(tarjeta)
+        if elemento:
+            nombre = elemento.get_text(strip=True)
+            break
+    if len(nombre) < 3:
+        nombre = enlace.get_text(strip=True)
+    if espec.nombre_quitar is not None:
+        nombre = espec.nombre_quitar.sub('', nombre).strip()
+    nombre = _RE_ESPACIOS.sub(' ', nombre).strip()
+    if len(nombre) < 3:
+        return None
+
+    # 3. IMAGEN
+    img_url = NO_DISPONIBLE
+    img_elem = espec.imagen(tarjeta)
+    if img_elem:
+        fuente = next((img_elem.get(a) for a in espec.imagen_atributos if img_elem.get(a)), None)
+        img_url = urljoin(base_url, fuente)
+
+    # 4. PRECIOS
+    precio_regular = NO_DISPONIBLE
+    if espec.regular is not None:
+        texto = espec.regular(tarjeta)
+        if texto is not None:
+            precio_regular = limpiar_precio(texto)
+
+    precio_oferta = NO_DISPONIBLE
+    for regla in espec.oferta:
+        texto = regla(tarjeta)
+        if texto is None:
+            continue
+        # A veces el regular está dentro del mismo bloque, lo quitamos
+        if espec.quitar_regular_de_oferta and precio_regular != NO_DISPONIBLE:
+            texto = texto.replace(precio_regular.replace("S/ ", ""), "")
+        precio_oferta = limpiar_precio(texto)
+        if precio_oferta != NO_DISPONIBLE:
+            break
+
+    if precio_oferta == NO_DISPONIBLE and espec.precio_en_texto:
+        texto = tarjeta.find(string=_RE_TEXTO_CON_PRECIO)
+        if texto:
+            precio_oferta = limpiar_precio(texto.strip())
+
+    if espec.intercambiar_precios and precio_oferta == NO_DISPONIBLE and precio_regular != NO_DISPONIBLE:
+        precio_oferta, precio_regular = precio_regular, NO_DISPONIBLE
+    if espec.descartar_regular_igual and precio_oferta == precio_regular:
+        precio_regular = NO_DISPONIBLE
+
+    return {
+        "Producto": nombre,
+        "Precio_Oferta": precio_oferta,
+        "Precio_Regular": precio_regular,
+        "Imagen_URL": img_url,
+        "Enlace": href,
+        "Farmacia": farmacia,
+    }
+
+
+def extraer_productos(content: str, espec: EspecSitio, max_items: int = 15, base_url: str = None,
+                      farmacia: str = None) -> list:
+    """
+    Recorre las tarjetas del HTML según `espec` y devuelve hasta
+    `max_items` productos (enlace -> nombre -> imagen -> precios).
+    Una tarjeta repetida (p. ej. anidada en otra) se descarta por su URL.
+    """
+    base_url = base_url or espec.base_url
+    farmacia = farmacia or espec.nombre
+    soup = BeautifulSoup(content, 'html.parser')
+    items = chain.from_iterable(selector.iterar(soup) for selector in espec.candidatos)
+
+    productos = []
+    vistos = set()
+    for item in items:
+        try:
+            producto = _extraer_tarjeta(espec, item, base_url, farmacia, vistos)
+        except Exception:
+            continue
+        if producto is not None:
+            productos.append(producto)
+            if len(productos) >= max_items:
+                break
+    return productos
+
+
+# =============================================
+# SITIOS
+# =============================================
+# Tarjetas de producto de Inkafarma / Mifarma: una sola selección combinada,
+# recorrida en orden del documento hasta juntar max_items productos
+SELECTOR_CARDS_INKAFARMA = (
+    'div[data-testid="product-card"], article[class*="product"], div.product-card, '
+    'div.product-item, div[class*="ProductCard"], li.product'
+)
+# Respaldo: enlaces sueltos a productos, solo si las tarjetas no alcanzan
+SELECTOR_ENLACES_INKAFARMA = 'a[href*="/producto/"], a[href*="/p/"]'
+
+ESPEC_INKAFARMA = EspecSitio(
+    nombre="Inkafarma",
+    base_url=INKAFARMA_URL,
+    url_busqueda="{base}/buscador?keyword={q}",
+    candidatos=(Css(SELECTOR_CARDS_INKAFARMA), Css(SELECTOR_ENLACES_INKAFARMA)),
+    enlace_min_ruta=5,
+    nombre_reglas=(PorClase(['h1', 'h2', 'h3', 'h4'], r'name|title', re.I),),
+    imagen=Css("img[src]"),
+    imagen_atributos=("src",),
+    regular=Texto(PorClase(True, r'old|original|list-price|line-through', re.I)),
+    oferta=(Texto(PorClase(True, r'price|precio', re.I)),),
+    quitar_regular_de_oferta=True,
+    precio_en_texto=True,
+    intercambiar_precios=True,
+    descartar_regular_igual=True,
+    selector_listo=SELECTOR_CARDS_INKAFARMA,
+    techo_s=15,
+    goto_timeout_ms=45000,
+)
+
+# Mismo frontend que Inkafarma, distinta URL base
+ESPEC_MIFARMA = replace(ESPEC_INKAFARMA, nombre="Mifarma", base_url=MIFARMA_URL)
+
+ESPEC_BOTICASPERU = EspecSitio(
+    nombre="BoticasPeru",
+    base_url=BOTICASPERU_URL,
+    url_busqueda="{base}/catalogsearch/result/?q={q}",
+    candidatos=(Css("li.item.product, div.product-item"),),
+    enlace_patron=re.compile(r'\.html'),
+    enlace_absoluto=False,
+    nombre_reglas=(Css(".product-item-link"),),
+    imagen=Css("img.product-image-photo"),
+    # Magento: old-price, special-price, finalPrice y, por último, cualquier price
+    regular=Texto(Css("span.old-price span.price")),
+    oferta=(
+        Texto(Css("span.special-price span.price")),
+        Texto(Css('span.price-wrapper[data-price-type="finalPrice"] span.price')),
+        Texto(Css("span.price")),
+    ),
+    selector_listo="li.item.product, div.product-item",
+    techo_s=9,
+    http_rapido=HTTP_MAGENTO,
+)
+
+ESPEC_BOTICASYSALUD = EspecSitio(
+    nombre="Boticas y Salud",
+    base_url=BOTICASYSALUD_URL,
+    url_busqueda="{base}/tienda/busqueda?q={q}",
+    candidatos=(Css('a[href*="/tienda/productos/"]'),),
+    tarjeta=Ancestro('div', r'product'),
+    nombre_reglas=(PorClase('div', r'product-card__name|product__name'),),
+    regular=Texto(PorClase('div', r'price-original|old-price|list-price', re.I)),
+    oferta=(Texto(PorClase('div', r'price|precio')),),
+    quitar_regular_de_oferta=True,
+    precio_en_texto=True,
+    intercambiar_precios=True,
+    selector_listo='a[href*="/tienda/productos/"]',
+    techo_s=17,  # React pinta tarde: techo más largo
+)
+
+ESPEC_FARMACIAUNIVERSAL = EspecSitio(
+    nombre="Farmacia Universal",
+    base_url=FARMACIAUNIVERSAL_URL,
+    url_busqueda="{base}/{q}?_q={q}&map=ft",
+    candidatos=(Css('a[href$="/p"]'),),
+    tarjeta=Ancestro('article'),
+    enlace_patron=re.compile(r'/[^/]+/p$'),
+    nombre_reglas=(PorClase('span', r'productBrand|productName'),),
+    nombre_quitar=re.compile(r'\b(comprar|agregar|ver)\b', re.I),
+    regular=Texto(PorClase('span', r'listPrice|list-price', re.I)),
+    # VTEX usa 'currencyInteger' y 'currencyFraction'
+    oferta=(EnteroYFraccion(PorClase('span', r'currencyInteger'), PorClase('span', r'currencyFraction')),),
+    precio_en_texto=True,
+    intercambiar_precios=True,
+    selector_listo='a[href$="/p"]',
+    techo_s=21,  # VTEX carga la grilla por partes al hacer scroll
+    http_rapido=HTTP_VTEX,
+)
+
+# Registro de farmacias, en el orden en que se reportan
+ESPECS = {
+    espec.nombre: espec
+    for espec in (ESPEC_INKAFARMA, ESPEC_MIFARMA, ESPEC_BOTICASPERU, ESPEC_BOTICASYSALUD, ESPEC_FARMACIAUNIVERSAL)
+}
+
+
+# =============================================
+# FUNCIONES POR SITIO (compatibilidad)
+# =============================================
+def parsear_boticasperu_html(content: str, max_items: int = 15, base_url: str = BOTICASPERU_URL) -> list:
+    """Extrae los productos de una página de resultados de BoticasPeru (Magento)."""
+    return extraer_productos(content, ESPEC_BOTICASPERU, max_items, base_url)
+
+
+def parsear_inkafarma_html(content: str, farmacia: str = "Inkafarma", max_items: int = 15, base_url: str = None) -> list:
+    """
+    Extrae los productos de una búsqueda de Inkafarma o Mifarma
+    (mismo frontend, distinta URL base).
+    """
+    espec = ESPEC_INKAFARMA if farmacia == "Inkafarma" else ESPEC_MIFARMA
+    return extraer_productos(content, espec, max_items, base_url, farmacia)
+
+
+def parsear_boticasysalud_html(content: str, max_items: int = 15, base_url: str = BOTICASYSALUD_URL) -> list:
+    """Extrae los productos de una búsqueda de Boticas y Salud."""
+    return extraer_productos(content, ESPEC_BOTICASYSALUD, max_items, base_url)
+
+
+def parsear_farmaciauniversal_html(content: str, max_items: int = 15, base_url: str = FARMACIAUNIVERSAL_URL) -> list:
+    """Extrae los productos de una búsqueda de Farmacia Universal (VTEX renderizado)."""
+    return extraer_productos(content, ESPEC_FARMACIAUNIVERSAL, max_items, base_url)
@@ -0,0 +1,327 @@
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+
+from scrapers.config import (
+    SCRAPER_CONCURRENCIA,
+    SCRAPER_MEMORIA_MB,
+    SCRAPER_MB_POR_SITIO,
+    SCRAPER_TIMEOUT_S,
+    LOTE_VENTANA,
+    LOTE_CONCURRENCIA_POR_SITIO,
+    LOTE_INTERVALO_MS,
+)
+from scrapers.cache import VENCIDO
+from scrapers.texto import normalizar_keyword
+from scrapers.modelo import con_precios_numericos
+from scrapers.metricas import SITIO_SEGUNDOS, PRODUCTOS_DEVUELTOS, ERRORES, SCRAPERS_EN_CURSO
+
+# Estados posibles de un sitio en la respuesta
+ESTADO_OK = "ok"
+ESTADO_VACIO = "empty"
+ESTADO_ERROR = "error"
+ESTADO_TIMEOUT = "timeout"
+ESTADO_OMITIDO = "skipped"   # circuito abierto: no se intentó
+
+# De dónde salió el resultado de un sitio
+FUENTE_VIVO = "live"
+FUENTE_CACHE = "cache"
+FUENTE_STALE = "stale"
+
+
+@dataclass
+class ResultadoSitio:
+    """Resultado de scrapear una farmacia."""
+    farmacia: str
+    estado: str
+    productos: list = field(default_factory=list)
+    tiempo_s: float = 0.0
+    error: str = None
+    fuente: str = FUENTE_VIVO
+    edad_s: float = 0.0
+
+    def resumen(self) -> dict:
+        """Estado del sitio tal como se reporta en la API (sin los productos)."""
+        return {
+            "farmacia": self.farmacia,
+            "estado": self.estado,
+            "productos": len(self.productos),
+            "tiempo_s": round(self.tiempo_s, 2),
+            "error": self.error,
+            "fuente": self.fuente,
+            "edad_s": round(self.edad_s, 1),
+        }
+
+
+def concurrencia_efectiva(
+    concurrencia: int = SCRAPER_CONCURRENCIA,
+    memoria_mb: int = SCRAPER_MEMORIA_MB,
+    mb_por_sitio: int = SCRAPER_MB_POR_SITIO,
+) -> int:
+    """Sitios en paralelo permitidos por el límite de concurrencia y el presupuesto de RAM."""
+    limite = max(1, concurrencia)
+    if memoria_mb > 0 and mb_por_sitio > 0:
+        limite = min(limite, max(1, memoria_mb // mb_por_sitio))
+    return limite
+
+
+async def ejecutar_sitio(farmacia: str, scraper, keyword: str, max_items: int, timeout_s: float = SCRAPER_TIMEOUT_S) -> ResultadoSitio:
+    """Corre un scraper y clasifica el resultado (ok / empty / error / timeout)."""
+    with SCRAPERS_EN_CURSO.labels(farmacia).track_inprogress():
+        resultado = await _ejecutar_sitio(farmacia, scraper, keyword, max_items, timeout_s)
+
+    SITIO_SEGUNDOS.labels(farmacia, resultado.estado).observe(resultado.tiempo_s)
+    if resultado.estado in (ESTADO_ERROR, ESTADO_TIMEOUT):
+        ERRORES.labels(farmacia, resultado.estado).inc()
+    else:
+        PRODUCTOS_DEVUELTOS.labels(farmacia).observe(len(resultado.productos))
+    return resultado
+
+
+async def _ejecutar_sitio(farmacia: str, scraper, keyword: str, max_items: int, timeout_s: float) -> ResultadoSitio:
+    inicio = time.monotonic()
+    try:
+        productos = await asyncio.wait_for(scraper(keyword, max_items), timeout_s)
+    except asyncio.TimeoutError:
+        print(f"--- ⏱️ Timeout en {farmacia} ({timeout_s}s) ---")
+        return ResultadoSitio(farmacia, ESTADO_TIMEOUT, tiempo_s=time.monotonic() - inicio,
+                              error=f"Sin respuesta en {timeout_s}s")
+    except Exception as e:
+        print(f"--- ❌ Error en {farmacia}: {e} ---")
+        return ResultadoSitio(farmacia, ESTADO_ERROR, tiempo_s=time.monotonic() - inicio, error=str(e))
+
+    estado = ESTADO_OK if productos else ESTADO_VACIO
+    productos = [con_precios_numericos(p) for p in productos or []]
+    return ResultadoSitio(farmacia, estado, productos, time.monotonic() - inicio)
+
+
+async def ejecutar_y_guardar(cache, farmacia: str, scraper, keyword: str, max_items: int, timeout_s: float = SCRAPER_TIMEOUT_S) -> ResultadoSitio:
+    """Scrapea un sitio y, si respondió (ok / empty), guarda el resultado en la caché."""
+    resultado = await ejecutar_sitio(farmacia, scraper, keyword, max_items, timeout_s)
+    if cache is not None and resultado.estado in (ESTADO_OK, ESTADO_VACIO):
+        cache.guardar(keyword, max_items, farmacia, resultado.productos)
+    return resultado
+
+
+def clave_sitio(farmacia: str, keyword: str, max_items: int) -> tuple:
+    """Clave de un trabajo por sitio para coalescer peticiones idénticas."""
+    return (farmacia, normalizar_keyword(keyword), max_items)
+
+
+def resultado_omitido(farmacia: str, salud) -> ResultadoSitio:
+    """Sitio saltado porque su circuito está abierto."""
+    return ResultadoSitio(farmacia, ESTADO_OMITIDO,
+                          error=f"Circuito abierto, se reintenta en {salud.reintento_en(farmacia):.0f}s")
+
+
+async def ejecutar_compartido(coalescedor, cache, farmacia: str, scraper, keyword: str, max_items: int,
+                              timeout_s: float = SCRAPER_TIMEOUT_S, semaforo=None, salud=None) -> ResultadoSitio:
+    """
+    Scrapea un sitio (y guarda en caché) compartiendo la ejecución con
+    cualquier otra petición idéntica que ya esté en curso. Con `salud`,
+    el sitio se omite si su circuito está abierto y el resultado se
+    anota en su historial.
+    """
+    async def correr():
+        if semaforo is None:
+            return await ejecutar_y_guardar(cache, farmacia, scraper, keyword, max_items, timeout_s)
+        async with semaforo:
+            print(f"--- Iniciando Scraper: {farmacia} ---")
+            return await ejecutar_y_guardar(cache, farmacia, scraper, keyword, max_items, timeout_s)
+
+    async def en_vivo():
+        if salud is None:
+            return await correr()
+        if not salud.permitir(farmacia):
+            return resultado_omitido(farmacia, salud)
+        try:
+            resultado = await correr()
+        except asyncio.CancelledError:
+            salud.abandonar(farmacia)
+            raise
+        salud.registrar(farmacia, resultado.estado in (ESTADO_OK, ESTADO_VACIO), resultado.tiempo_s)
+        return resultado
+
+    if coalescedor is None:
+        return await en_vivo()
+    return await coalescedor.ejecutar(clave_sitio(farmacia, keyword, max_items), en_vivo)
+
+
+def _desde_cache(cache, coalescedor, farmacia: str, scraper, keyword: str, max_items: int, timeout_s: float, salud=None):
+    """ResultadoSitio servido desde la caché (lanzando el refresco si está vencido) o None."""
+    encontrado = cache.obtener(keyword, max_items, farmacia)
+    if encontrado is None:
+        return None
+    productos, edad, frescura = encontrado
+    fuente = FUENTE_CACHE
+    if frescura == VENCIDO:
+        fuente = FUENTE_STALE
+        cache.refrescar(keyword, max_items, farmacia,
+                        lambda: ejecutar_compartido(coalescedor, cache, farmacia, scraper, keyword, max_items, timeout_s,
+                                                    salud=salud))
+    estado = ESTADO_OK if productos else ESTADO_VACIO
+    return ResultadoSitio(farmacia, estado, productos, fuente=fuente, edad_s=edad)
+
+
+def resultado_fuera_de_plazo(farmacia: str, deadline_s: float, tiempo_s: float) -> ResultadoSitio:
+    """Sitio que no alcanzó a terminar dentro del presupuesto de la búsqueda."""
+    ERRORES.labels(farmacia, ESTADO_TIMEOUT).inc()
+    return ResultadoSitio(farmacia, ESTADO_TIMEOUT, tiempo_s=tiempo_s,
+                          error=f"Fuera del presupuesto de {int(deadline_s * 1000)} ms")
+
+
+def resultados_sin_turno(sitios: dict, keyword: str, max_items: int, deadline_s: float, tiempo_s: float,
+                         cache=None) -> list:
+    """
+    Resultados de una búsqueda cuyo presupuesto se agotó esperando turno
+    de admisión: lo que haya en la caché (fresco o vencido, sin lanzar
+    refrescos) y "timeout" para el resto de los sitios.
+    """
+    resultados = []
+    for farmacia in sitios:
+        encontrado = cache.obtener(keyword, max_items, farmacia) if cache is not None else None
+        if encontrado is None:
+            resultados.append(resultado_fuera_de_plazo(farmacia, deadline_s, tiempo_s))
+            continue
+        productos, edad, frescura = encontrado
+        resultados.append(ResultadoSitio(farmacia, ESTADO_OK if productos else ESTADO_VACIO, productos,
+                                         fuente=FUENTE_STALE if frescura == VENCIDO else FUENTE_CACHE, edad_s=edad))
+    return resultados
+
+
+async def ejecutar_sitios(sitios: dict, keyword: str, max_items: int, concurrencia: int = None, timeout_s: float = SCRAPER_TIMEOUT_S,
+                          cache=None, coalescedor=None, deadline_s: float = None, salud=None, inicio: float = None):
+    """
+    Lanza un trabajo por sitio, con como máximo `concurrencia` a la vez,
+    y va entregando cada ResultadoSitio apenas termina (generador asíncrono).
+    Con `cache`, los sitios con un resultado guardado se responden al
+    instante (los vencidos se refrescan en segundo plano). Con
+    `coalescedor`, un sitio que otra petición ya está scrapeando con el
+    mismo keyword no se vuelve a lanzar: se espera el mismo resultado.
+    Con `salud`, los sitios con el circuito abierto (y sin caché) se
+    entregan al instante como "skipped".
+
+    Con `deadline_s`, toda la búsqueda (incluida la espera por un turno
+    de concurrencia) tiene ese presupuesto: cada sitio recibe como plazo
+    lo que quede de él y, al agotarse, se entrega como "timeout" y su
+    trabajo se cancela (si nadie más lo espera), devolviendo el contexto
+    al pool de inmediato. El presupuesto se cuenta desde `inicio`
+    (time.monotonic() de cuando llegó la petición, p. ej. antes de
+    esperar turno de admisión) o, sin él, desde esta llamada.
+
+    Si el consumidor deja de iterar (p. ej. se cancela la petición),
+    los trabajos pendientes se cancelan y liberan su navegador.
+    """
+    limite = concurrencia or concurrencia_efectiva()
+    semaforo = asyncio.Semaphore(limite)
+    if inicio is None:
+        inicio = time.monotonic()
+    plazo = inicio + deadline_s if deadline_s else None
+    print(f"--- Iniciando {len(sitios)} scrapers (máx. {limite} en paralelo) ---")
+
+    async def trabajo(farmacia, scraper):
+        if cache is not None:
+            resultado = _desde_cache(cache, coalescedor, farmacia, scraper, keyword, max_items, timeout_s, salud)
+            if resultado is not None:
+                return resultado
+        return await ejecutar_compartido(coalescedor, cache, farmacia, scraper, keyword, max_items, timeout_s,
+                                         semaforo, salud)
+
+    async def trabajo_con_plazo(farmacia, scraper):
+        if plazo is None:
+            return await trabajo(farmacia, scraper)
+        try:
+            return await asyncio.wait_for(trabajo(farmacia, scraper), max(0.0, plazo - time.monotonic()))
+        except asyncio.TimeoutError:
+            print(f"--- ⏱️ {farmacia} no terminó dentro del presupuesto ({deadline_s}s) ---")
+            return resultado_fuera_de_plazo(farmacia, deadline_s, time.monotonic() - inicio)
+
+    tareas = [asyncio.create_task(trabajo_con_plazo(f, s)) for f, s in sitios.items()]
+    try:
+        for siguiente in asyncio.as_completed(tareas):
+            yield await siguiente
+    finally:
+        pendientes = [t for t in tareas if not t.done()]
+        for tarea in pendientes:
+            tarea.cancel()
+        if pendientes:
+            await asyncio.gather(*pendientes, return_exceptions=True)
+
+
+class LimitadorSitios:
+    """
+    Turnos para los scrapes de lote: como mucho `por_sitio` a la vez por
+    farmacia, `intervalo_s` segundos entre dos arranques contra el mismo
+    sitio y `concurrencia` en total. Se usa como el `semaforo` de
+    ejecutar_compartido: `async with limitador.turno(farmacia): ...`.
+    """
+
+    def __init__(self, concurrencia: int = None, por_sitio: int = LOTE_CONCURRENCIA_POR_SITIO,
+                 intervalo_s: float = LOTE_INTERVALO_MS / 1000):
+        self._global = asyncio.Semaphore(concurrencia or concurrencia_efectiva())
+        self.por_sitio = max(1, por_sitio)
+        self.intervalo_s = max(0.0, intervalo_s)
+        self._sitios = {}    # farmacia -> Semaphore
+        self._proximo = {}   # farmacia -> instante (monotonic) del siguiente arranque permitido
+
+    @asynccontextmanager
+    async def turno(self, farmacia: str):
+        sitio = self._sitios.setdefault(farmacia, asyncio.Semaphore(self.por_sitio))
+        async with sitio:
+            espera = self._proximo.get(farmacia, 0.0) - time.monotonic()
+            if espera > 0:
+                await asyncio.sleep(espera)
+            self._proximo[farmacia] = time.monotonic() + self.intervalo_s
+            async with self._global:
+                yield
+
+
+async def ejecutar_lote(sitios: dict, keywords: list, max_items: int, limitador: LimitadorSitios,
+                        timeout_s: float = SCRAPER_TIMEOUT_S, cache=None, coalescedor=None, salud=None,
+                        ventana: int = LOTE_VENTANA):
+    """
+    Scrapea muchos keywords contra todos los sitios compartiendo el pool
+    de navegadores y entrega (keyword, [ResultadoSitio]) a medida que
+    termina cada keyword (generador asíncrono).
+
+    Solo `ventana` keywords están en curso a la vez, así las primeras
+    respuestas llegan pronto y la memoria no crece con el tamaño del
+    lote. Cada scrape toma turno en `limitador` (límite por farmacia);
+    caché, coalescencia y circuit breaker funcionan igual que en
+    ejecutar_sitios. Al dejar de iterar se cancela lo pendiente.
+    """
+    async def sitio(keyword, farmacia, scraper):
+        if cache is not None:
+            resultado = _desde_cache(cache, coalescedor, farmacia, scraper, keyword, max_items, timeout_s, salud)
+            if resultado is not None:
+                return resultado
+        return await ejecutar_compartido(coalescedor, cache, farmacia, scraper, keyword, max_items, timeout_s,
+                                         limitador.turno(farmacia), salud)
+
+    async def buscar(keyword):
+        resultados = await asyncio.gather(*(sitio(keyword, f, s) for f, s in sitios.items()))
+        return keyword, resultados
+
+    print(f"--- Iniciando lote de {len(keywords)} keywords en {len(sitios)} sitios ---")
+    pendientes = iter(keywords)
+    en_curso = set()
+
+    def completar_ventana():
+        for keyword in pendientes:
+            en_curso.add(asyncio.create_task(buscar(keyword)))
+            if len(en_curso) >= max(1, ventana):
+                break
+
+    completar_ventana()
+    try:
+        while en_curso:
+            hechas, en_curso = await asyncio.wait(en_curso, return_when=asyncio.FIRST_COMPLETED)
+            completar_ventana()
+            for tarea in hechas:
+                yield tarea.result()
+    finally:
+        for tarea in en_curso:
+            tarea.cancel()
+        if en_curso:
+            await asyncio.gather(*en_curso, return_exceptions=True)
@@ -0,0 +1,87 @@
+import asyncio
+
+from scrapers.config import (
+    PRECALENTAR_INTERVALO_S,
+    PRECALENTAR_KEYWORDS,
+    PRECALENTAR_TOP,
+    PRECALENTAR_MIN_CONSULTAS,
+    PRECALENTAR_MAX_ITEMS,
+)
+from scrapers.indice import indice_precios
+from scrapers.admision import Saturado, control_admision
+from scrapers.texto import normalizar_keyword
+
+
+class Precalentador:
+    """
+    Tarea de fondo que mantiene frescos en el índice los keywords
+    populares: los fijos de PRECALENTAR_KEYWORDS más los más buscados.
+
+    Cada `intervalo_s` segundos vuelca los contadores de consultas y
+    re-scrapea, uno por uno, los keywords cuyo resultado en el índice
+    falta o ya pasó el 75 % de su vida. Cada keyword ocupa un turno del
+    control de admisión como una búsqueda más. Cede el paso a los
+    usuarios: si no hay un turno libre o la memoria está alta, deja el
+    resto para el siguiente ciclo.
+    """
+
+    def __init__(self, buscar, farmacias: list, indice=indice_precios, control=control_admision,
+                 intervalo_s: float = PRECALENTAR_INTERVALO_S, keywords: list = PRECALENTAR_KEYWORDS,
+                 top: int = PRECALENTAR_TOP, min_consultas: int = PRECALENTAR_MIN_CONSULTAS,
+                 max_items: int = PRECALENTAR_MAX_ITEMS):
+        self.buscar = buscar   # async (keyword, max_items): scrapea y guarda en el índice
+        self.farmacias = farmacias
+        self.indice = indice
+        self.control = control
+        self.intervalo_s = max(1, intervalo_s)
+        self.keywords = list(keywords)
+        self.top = top
+        self.min_consultas = min_consultas
+        self.max_items = max_items
+        self.refrescados = 0
+        self._tarea = None
+
+    def iniciar(self):
+        if self.indice.activo and self._tarea is None:
+            self._tarea = asyncio.create_task(self._bucle())
+            print(f"   🔥 Precalentador activo (cada {self.intervalo_s}s)")
+
+    async def detener(self):
+        if self._tarea is not None:
+            self._tarea.cancel()
+            await asyncio.gather(self._tarea, return_exceptions=True)
+            self._tarea = None
+        await self.indice.volcar_consultas()
+
+    async def _bucle(self):
+        while True:
+            try:
+                await self.ciclo()
+            except Exception as e:
+                print(f"   ⚠️ Error en el precalentador: {e}")
+            await asyncio.sleep(self.intervalo_s)
+
+    async def keywords_a_precalentar(self) -> list:
+        unicos = {}
+        for keyword in self.keywords + await self.indice.populares(self.top, self.min_consultas):
+            unicos.setdefault(normalizar_keyword(keyword), keyword)
+        return list(unicos.values())
+
+    async def ciclo(self):
+        await self.indice.volcar_consultas()
+        for keyword in await self.keywords_a_precalentar():
+            ocupado = self.control.en_curso >= self.control.max_busquedas
+            if self.control.memoria_alta or self.control.en_cola > 0 or ocupado:
+                print("   🔥 Precalentador en pausa: no hay turno libre para búsquedas")
+                return
+            edad = await self.indice.edad(keyword, self.farmacias)
+            if edad is not None and edad < min(map(self.indice.fresco, self.farmacias), default=self.indice.fresco_s) * 0.75:
+                continue
+            print(f"   🔥 Precalentando '{keyword}'")
+            try:
+                async with self.control.admitir():
+                    await self.buscar(keyword, self.max_items)
+            except Saturado as e:
+                print(f"   🔥 Precalentador en pausa: sin turno ({e.motivo})")
+                return
+            self.refrescados += 1
@@ -0,0 +1,365 @@
+import asyncio
+import hashlib
+import json
+import os
+import re
+from collections import OrderedDict
+from fnmatch import fnmatch
+from urllib.parse import urlsplit
+
+from scrapers.config import (
+    RECURSOS_BLOQUEAR,
+    RECURSOS_CACHE_DIR,
+    RECURSOS_CACHE_MB,
+    INKAFARMA_URL,
+    MIFARMA_URL,
+    BOTICASPERU_URL,
+    BOTICASYSALUD_URL,
+    FARMACIAUNIVERSAL_URL,
+)
+from scrapers.parsers import ESPECS
+
+# =============================================
+# FILTRO DE PETICIONES (context.route)
+# =============================================
+# Tipos de recurso que nunca hacen falta para leer productos
+TIPOS_BLOQUEADOS = {"image", "stylesheet", "font", "media"}
+
+# Analítica, tag managers, chats y anuncios: se bloquean en todos los sitios.
+# Un host bloquea también sus subdominios; con '*' o '/' es un patrón de URL.
+HOSTS_BLOQUEADOS = [
+    "googletagmanager.com", "google-analytics.com", "analytics.google.com",
+    "doubleclick.net", "googlesyndication.com", "googleadservices.com",
+    "facebook.net", "facebook.com",
+    "hotjar.com", "clarity.ms", "bing.com", "tiktok.com", "snapchat.com",
+    "criteo.com", "criteo.net", "taboola.com", "outbrain.com",
+    "newrelic.com", "nr-data.net", "segment.io", "segment.com", "mixpanel.com",
+    "onesignal.com", "pushwoosh.com", "insider.com", "useinsider.com",
+    "zendesk.com", "zdassets.com", "zopim.com", "intercom.io", "tawk.to",
+    "yotpo.com", "trustpilot.com", "cloudflareinsights.com",
+    "*/gtm.js*", "*/fbevents.js*",
+] + RECURSOS_BLOQUEAR
+
+
+def _host(url: str) -> str:
+    return (urlsplit(url).hostname or "").lower()
+
+
+# Reglas por farmacia:
+#  - primarios: hosts propios del sitio (incluye sus CDNs); sus scripts con
+#    hash en el nombre se guardan en la caché en disco.
+#  - permitir: hosts o patrones que pasan aunque estén en una lista de bloqueo.
+#  - bloquear: hosts o patrones extra solo para ese sitio.
+REGLAS_SITIOS = {
+    "Inkafarma": {
+        "primarios": [_host(INKAFARMA_URL), "inkafarma.pe"],
+        "permitir": [],
+        "bloquear": ["*/recaptcha/*"],
+    },
+    "Mifarma": {
+        "primarios": [_host(MIFARMA_URL), "mifarma.com.pe"],
+        "permitir": [],
+        "bloquear": ["*/recaptcha/*"],
+    },
+    "BoticasPeru": {
+        "primarios": [_host(BOTICASPERU_URL), "boticasperu.pe"],
+        "permitir": [],
+        "bloquear": [],
+    },
+    "Boticas y Salud": {
+        "primarios": [_host(BOTICASYSALUD_URL), "boticasysalud.com"],
+        "permitir": [],
+        "bloquear": [],
+    },
+    "Farmacia Universal": {
+        "primarios": [_host(FARMACIAUNIVERSAL_URL), "farmaciauniversal.com", "vtexassets.com", "vteximg.com.br"],
+        "permitir": [],
+        # Módulos VTEX IO de analítica y píxeles
+        "bloquear": ["*vtex.request-capture*", "*vtex.google-tag-manager*", "*vtex.facebook-fbe*"],
+    },
+}
+# Una farmacia registrada en parsers.ESPECS sin reglas propias: su host es el primario
+for _espec in ESPECS.values():
+    REGLAS_SITIOS.setdefault(_espec.nombre, {"primarios": [_host(_espec.base_url)], "permitir": [], "bloquear": []})
+
+
+def _coincide(url: str, host: str, reglas: list) -> bool:
+    for regla in reglas:
+        if "*" in regla or "/" in regla:
+            if fnmatch(url, regla):
+                return True
+        elif host == regla or host.endswith("." + regla):
+            return True
+    return False
+
+
+def sitio_por_host(host: str):
+    """Farmacia dueña de un host según sus 'primarios' (o None)."""
+    for farmacia, reglas in REGLAS_SITIOS.items():
+        if _coincide("", host, reglas["primarios"]):
+            return farmacia
+    return None
+
+
+# =============================================
+# CACHÉ EN DISCO DE SCRIPTS INMUTABLES
+# =============================================
+# Nombre de archivo con hash de contenido (app.3f9a1c2b.js, chunk-5d1e0f9a7b.js)
+_RE_HASH = re.compile(r"[.\-_~][0-9a-f]{8,}[.\-_]", re.IGNORECASE)
+_RE_MAX_AGE = re.compile(r"max-age=(\d+)")
+_SEMANA_S = 7 * 24 * 3600
+
+# Cabeceras de la respuesta original que se guardan junto al script y se
+# repiten al servirlo desde disco: sin Access-Control-Allow-Origin, un
+# <script crossorigin> de un CDN (p. ej. vtexassets.com) falla el chequeo
+# CORS y el navegador no lo ejecuta.
+CABECERAS_GUARDADAS = (
+    "content-type",
+    "access-control-allow-origin",
+    "access-control-allow-credentials",
+    "timing-allow-origin",
+)
+_CONTENT_TYPE_JS = "application/javascript; charset=utf-8"
+
+
+def tiene_hash(url: str) -> bool:
+    """True si el nombre del archivo lleva un hash de contenido (la URL cambia si cambia el script)."""
+    return bool(_RE_HASH.search(urlsplit(url).path))
+
+
+def es_inmutable(url: str, cache_control: str) -> bool:
+    """True si el script no va a cambiar en esa URL (hash en el nombre o cacheable por días)."""
+    cache_control = (cache_control or "").lower()
+    if "no-store" in cache_control:
+        return False
+    if "immutable" in cache_control:
+        return True
+    max_age = _RE_MAX_AGE.search(cache_control)
+    if max_age and int(max_age.group(1)) >= _SEMANA_S:
+        return True
+    return tiene_hash(url)
+
+
+def cabeceras_a_guardar(cabeceras: dict) -> dict:
+    """Las CABECERAS_GUARDADAS presentes en `cabeceras` (con Content-Type de JS si falta)."""
+    guardadas = {k.lower(): v for k, v in (cabeceras or {}).items() if k.lower() in CABECERAS_GUARDADAS}
+    guardadas.setdefault("content-type", _CONTENT_TYPE_JS)
+    return guardadas
+
+
+class CacheScripts:
+    """
+    Caché LRU en disco de scripts propios de cada sitio, servidos con
+    route.fulfill(path=...). Junto a cada script (<sha1>.js) se guardan
+    sus cabeceras relevantes (<sha1>.json) para repetirlas al servirlo.
+    Se acota por bytes; al arrancar recupera lo que haya en el directorio
+    (los más recientes primero en quedarse).
+    """
+
+    def __init__(self, directorio: str = RECURSOS_CACHE_DIR, max_bytes: int = RECURSOS_CACHE_MB * 1024 * 1024):
+        self.directorio = directorio
+        self.max_bytes = max_bytes
+        self._archivos = OrderedDict()   # nombre -> tamaño
+        self._cabeceras = {}             # nombre -> cabeceras a repetir
+        self._bytes = 0
+        self._cargado = False
+
+        self.aciertos = 0
+        self.fallos = 0
+        self.guardados = 0
+        self.desalojos = 0
+
+    @property
+    def activa(self) -> bool:
+        return self.max_bytes > 0
+
+    def _cargar(self):
+        """Indexa los archivos ya guardados (una vez, en el primer uso)."""
+        self._cargado = True
+        try:
+            os.makedirs(self.directorio, exist_ok=True)
+            entradas = sorted(os.scandir(self.directorio), key=lambda e: e.stat().st_mtime)
+        except OSError as e:
+            print(f"   ⚠️ Caché de scripts desactivada ({self.directorio}): {e}")
+            self.max_bytes = 0
+            return
+        for entrada in entradas:
+            if not (entrada.is_file() and entrada.name.endswith(".js")):
+                continue
+            try:
+                with open(self._ruta_cabeceras(entrada.name), encoding="utf-8") as f:
+                    cabeceras = json.load(f)
+            except (OSError, ValueError):
+                # Sin cabeceras no se puede servir igual que el original: se descarga de nuevo
+                self._borrar(entrada.name)
+                continue
+            self._archivos[entrada.name] = entrada.stat().st_size
+            self._cabeceras[entrada.name] = cabeceras
+            self._bytes += entrada.stat().st_size
+        self._recortar()
+
+    @staticmethod
+    def nombre(url: str) -> str:
+        return hashlib.sha1(url.encode("utf-8")).hexdigest() + ".js"
+
+    def _ruta_cabeceras(self, nombre: str) -> str:
+        return os.path.join(self.directorio, nombre[:-len(".js")] + ".json")
+
+    def obtener(self, url: str):
+        """(ruta, cabeceras) del script guardado o None (cuenta acierto / fallo)."""
+        if not self._cargado:
+            self._cargar()
+        nombre = self.nombre(url)
+        if nombre in self._archivos:
+            self._archivos.move_to_end(nombre)
+            self.aciertos += 1
+            return os.path.join(self.directorio, nombre), self._cabeceras[nombre]
+        self.fallos += 1
+        return None
+
+    async def guardar(self, url: str, cuerpo: bytes, cabeceras: dict = None):
+        """Guarda el script y, de sus `cabeceras` originales, las CABECERAS_GUARDADAS."""
+        if len(cuerpo) > self.max_bytes:
+            return
+        nombre = self.nombre(url)
+        guardadas = cabeceras_a_guardar(cabeceras)
+        try:
+            # Primero las cabeceras: un script en disco siempre tiene las suyas
+            await asyncio.to_thread(_escribir, self._ruta_cabeceras(nombre), json.dumps(guardadas).encode("utf-8"))
+            await asyncio.to_thread(_escribir, os.path.join(self.directorio, nombre), cuerpo)
+        except OSError as e:
+            print(f"   ⚠️ No se pudo guardar el script en caché: {e}")
+            return
+        self._bytes -= self._archivos.pop(nombre, 0)
+        self._archivos[nombre] = len(cuerpo)
+        self._cabeceras[nombre] = guardadas
+        self._bytes += len(cuerpo)
+        self.guardados += 1
+        self._recortar()
+
+    def _borrar(self, nombre: str):
+        for ruta in (os.path.join(self.directorio, nombre), self._ruta_cabeceras(nombre)):
+            try:
+                os.remove(ruta)
+            except OSError:
+                pass
+
+    def _recortar(self):
+        while self._bytes > self.max_bytes and self._archivos:
+            nombre, tamano = self._archivos.popitem(last=False)
+            self._cabeceras.pop(nombre, None)
+            self._bytes -= tamano
+            self.desalojos += 1
+            self._borrar(nombre)
+
+    def estadisticas(self) -> dict:
+        return {
+            "archivos": len(self._archivos),
+            "bytes": self._bytes,
+            "aciertos": self.aciertos,
+            "fallos": self.fallos,
+            "guardados": self.guardados,
+            "desalojos": self.desalojos,
+        }
+
+
+def _escribir(ruta: str, cuerpo: bytes):
+    # Escritura atómica: otro contexto puede estar sirviendo el mismo archivo
+    temporal = f"{ruta}.{os.getpid()}.tmp"
+    with open(temporal, "wb") as f:
+        f.write(cuerpo)
+    os.replace(temporal, ruta)
+
+
+# Caché de scripts compartida por todos los contextos
+cache_scripts = CacheScripts()
+
+# Peticiones bloqueadas por motivo ('tipo' o 'host'), para /estadisticas
+bloqueos = {"tipo": 0, "host": 0}
+
+
+def _marco_principal(request) -> bool:
+    try:
+        return request.frame.parent_frame is None
+    except Exception:
+        return False  # peticiones de service workers no tienen frame
+
+
+class FiltroRecursos:
+    """
+    Manejador de context.route para un contexto. Reconoce la farmacia
+    por el host de la navegación principal y, con sus reglas:
+
+    1. Aborta imágenes, CSS, fuentes y medios.
+    2. Aborta hosts / URLs en lista de bloqueo (salvo los permitidos).
+    3. Sirve desde disco los scripts propios con hash en el nombre, con
+       las cabeceras de la respuesta original (Content-Type y CORS); en
+       un fallo los descarga con route.fetch() y los guarda para la
+       próxima vez. Si la descarga falla, deja pasar la petición.
+    4. Deja pasar todo lo demás (incluidos los scripts sin hash, que
+       pueden cambiar en la misma URL).
+    """
+
+    def __init__(self, cache: CacheScripts = cache_scripts):
+        self.cache = cache
+        self.farmacia = None
+
+    async def __call__(self, route):
+        request = route.request
+        if request.resource_type in TIPOS_BLOQUEADOS:
+            bloqueos["tipo"] += 1
+            await route.abort()
+            return
+
+        url = request.url
+        host = _host(url)
+        if request.resource_type == "document" and request.is_navigation_request() and _marco_principal(request):
+            self.farmacia = sitio_por_host(host) or self.farmacia
+        reglas = REGLAS_SITIOS.get(self.farmacia, {})
+
+        if not _coincide(url, host, reglas.get("permitir", [])) and (
+            _coincide(url, host, HOSTS_BLOQUEADOS) or _coincide(url, host, reglas.get("bloquear", []))
+        ):
+            bloqueos["host"] += 1
+            await route.abort()
+            return
+
+        if (
+            request.resource_type == "script"
+            and request.method == "GET"
+            and self.cache.activa
+            and tiene_hash(url)
+            and _coincide(url, host, reglas.get("primarios", []))
+        ):
+            await self._script(route, url)
+            return
+
+        await route.continue_()
+
+    async def _script(self, route, url: str):
+        encontrado = self.cache.obtener(url)
+        if encontrado is not None:
+            ruta, cabeceras = encontrado
+            try:
+                await route.fulfill(status=200, path=ruta, headers=cabeceras)
+                return
+            except OSError:
+                pass  # desalojado entre medio: se descarga de nuevo
+
+        try:
+            respuesta = await route.fetch()
+            if respuesta.status == 200 and es_inmutable(url, respuesta.headers.get("cache-control")):
+                await self.cache.guardar(url, await respuesta.body(), respuesta.headers)
+            await route.fulfill(response=respuesta)
+        except Exception as e:
+            # Timeout, conexión cortada, página cerrada...: que el navegador lo pida por su cuenta
+            print(f"   ⚠️ No se pudo cachear el script {url}: {e}")
+            try:
+                await route.continue_()
+            except Exception as e:
+                # Página cerrada o petición ya resuelta: no hay nada más que hacer con ella
+                print(f"   ⚠️ No se pudo dejar pasar el script {url}: {e}")
+
+
+def estadisticas() -> dict:
+    return {"bloqueadas": dict(bloqueos), "cache_scripts": cache_scripts.estadisticas()}
@@ -0,0 +1,124 @@
+import time
+from collections import deque
+
+from scrapers.config import CIRCUITO_FALLOS, CIRCUITO_ABIERTO_S, CIRCUITO_VENTANA
+
+# Estados del circuito de una farmacia
+CERRADO = "closed"          # se scrapea normalmente
+ABIERTO = "open"            # se omite el sitio sin intentarlo
+SEMIABIERTO = "half_open"   # se deja pasar una sola prueba
+
+
+class _Circuito:
+    """Salud reciente de una farmacia y estado de su circuito."""
+
+    def __init__(self, ventana: int):
+        self.estado = CERRADO
+        self.fallos_seguidos = 0
+        self.abierto_desde = 0.0
+        self.probando = False
+        self.recientes = deque(maxlen=ventana)  # (ok, latencia_s)
+        self.aperturas = 0
+        self.omitidos = 0
+
+    def resumen(self, abierto_s: float) -> dict:
+        latencias = sorted(lat for ok, lat in self.recientes if ok)
+        errores = sum(1 for ok, _ in self.recientes if not ok)
+        resumen = {
+            "estado": self.estado,
+            "fallos_seguidos": self.fallos_seguidos,
+            "tasa_error": round(errores / len(self.recientes), 2) if self.recientes else 0.0,
+            "latencia_p50_s": round(latencias[len(latencias) // 2], 2) if latencias else None,
+            "muestras": len(self.recientes),
+            "aperturas": self.aperturas,
+            "omitidos": self.omitidos,
+        }
+        if self.estado == ABIERTO:
+            resumen["reintento_en_s"] = round(max(0.0, self.abierto_desde + abierto_s - time.monotonic()), 1)
+        return resumen
+
+
+class RegistroSalud:
+    """
+    Circuit breaker por farmacia.
+
+    Tras `fallos` errores o timeouts seguidos el circuito se abre y el
+    sitio se omite al instante (la caché, si tiene algo, se sigue
+    sirviendo antes de llegar aquí). Pasados `abierto_s` segundos pasa a
+    semiabierto: una única petición de prueba scrapea el sitio; si
+    responde, el circuito se cierra y, si vuelve a fallar, se reabre.
+    """
+
+    def __init__(self, fallos: int = CIRCUITO_FALLOS, abierto_s: float = CIRCUITO_ABIERTO_S, ventana: int = CIRCUITO_VENTANA):
+        self.fallos = max(1, fallos)
+        self.abierto_s = abierto_s
+        self.ventana = max(1, ventana)
+        self._circuitos = {}
+
+    def _circuito(self, farmacia: str) -> _Circuito:
+        circuito = self._circuitos.get(farmacia)
+        if circuito is None:
+            circuito = self._circuitos[farmacia] = _Circuito(self.ventana)
+        return circuito
+
+    def permitir(self, farmacia: str) -> bool:
+        """
+        True si se puede scrapear el sitio ahora. En semiabierto solo la
+        primera llamada obtiene permiso (es la prueba); quien lo obtenga
+        debe llamar luego a `registrar` o a `abandonar`.
+        """
+        circuito = self._circuito(farmacia)
+        if circuito.estado == ABIERTO and time.monotonic() - circuito.abierto_desde >= self.abierto_s:
+            circuito.estado = SEMIABIERTO
+            circuito.probando = False
+        if circuito.estado == CERRADO:
+            return True
+        if circuito.estado == SEMIABIERTO and not circuito.probando:
+            print(f"   🩺 Probando si {farmacia} se recuperó...")
+            circuito.probando = True
+            return True
+        circuito.omitidos += 1
+        return False
+
+    def registrar(self, farmacia: str, ok: bool, latencia_s: float):
+        """Anota el resultado de un scrape (ok = el sitio respondió, con o sin productos)."""
+        circuito = self._circuito(farmacia)
+        circuito.recientes.append((ok, latencia_s))
+        circuito.probando = False
+        if ok:
+            if circuito.estado != CERRADO:
+                print(f"   ✅ {farmacia} respondió, cerrando el circuito")
+            circuito.estado = CERRADO
+            circuito.fallos_seguidos = 0
+            return
+
+        circuito.fallos_seguidos += 1
+        if circuito.estado == SEMIABIERTO or circuito.fallos_seguidos >= self.fallos:
+            if circuito.estado != ABIERTO:
+                print(f"   🔌 Circuito abierto para {farmacia} ({circuito.fallos_seguidos} fallos seguidos)")
+                circuito.aperturas += 1
+            circuito.estado = ABIERTO
+            circuito.abierto_desde = time.monotonic()
+
+    def abandonar(self, farmacia: str):
+        """El scrape se canceló sin resultado: libera la prueba para otra petición."""
+        self._circuito(farmacia).probando = False
+
+    def reintento_en(self, farmacia: str) -> float:
+        """Segundos que faltan para la siguiente prueba de un sitio abierto."""
+        circuito = self._circuito(farmacia)
+        return max(0.0, circuito.abierto_desde + self.abierto_s - time.monotonic())
+
+    def reiniciar(self, farmacia: str = None):
+        """Cierra el circuito de una farmacia (o de todas) y borra su historial."""
+        if farmacia is None:
+            self._circuitos.clear()
+        else:
+            self._circuitos.pop(farmacia, None)
+
+    def estado(self) -> dict:
+        return {farmacia: c.resumen(self.abierto_s) for farmacia, c in self._circuitos.items()}
+
+
+# Salud de las farmacias compartida por toda la API
+salud_farmacias = RegistroSalud()
@@ -0,0 +1,198 @@
+import heapq
+import re
+from bisect import bisect_left, insort
+from collections import OrderedDict
+
+from scrapers.config import SUGERENCIAS_MAX_ENTRADAS, SUGERENCIAS_MIN_PREFIJO
+from scrapers.texto import normalizar_keyword
+
+# =============================================
+# AUTOCOMPLETADO POR PREFIJO
+# =============================================
+# Cada búsqueda alimenta el índice con el keyword (si trajo productos) y
+# los nombres de sus productos. Al escribir "parac" se sugieren primero
+# los keywords ya buscados (su resultado suele estar en la caché o en el
+# índice de precios) y los productos más vistos, cada uno con el keyword
+# que conviene buscar para obtenerlo sin esperar un scrape.
+
+TIPO_KEYWORD = "keyword"
+TIPO_PRODUCTO = "producto"
+
+# Largo máximo de una clave (los nombres de producto pueden ser muy largos)
+_MAX_LARGO = 100
+# Fracción de entradas que se descarta de una vez al llenarse el índice
+_FRACCION_DESALOJO = 0.1
+# Sugerencias que se mantienen por prefijo (máximo de `limite`) y
+# prefijos consultados que se recuerdan
+MAX_SUGERENCIAS = 20
+_MAX_PREFIJOS = 4096
+
+_RE_ESPACIOS = re.compile(r"\s+")
+
+
+class _Sugerencia:
+    __slots__ = ("texto", "keyword", "tipo", "peso", "visto")
+
+    def __init__(self, texto: str, keyword: str, tipo: str):
+        self.texto = texto        # como se muestra (primera forma vista)
+        self.keyword = keyword    # qué buscar para obtenerla
+        self.tipo = tipo
+        self.peso = 0.0           # veces vista en resultados (se reduce al desalojar)
+        self.visto = 0            # número de la última vez que se registró
+
+    def orden(self) -> tuple:
+        # Más popular primero; a igualdad, keywords y textos cortos
+        return (self.peso, self.tipo == TIPO_KEYWORD, -len(self.texto))
+
+
+class IndiceSugerencias:
+    """
+    Índice en memoria de keywords y nombres de productos para autocompletar.
+
+    Las claves (texto normalizado: sin acentos, minúsculas) viven en una
+    lista ordenada, así que las que empiezan con un prefijo forman un rango
+    contiguo que se ubica con dos bisect; dentro del rango ganan las más
+    populares. Recorrer el rango de un prefijo corto ("pa") cuesta
+    milisegundos, así que la primera consulta de cada prefijo guarda sus
+    MAX_SUGERENCIAS mejores y cada registro las mantiene al día (el peso
+    solo sube), de modo que las siguientes consultas no recorren nada.
+
+    Se acota a `max_entradas`: al pasarse se descarta de una vez el 10 %
+    menos popular (a igualdad, lo visto hace más tiempo) y los pesos que
+    quedan se reducen a la mitad para que lo nuevo pueda alcanzar a lo viejo.
+    """
+
+    def __init__(self, max_entradas: int = SUGERENCIAS_MAX_ENTRADAS, min_prefijo: int = SUGERENCIAS_MIN_PREFIJO):
+        self.max_entradas = max(1, max_entradas)
+        self.min_prefijo = max(1, min_prefijo)
+
+        self._claves = []     # claves normalizadas, ordenadas
+        self._entradas = {}   # clave -> _Sugerencia
+        self._tops = OrderedDict()  # prefijo consultado -> sus mejores _Sugerencia, en orden (LRU)
+        self._registros = 0
+
+        self.consultas = 0
+        self.aciertos_tops = 0
+        self.desalojos = 0
+
+    def __len__(self) -> int:
+        return len(self._entradas)
+
+    # ---------- escritura ----------
+
+    def _agregar(self, texto: str, keyword: str, tipo: str):
+        texto = _RE_ESPACIOS.sub(" ", texto).strip()[:_MAX_LARGO]
+        clave = normalizar_keyword(texto)
+        if len(clave) < self.min_prefijo:
+            return
+        entrada = self._entradas.get(clave)
+        if entrada is None:
+            entrada = self._entradas[clave] = _Sugerencia(texto, keyword, tipo)
+            insort(self._claves, clave)
+        elif tipo == TIPO_KEYWORD:
+            # Un nombre de producto que también se buscó pasa a ser keyword
+            entrada.tipo, entrada.keyword = TIPO_KEYWORD, keyword
+        elif entrada.tipo == TIPO_PRODUCTO:
+            entrada.keyword = keyword  # el keyword más reciente es el que más probablemente está en caché
+        entrada.peso += 1
+        entrada.visto = self._registros
+        self._actualizar_tops(clave, entrada)
+
+    def _actualizar_tops(self, clave: str, entrada: _Sugerencia):
+        for largo in range(self.min_prefijo, len(clave) + 1):
+            top = self._tops.get(clave[:largo])
+            if top is None:
+                continue
+            if entrada in top:
+                top.sort(key=_Sugerencia.orden, reverse=True)
+            elif len(top) < MAX_SUGERENCIAS or entrada.orden() > top[-1].orden():
+                top.append(entrada)
+                top.sort(key=_Sugerencia.orden, reverse=True)
+                del top[MAX_SUGERENCIAS:]
+
+    def registrar(self, keyword: str, productos: list):
+        """
+        Registra el resultado de un sitio para `keyword`: el keyword (si
+        trajo productos) y el nombre de cada producto suman una vez.
+        """
+        if not productos or not keyword or not keyword.strip():
+            return
+        self._registros += 1
+        keyword = _RE_ESPACIOS.sub(" ", keyword).strip()
+        self._agregar(keyword, keyword, TIPO_KEYWORD)
+        for nombre in {p.get("Producto") for p in productos if p.get("Producto")}:
+            self._agregar(nombre, keyword, TIPO_PRODUCTO)
+
+        if len(self._entradas) > self.max_entradas:
+            self._desalojar()
+
+    def _desalojar(self):
+        quedan = int(self.max_entradas * (1 - _FRACCION_DESALOJO))
+        victimas = heapq.nsmallest(
+            len(self._entradas) - quedan, self._entradas.items(), key=lambda par: (par[1].peso, par[1].visto)
+        )
+        for clave, _ in victimas:
+            del self._entradas[clave]
+        self._claves = [clave for clave in self._claves if clave in self._entradas]
+        # Reducir todos los pesos a la mitad no cambia el orden de los tops;
+        # un top que perdió una entrada ya no es completo y se recalcula
+        for entrada in self._entradas.values():
+            entrada.peso /= 2
+        desalojadas = {id(entrada) for _, entrada in victimas}
+        for prefijo in [p for p, top in self._tops.items() if any(id(e) in desalojadas for e in top)]:
+            del self._tops[prefijo]
+        self.desalojos += len(victimas)
+
+    def limpiar(self):
+        self._claves.clear()
+        self._entradas.clear()
+        self._tops.clear()
+
+    # ---------- lectura ----------
+
+    def _top(self, clave: str) -> list:
+        top = self._tops.get(clave)
+        if top is not None:
+            self.aciertos_tops += 1
+            self._tops.move_to_end(clave)
+            return top
+
+        inicio = bisect_left(self._claves, clave)
+        fin = bisect_left(self._claves, clave + "\U0010ffff", inicio)
+        entradas = (self._entradas[self._claves[i]] for i in range(inicio, fin))
+        top = self._tops[clave] = heapq.nlargest(MAX_SUGERENCIAS, entradas, key=_Sugerencia.orden)
+        if len(self._tops) > _MAX_PREFIJOS:
+            self._tops.popitem(last=False)
+        return top
+
+    def sugerir(self, prefijo: str, limite: int = 10) -> list:
+        """
+        Hasta `limite` (<= MAX_SUGERENCIAS) sugerencias que empiezan con
+        `prefijo` sin importar acentos ni mayúsculas, de la más popular a
+        la menos; a igual popularidad, los keywords primero. Cada una:
+
+            {"texto", "tipo": "keyword" | "producto", "keyword", "popularidad"}
+        """
+        self.consultas += 1
+        clave = normalizar_keyword(prefijo)[:_MAX_LARGO]
+        if len(clave) < self.min_prefijo:
+            return []
+        return [
+            {"texto": e.texto, "tipo": e.tipo, "keyword": e.keyword, "popularidad": round(e.peso, 2)}
+            for e in self._top(clave)[:limite]
+        ]
+
+    def estadisticas(self) -> dict:
+        return {
+            "entradas": len(self._entradas),
+            "keywords": sum(1 for e in self._entradas.values() if e.tipo == TIPO_KEYWORD),
+            "max_entradas": self.max_entradas,
+            "consultas": self.consultas,
+            "prefijos_en_memoria": len(self._tops),
+            "aciertos_tops": self.aciertos_tops,
+            "desalojos": self.desalojos,
+        }
+
+
+# Índice compartido por toda la API (uno por proceso de uvicorn)
+indice_sugerencias = IndiceSugerencias()
@@ -0,0 +1,21 @@
+import re
+import unicodedata
+
+_ESPACIOS = re.compile(r'\s+')
+
+
+def quitar_acentos(texto: str) -> str:
+    """'Ibuprofeno Niños' -> 'Ibuprofeno Ninos'"""
+    descompuesto = unicodedata.normalize('NFKD', texto)
+    return ''.join(c for c in descompuesto if not unicodedata.combining(c))
+
+
+def normalizar_keyword(keyword: str) -> str:
+    """
+    Forma canónica de un término de búsqueda para usarlo como clave:
+    sin acentos, en minúsculas y con espacios colapsados.
+    ' Paracetamol ' y 'paracetamol' dan lo mismo.
+    """
+    if not keyword:
+        return ""
+    return _ESPACIOS.sub(' ', quitar_acentos(keyword).lower()).strip()
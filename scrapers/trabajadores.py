@@ -0,0 +1,482 @@
+"""
+Procesos trabajadores de scraping (TRABAJADORES > 0).
+
+La API no abre navegadores: cada scrape de un sitio se manda como trabajo
+a un despachador local por un socket Unix. El despachador reparte los
+trabajos entre N procesos trabajadores (cada uno con su propio pool de
+Chromium) y devuelve los productos a quien los pidió. Así el parseo y
+Playwright no frenan el event loop de uvicorn, el trabajo se reparte
+entre núcleos y varios workers de uvicorn comparten los mismos
+navegadores en lugar de lanzar uno cada uno.
+
+Protocolo: una línea JSON por mensaje.
+
+    al conectarse:          {"rol": "cliente"} / {"rol": "trabajador"}
+    cliente -> despachador: {"id": 7, "farmacia": "Inkafarma", "keyword": "...", "max_items": 15}
+                            {"id": 7, "cancelar": true}
+                            {"reciclar": true}   (se reenvía a todos los trabajadores)
+    despachador -> cliente: {"id": 7, "productos": [...], "etapas": [...]}
+                            {"id": 7, "error": "...", "etapas": [...]}
+
+"etapas" son las mediciones [farmacia, etapa, segundos] del trabajo, que
+el cliente vuelca en sus propias métricas (/metrics de la API).
+
+El despachador se puede correr aparte:
+
+    python -m scrapers.trabajadores --procesos 4
+
+o lo lanza la API al arrancar si no encuentra uno escuchando. Un lock de
+archivo garantiza que haya uno solo por socket.
+"""
+import argparse
+import asyncio
+import fcntl
+import itertools
+import json
+import os
+import signal
+import sys
+from collections import deque
+
+from scrapers.config import TRABAJADORES, TRABAJADORES_SOCKET, TRABAJADORES_TRABAJOS
+from scrapers.metricas import importar_etapas, registrar_etapas
+
+# Un despachador lanzado por la API se apaga tras este tiempo sin clientes
+_INACTIVO_S = 60
+# Tamaño máximo de una línea del protocolo (productos de un sitio)
+_LIMITE_LINEA = 16 * 1024 * 1024
+
+
+class ErrorTrabajador(Exception):
+    """El trabajo falló en el proceso trabajador o se perdió la conexión."""
+
+
+async def _enviar(writer: asyncio.StreamWriter, mensaje: dict):
+    writer.write(json.dumps(mensaje, ensure_ascii=False).encode("utf-8") + b"\n")
+    await writer.drain()
+
+
+# =============================================
+# DESPACHADOR
+# =============================================
+class Despachador:
+    """
+    Acepta clientes (procesos de la API) y trabajadores en el mismo socket.
+    Cada trabajo va al trabajador con menos trabajos en curso, hasta
+    `trabajos_por_proceso`; el resto espera en una cola FIFO. Si un
+    trabajador muere, sus trabajos en curso fallan y se lanza otro.
+    Un pedido de reciclar se reenvía a todos los trabajadores.
+    """
+
+    def __init__(self, direccion: str = TRABAJADORES_SOCKET, procesos: int = TRABAJADORES,
+                 trabajos_por_proceso: int = TRABAJADORES_TRABAJOS, autolanzado: bool = False):
+        self.direccion = direccion
+        self.procesos = max(1, procesos)
+        self.trabajos_por_proceso = max(1, trabajos_por_proceso)
+        self.autolanzado = autolanzado
+        self._servidor = None
+        self._lock_archivo = None
+        self._hijos = []
+        self._trabajadores = {}   # writer del trabajador -> ids en curso
+        self._trabajos = {}       # id interno -> (writer cliente, id del cliente, writer trabajador | None, mensaje)
+        self._cola = deque()      # ids internos esperando trabajador
+        self._clientes = set()
+        self._secuencia = itertools.count(1)
+        self._terminar = asyncio.Event()
+        self.reciclajes = 0
+
+    def _tomar_lock(self) -> bool:
+        self._lock_archivo = open(self.direccion + ".lock", "w")
+        try:
+            fcntl.flock(self._lock_archivo, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return True
+        except OSError:
+            return False
+
+    async def correr(self):
+        if not self._tomar_lock():
+            print(f"   👷 Ya hay un despachador en {self.direccion}")
+            return
+        if os.path.exists(self.direccion):
+            os.unlink(self.direccion)  # socket de una ejecución anterior
+        self._servidor = await asyncio.start_unix_server(self._atender, path=self.direccion, limit=_LIMITE_LINEA)
+        print(f"   👷 Despachador en {self.direccion} ({self.procesos} procesos, "
+              f"{self.trabajos_por_proceso} trabajos por proceso)")
+
+        supervisor = asyncio.create_task(self._supervisar())
+        try:
+            await self._terminar.wait()
+        finally:
+            supervisor.cancel()
+            self._servidor.close()
+            for hijo in self._hijos:
+                if hijo.returncode is None:
+                    hijo.terminate()
+            await asyncio.gather(*(hijo.wait() for hijo in self._hijos), return_exceptions=True)
+            if os.path.exists(self.direccion):
+                os.unlink(self.direccion)
+
+    def detener(self):
+        self._terminar.set()
+
+    async def _lanzar_trabajador(self):
+        hijo = await asyncio.create_subprocess_exec(
+            sys.executable, "-m", "scrapers.trabajadores", "--trabajador", "--direccion", self.direccion,
+        )
+        self._hijos.append(hijo)
+
+    async def _supervisar(self):
+        """Mantiene `procesos` trabajadores vivos y apaga el despachador autolanzado sin clientes."""
+        sin_clientes_s = 0
+        pausa_s = 1
+        while True:
+            vivos = [h for h in self._hijos if h.returncode is None]
+            if len(vivos) < len(self._hijos):
+                # Murieron trabajadores: se relanzan, pero espaciando si siguen cayendo
+                print(f"   ⚠️ {len(self._hijos) - len(vivos)} trabajador(es) terminaron; relanzando")
+                pausa_s = min(pausa_s * 2, 30)
+            else:
+                pausa_s = 1
+            self._hijos = vivos
+            for _ in range(self.procesos - len(self._hijos)):
+                await self._lanzar_trabajador()
+            await asyncio.sleep(pausa_s)
+
+            sin_clientes_s = 0 if self._clientes or self._trabajos else sin_clientes_s + pausa_s
+            if self.autolanzado and sin_clientes_s >= _INACTIVO_S:
+                print("   👷 Despachador sin clientes, apagando")
+                self.detener()
+
+    async def _atender(self, reader, writer):
+        try:
+            saludo = json.loads(await reader.readline() or b"{}")
+            if saludo.get("rol") == "trabajador":
+                await self._atender_trabajador(reader, writer)
+            else:
+                await self._atender_cliente(reader, writer)
+        except (ConnectionError, json.JSONDecodeError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    # ---------- clientes ----------
+
+    async def _atender_cliente(self, reader, writer):
+        self._clientes.add(writer)
+        try:
+            while linea := await reader.readline():
+                mensaje = json.loads(linea)
+                if mensaje.get("reciclar"):
+                    await self._reciclar()
+                    continue
+                if mensaje.get("cancelar"):
+                    await self._cancelar(writer, mensaje["id"])
+                    continue
+                interno = next(self._secuencia)
+                self._trabajos[interno] = (writer, mensaje["id"], None, mensaje)
+                self._cola.append(interno)
+                await self._asignar()
+        finally:
+            self._clientes.discard(writer)
+            for interno, (cliente, id_cliente, _, _) in list(self._trabajos.items()):
+                if cliente is writer:
+                    await self._cancelar(writer, id_cliente)
+
+    async def _cancelar(self, cliente, id_cliente):
+        for interno, (dueno, id_trabajo, trabajador, _) in list(self._trabajos.items()):
+            if dueno is cliente and id_trabajo == id_cliente:
+                del self._trabajos[interno]
+                if trabajador is None:
+                    self._cola.remove(interno)
+                else:
+                    self._trabajadores.get(trabajador, set()).discard(interno)
+                    await self._enviar_seguro(trabajador, {"id": interno, "cancelar": True})
+                    await self._asignar()
+                return
+
+    async def _reciclar(self):
+        print(f"   ♻️ Reciclando los navegadores de {len(self._trabajadores)} trabajador(es)")
+        self.reciclajes += 1
+        for trabajador in list(self._trabajadores):
+            await self._enviar_seguro(trabajador, {"reciclar": True})
+
+    async def _asignar(self):
+        while self._cola and self._trabajadores:
+            trabajador, en_curso = min(self._trabajadores.items(), key=lambda t: len(t[1]))
+            if len(en_curso) >= self.trabajos_por_proceso:
+                return
+            interno = self._cola.popleft()
+            cliente, id_cliente, _, mensaje = self._trabajos[interno]
+            self._trabajos[interno] = (cliente, id_cliente, trabajador, mensaje)
+            en_curso.add(interno)
+            await self._enviar_seguro(trabajador, {**mensaje, "id": interno})
+
+    # ---------- trabajadores ----------
+
+    async def _atender_trabajador(self, reader, writer):
+        self._trabajadores[writer] = set()
+        await self._asignar()
+        try:
+            while linea := await reader.readline():
+                respuesta = json.loads(linea)
+                interno = respuesta.pop("id")
+                self._trabajadores[writer].discard(interno)
+                trabajo = self._trabajos.pop(interno, None)
+                if trabajo is not None:  # None: se canceló mientras corría
+                    cliente, id_cliente, _, _ = trabajo
+                    await self._enviar_seguro(cliente, {**respuesta, "id": id_cliente})
+                await self._asignar()
+        finally:
+            # Trabajador caído: sus trabajos en curso fallan (el cliente decide si reintentar)
+            for interno in self._trabajadores.pop(writer, set()):
+                trabajo = self._trabajos.pop(interno, None)
+                if trabajo is not None:
+                    cliente, id_cliente, _, _ = trabajo
+                    await self._enviar_seguro(cliente, {"id": id_cliente, "error": "El proceso trabajador terminó"})
+            await self._asignar()
+
+    async def _enviar_seguro(self, writer, mensaje: dict):
+        try:
+            await _enviar(writer, mensaje)
+        except ConnectionError:
+            pass
+
+    def estadisticas(self) -> dict:
+        return {
+            "trabajadores": len(self._trabajadores),
+            "en_curso": sum(len(ids) for ids in self._trabajadores.values()),
+            "en_cola": len(self._cola),
+            "clientes": len(self._clientes),
+            "reciclajes": self.reciclajes,
+        }
+
+
+# =============================================
+# PROCESO TRABAJADOR
+# =============================================
+async def correr_trabajador(direccion: str = TRABAJADORES_SOCKET):
+    """Lanza su propio pool de Chromium y atiende trabajos del despachador hasta que cierre."""
+    # Import tardío: la API no carga los scrapers en este módulo
+    from scrapers.farmacia_scrapers import SITIOS
+    from scrapers.navegador import PoolNavegadores, configurar_pool
+    from scrapers.http_rapido import cerrar_cliente
+
+    pool = PoolNavegadores()
+    await pool.iniciar()
+    configurar_pool(pool)
+    reader, writer = await asyncio.open_unix_connection(direccion, limit=_LIMITE_LINEA)
+    await _enviar(writer, {"rol": "trabajador"})
+    # Al recibir la señal se corta la conexión y se cierra el pool ordenadamente
+    loop = asyncio.get_running_loop()
+    for senal in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(senal, writer.close)
+    print(f"   👷 Trabajador {os.getpid()} listo")
+
+    tareas = {}
+
+    async def scrapear(mensaje: dict):
+        with registrar_etapas() as etapas:
+            try:
+                scraper = SITIOS[mensaje["farmacia"]]
+                productos = await scraper(mensaje["keyword"], mensaje["max_items"])
+                respuesta = {"id": mensaje["id"], "productos": productos}
+            except asyncio.CancelledError:
+                return
+            except Exception as e:
+                respuesta = {"id": mensaje["id"], "error": f"{type(e).__name__}: {e}"}
+            finally:
+                tareas.pop(mensaje["id"], None)
+        respuesta["etapas"] = etapas
+        try:
+            await _enviar(writer, respuesta)
+        except ConnectionError:
+            pass
+
+    try:
+        while linea := await reader.readline():
+            mensaje = json.loads(linea)
+            if mensaje.get("reciclar"):
+                # Memoria alta en la API: los Chromium se cierran al devolver sus contextos
+                await pool.reciclar()
+            elif mensaje.get("cancelar"):
+                tarea = tareas.get(mensaje["id"])
+                if tarea is not None:
+                    tarea.cancel()
+            else:
+                tareas[mensaje["id"]] = asyncio.create_task(scrapear(mensaje))
+    finally:
+        for tarea in list(tareas.values()):
+            tarea.cancel()
+        await asyncio.gather(*tareas.values(), return_exceptions=True)
+        configurar_pool(None)
+        await pool.cerrar()
+        await cerrar_cliente()
+
+
+# =============================================
+# CLIENTE (lado de la API)
+# =============================================
+class ClienteTrabajadores:
+    """
+    Conexión de un proceso de la API con el despachador. `scraper(farmacia)`
+    devuelve una función con la misma firma que las de SITIOS que, en lugar
+    de scrapear, manda el trabajo y espera la respuesta. Si la tarea que
+    espera se cancela (timeout, deadline, cliente desconectado), el trabajo
+    se cancela también en el trabajador. Las etapas medidas en el
+    trabajador se registran en las métricas de este proceso. Tiene
+    `reciclar()` como PoolNavegadores, así VigilanteMemoria lo usa igual.
+    """
+
+    def __init__(self, direccion: str = TRABAJADORES_SOCKET, procesos: int = TRABAJADORES):
+        self.direccion = direccion
+        self.procesos = procesos
+        self._reader = None
+        self._writer = None
+        self._lector = None
+        self._pendientes = {}   # id -> Future
+        self._secuencia = itertools.count(1)
+        self._lock = asyncio.Lock()
+
+        self.completados = 0
+        self.fallidos = 0
+
+    async def iniciar(self, espera_s: float = 15):
+        """Se conecta al despachador; si no hay uno escuchando, lo lanza."""
+        try:
+            await self._conectar()
+            return
+        except OSError:
+            pass
+        print(f"   👷 Lanzando despachador de {self.procesos} trabajadores en {self.direccion}")
+        await asyncio.create_subprocess_exec(
+            sys.executable, "-m", "scrapers.trabajadores", "--procesos", str(self.procesos),
+            "--direccion", self.direccion, "--autolanzado",
+            start_new_session=True,  # sobrevive a reinicios de este worker de uvicorn
+        )
+        limite = asyncio.get_running_loop().time() + espera_s
+        while True:
+            await asyncio.sleep(0.2)
+            try:
+                await self._conectar()
+                return
+            except OSError:
+                if asyncio.get_running_loop().time() > limite:
+                    raise
+
+    async def _conectar(self):
+        reader, writer = await asyncio.open_unix_connection(self.direccion, limit=_LIMITE_LINEA)
+        await _enviar(writer, {"rol": "cliente"})
+        self._reader, self._writer = reader, writer
+        self._lector = asyncio.create_task(self._leer(reader))
+
+    async def _leer(self, reader):
+        try:
+            while linea := await reader.readline():
+                respuesta = json.loads(linea)
+                importar_etapas(respuesta.get("etapas", ()))
+                futuro = self._pendientes.pop(respuesta["id"], None)
+                if futuro is None or futuro.done():
+                    continue
+                if "error" in respuesta:
+                    futuro.set_exception(ErrorTrabajador(respuesta["error"]))
+                else:
+                    futuro.set_result(respuesta["productos"])
+        except (ConnectionError, ValueError):
+            pass
+        finally:
+            # Conexión perdida: falla lo pendiente; la próxima llamada reconecta
+            self._writer = None
+            pendientes, self._pendientes = self._pendientes, {}
+            for futuro in pendientes.values():
+                if not futuro.done():
+                    futuro.set_exception(ErrorTrabajador("Se perdió la conexión con los trabajadores"))
+
+    async def _asegurar_conexion(self):
+        async with self._lock:
+            if self._writer is None:
+                try:
+                    await self._conectar()
+                except OSError as e:
+                    raise ErrorTrabajador(f"Despachador no disponible en {self.direccion}: {e}") from e
+
+    async def ejecutar(self, farmacia: str, keyword: str, max_items: int) -> list:
+        await self._asegurar_conexion()
+        id_trabajo = next(self._secuencia)
+        futuro = asyncio.get_running_loop().create_future()
+        self._pendientes[id_trabajo] = futuro
+        try:
+            await _enviar(self._writer, {"id": id_trabajo, "farmacia": farmacia, "keyword": keyword, "max_items": max_items})
+            productos = await futuro
+        except asyncio.CancelledError:
+            self._pendientes.pop(id_trabajo, None)
+            if self._writer is not None:
+                try:
+                    await asyncio.shield(_enviar(self._writer, {"id": id_trabajo, "cancelar": True}))
+                except (ConnectionError, asyncio.CancelledError):
+                    pass
+            raise
+        except ErrorTrabajador:
+            self.fallidos += 1
+            raise
+        except ConnectionError as e:
+            self._pendientes.pop(id_trabajo, None)
+            self.fallidos += 1
+            raise ErrorTrabajador(f"Se perdió la conexión con los trabajadores: {e}") from e
+        self.completados += 1
+        return productos
+
+    async def reciclar(self):
+        """Pide a todos los trabajadores que reciclen sus navegadores (ver PoolNavegadores.reciclar)."""
+        await self._asegurar_conexion()
+        try:
+            await _enviar(self._writer, {"reciclar": True})
+        except ConnectionError as e:
+            raise ErrorTrabajador(f"Se perdió la conexión con los trabajadores: {e}") from e
+
+    def scraper(self, farmacia: str):
+        async def buscar(keyword: str, max_items: int = 15):
+            return await self.ejecutar(farmacia, keyword, max_items)
+        return buscar
+
+    async def cerrar(self):
+        if self._writer is not None:
+            self._writer.close()
+        if self._lector is not None:
+            await asyncio.gather(self._lector, return_exceptions=True)
+            self._lector = None
+
+    def estadisticas(self) -> dict:
+        return {
+            "direccion": self.direccion,
+            "conectado": self._writer is not None,
+            "pendientes": len(self._pendientes),
+            "completados": self.completados,
+            "fallidos": self.fallidos,
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Despachador y procesos trabajadores de scraping")
+    parser.add_argument("--direccion", default=TRABAJADORES_SOCKET, help="socket Unix del despachador")
+    parser.add_argument("--procesos", type=int, default=TRABAJADORES or os.cpu_count() or 1)
+    parser.add_argument("--trabajos", type=int, default=TRABAJADORES_TRABAJOS, help="scrapes simultáneos por proceso")
+    parser.add_argument("--trabajador", action="store_true", help="(interno) correr como proceso trabajador")
+    parser.add_argument("--autolanzado", action="store_true", help="(interno) apagarse al quedar sin clientes")
+    args = parser.parse_args()
+
+    if args.trabajador:
+        asyncio.run(correr_trabajador(args.direccion))
+        return
+
+    async def despachar():
+        despachador = Despachador(args.direccion, args.procesos, args.trabajos, autolanzado=args.autolanzado)
+        loop = asyncio.get_running_loop()
+        for senal in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(senal, despachador.detener)
+        await despachador.correr()
+
+    asyncio.run(despachar())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+import asyncio
+import time
+
+import pytest
+
+from scrapers import farmacia_scrapers
+from scrapers.admision import COLA_LLENA, PLAZO_AGOTADO, ControlAdmision, Saturado
+from scrapers.cache import cache_resultados
+from scrapers.indice import indice_precios
+
+
+@pytest.fixture
+def sitios_falsos(monkeypatch):
+    """Dos farmacias falsas que tardan un poco; cuenta cuántas veces se scrapea cada una."""
+    llamadas = {"A": 0, "B": 0}
+
+    def scraper(farmacia):
+        async def scrapear(keyword, max_items):
+            llamadas[farmacia] += 1
+            await asyncio.sleep(0.05)
+            return [{"Producto": f"{keyword} {farmacia}", "Farmacia": farmacia, "Precio_Oferta": "S/ 1.00"}]
+        return scrapear
+
+    monkeypatch.setattr(farmacia_scrapers, "SITIOS", {"A": scraper("A"), "B": scraper("B")})
+    monkeypatch.setattr(indice_precios, "ruta", "")
+    cache_resultados.limpiar()
+    yield llamadas
+    cache_resultados.limpiar()
+
+
+def test_busquedas_identicas_ocupan_un_solo_turno(sitios_falsos):
+    async def probar():
+        control = ControlAdmision(max_busquedas=1, max_cola=0, espera_s=5)
+        respuestas = await asyncio.gather(*(
+            farmacia_scrapers.comparar_precios_detallado("paracetamol", 5, admision=control) for _ in range(30)
+        ))
+        assert all(len(r["productos"]) == 2 for r in respuestas)
+        assert control.admitidas == 1
+        assert control.rechazos[COLA_LLENA] == 0
+        assert sitios_falsos == {"A": 1, "B": 1}
+
+        # Todo en la caché: no se toma turno aunque el control esté lleno
+        control.en_curso = control.max_busquedas
+        respuesta = await farmacia_scrapers.comparar_precios_detallado("paracetamol", 5, admision=control)
+        assert len(respuesta["productos"]) == 2
+        assert control.admitidas == 1
+
+    asyncio.run(probar())
+
+
+def test_stream_desde_cache_no_ocupa_turno(sitios_falsos):
+    async def consumir(control):
+        return [r async for r in farmacia_scrapers.comparar_precios_stream("ibuprofeno", 5, admision=control)]
+
+    async def probar():
+        control = ControlAdmision(max_busquedas=1, max_cola=0, espera_s=5)
+        assert not farmacia_scrapers.en_cache("ibuprofeno", 5)
+        assert len(await consumir(control)) == 2
+        assert control.admitidas == 1
+        assert farmacia_scrapers.en_cache("ibuprofeno", 5)
+
+        control.en_curso = control.max_busquedas
+        assert len(await consumir(control)) == 2
+        assert control.admitidas == 1
+
+    asyncio.run(probar())
+
+
+def test_cola_llena_rechaza_con_429():
+    async def probar():
+        control = ControlAdmision(max_busquedas=1, max_cola=0, espera_s=5)
+        async with control.admitir():
+            with pytest.raises(Saturado) as error:
+                async with control.admitir():
+                    pass
+        assert error.value.codigo == 429
+        assert control.rechazos[COLA_LLENA] == 1
+        assert control.en_curso == 0
+
+    asyncio.run(probar())
+
+
+def test_presupuesto_incluye_la_espera_de_turno(monkeypatch):
+    async def lento(keyword, max_items):
+        await asyncio.sleep(1.0)
+        return [{"Producto": keyword, "Precio_Oferta": "S/ 1.00"}]
+
+    monkeypatch.setattr(farmacia_scrapers, "SITIOS", {"A": lento})
+    monkeypatch.setattr(indice_precios, "ruta", "")
+    cache_resultados.limpiar()
+
+    async def probar():
+        control = ControlAdmision(max_busquedas=1, max_cola=5, espera_s=30)
+        primera = asyncio.create_task(farmacia_scrapers.comparar_precios_detallado("amoxicilina", 5, admision=control))
+        await asyncio.sleep(0.05)
+        assert control.en_curso == 1
+
+        inicio = time.monotonic()
+        respuesta = await farmacia_scrapers.comparar_precios_detallado("ibuprofeno", 5, deadline_ms=200, admision=control)
+        transcurrido = time.monotonic() - inicio
+
+        assert transcurrido < 0.5
+        assert respuesta["productos"] == []
+        assert [s["estado"] for s in respuesta["sitios"]] == ["timeout"]
+        assert respuesta["sitios"][0]["tiempo_s"] >= 0.2
+        assert control.rechazos[PLAZO_AGOTADO] == 1
+        assert len((await primera)["productos"]) == 1
+
+    try:
+        asyncio.run(probar())
+    finally:
+        cache_resultados.limpiar()
+
+
+def test_sin_turno_responde_lo_que_hay_en_cache(monkeypatch):
+    async def lento(keyword, max_items):
+        await asyncio.sleep(1.0)
+        return []
+
+    monkeypatch.setattr(farmacia_scrapers, "SITIOS", {"A": lento, "B": lento})
+    monkeypatch.setattr(indice_precios, "ruta", "")
+    cache_resultados.limpiar()
+    cache_resultados.guardar("ibuprofeno", 5, "A", [{"Producto": "Ibuprofeno 400mg", "Farmacia": "A"}])
+
+    async def consumir(control):
+        resultados = farmacia_scrapers.comparar_precios_stream("ibuprofeno", 5, deadline_ms=200, admision=control)
+        return [r async for r in resultados]
+
+    async def probar():
+        control = ControlAdmision(max_busquedas=1, max_cola=5, espera_s=30)
+        async with control.admitir():
+            inicio = time.monotonic()
+            resultados = await consumir(control)
+            assert time.monotonic() - inicio < 0.5
+        assert {r.farmacia: (r.estado, r.fuente) for r in resultados} == {
+            "A": ("ok", "cache"), "B": ("timeout", "live"),
+        }
+
+    try:
+        asyncio.run(probar())
+    finally:
+        cache_resultados.limpiar()
+
+
+def test_turno_libre_sin_espera_aunque_no_quede_presupuesto():
+    async def probar():
+        control = ControlAdmision(max_busquedas=1, max_cola=0, espera_s=5)
+        async with control.admitir(espera_s=0):
+            assert control.en_curso == 1
+        assert control.rechazos[PLAZO_AGOTADO] == 0
+
+    asyncio.run(probar())
@@ -0,0 +1,219 @@
+import asyncio
+import json
+import time
+from contextlib import asynccontextmanager
+
+import pytest
+from fastapi.testclient import TestClient
+from prometheus_client import REGISTRY
+
+from app import app
+from scrapers import farmacia_scrapers, planificador
+from scrapers.cache import cache_resultados
+from scrapers.indice import indice_precios
+from scrapers.planificador import LimitadorSitios
+from scrapers.salud import salud_farmacias
+
+
+@pytest.fixture
+def cliente(monkeypatch):
+    """
+    Cliente de la API sin el lifespan (no abre Chromium): las pruebas
+    reemplazan farmacia_scrapers.SITIOS por scrapers falsos.
+    """
+    monkeypatch.setattr(indice_precios, "ruta", "")
+    cache_resultados.limpiar()
+    salud_farmacias.reiniciar()
+    yield TestClient(app)
+    cache_resultados.limpiar()
+    salud_farmacias.reiniciar()
+
+
+def _eventos(respuesta) -> list:
+    return [json.loads(linea) for linea in respuesta.text.splitlines() if linea]
+
+
+# ---------- POST /buscar_productos/lote ----------
+
+def test_lote_respeta_el_intervalo_por_farmacia(cliente, monkeypatch):
+    arranques = []
+
+    def scraper(farmacia):
+        async def scrapear(keyword, max_items):
+            arranques.append((farmacia, keyword, time.monotonic()))
+            await asyncio.sleep(0.01)
+            return [{"Producto": f"{keyword} {farmacia}", "Farmacia": farmacia, "Precio_Oferta": "S/ 2.00"}]
+        return scrapear
+
+    monkeypatch.setattr(farmacia_scrapers, "SITIOS", {"A": scraper("A"), "B": scraper("B")})
+    monkeypatch.setattr(farmacia_scrapers, "limitador_lote", LimitadorSitios(concurrencia=4, por_sitio=1, intervalo_s=0.1))
+
+    respuesta = cliente.post("/buscar_productos/lote", json={
+        "keywords": ["paracetamol", "ibuprofeno", " Paracetamol ", "amoxicilina"], "max_items": 5,
+    })
+
+    assert respuesta.status_code == 200
+    eventos = _eventos(respuesta)
+    assert [e["tipo"] for e in eventos] == ["keyword"] * 3 + ["resumen"]
+    # Los keywords repetidos tras normalizar se buscan una sola vez
+    assert sorted(e["keyword"] for e in eventos[:-1]) == ["amoxicilina", "ibuprofeno", "paracetamol"]
+    assert all(e["productos"] == 2 and [s["estado"] for s in e["sitios"]] == ["ok", "ok"] for e in eventos[:-1])
+    assert eventos[-1]["keywords"] == 3 and eventos[-1]["total"] == 6
+
+    for farmacia in ("A", "B"):
+        tiempos = sorted(t for f, _, t in arranques if f == farmacia)
+        assert len(tiempos) == 3
+        assert all(b - a >= 0.09 for a, b in zip(tiempos, tiempos[1:]))
+
+
+def test_lote_sin_keywords_validos(cliente):
+    assert cliente.post("/buscar_productos/lote", json={"keywords": ["  ", ""]}).status_code == 400
+    assert cliente.post("/buscar_productos/lote", json={"keywords": []}).status_code == 422
+
+
+# ---------- GET /buscar_productos/stream ----------
+
+class _Contextos:
+    """Reemplazo del pool: cuenta los contextos de navegador prestados a los scrapers falsos."""
+
+    def __init__(self):
+        self.prestados = 0
+
+    @asynccontextmanager
+    async def contexto(self):
+        self.prestados += 1
+        try:
+            yield
+        finally:
+            self.prestados -= 1
+
+
+@pytest.fixture
+def sitios_stream(monkeypatch):
+    """
+    Rapida responde enseguida, Media a los 0.05s y Lenta a los 5s (cada
+    prueba puede cambiar `demoras`); anota cuáles se cancelaron.
+    """
+    pool = _Contextos()
+    cancelados = []
+    demoras = {"Lenta": 5.0, "Media": 0.05, "Rapida": 0.0}
+
+    def scraper(farmacia, precio):
+        async def scrapear(keyword, max_items):
+            async with pool.contexto():
+                try:
+                    await asyncio.sleep(demoras[farmacia])
+                except asyncio.CancelledError:
+                    cancelados.append(farmacia)
+                    raise
+            return [{"Producto": f"{keyword} {farmacia}", "Farmacia": farmacia, "Precio_Oferta": precio}]
+        return scrapear
+
+    # Los tres a la vez, sea cual sea el presupuesto de RAM de esta máquina
+    monkeypatch.setattr(planificador, "concurrencia_efectiva", lambda: 3)
+    monkeypatch.setattr(farmacia_scrapers, "SITIOS", {
+        "Lenta": scraper("Lenta", "S/ 3.00"),
+        "Media": scraper("Media", "S/ 20.00"),
+        "Rapida": scraper("Rapida", "S/ 5.00"),
+    })
+    return pool, cancelados, demoras
+
+
+def _gauge(nombre: str, **etiquetas) -> float:
+    return REGISTRY.get_sample_value(nombre, etiquetas) or 0.0
+
+
+def test_stream_ndjson_sitios_en_orden_de_llegada_y_resumen(cliente, sitios_stream):
+    _, _, demoras = sitios_stream
+    demoras["Lenta"] = 0.1
+
+    respuesta = cliente.get("/buscar_productos/stream", params={"keyword": "paracetamol", "max_items": 5, "precio_max": 10})
+
+    assert respuesta.status_code == 200
+    assert respuesta.headers["content-type"].startswith("application/x-ndjson")
+    eventos = _eventos(respuesta)
+    assert [e["tipo"] for e in eventos] == ["sitio", "sitio", "sitio", "resumen"]
+    assert [e["farmacia"] for e in eventos[:-1]] == ["Rapida", "Media", "Lenta"]
+    assert all(e["estado"] == "ok" and e["fuente"] == "live" and e["productos"] == 1 for e in eventos[:-1])
+    # Cada evento trae solo los productos de su farmacia, ya filtrados por precio (Media cuesta S/ 20)
+    assert [[p["Producto"] for p in e["data"]] for e in eventos[:-1]] == [
+        ["paracetamol Rapida"], [], ["paracetamol Lenta"],
+    ]
+
+    resumen = eventos[-1]
+    assert resumen["total"] == 2
+    assert [s["farmacia"] for s in resumen["sitios"]] == ["Rapida", "Media", "Lenta"]
+    assert {k for k in resumen} == {"tipo", "total", "tiempo_s", "sitios"}
+
+
+def test_stream_sse(cliente, sitios_stream):
+    _, _, demoras = sitios_stream
+    demoras["Lenta"] = 0.0
+
+    respuesta = cliente.get("/buscar_productos/stream", params={"keyword": "ibuprofeno", "formato": "sse"})
+
+    assert respuesta.headers["content-type"].startswith("text/event-stream")
+    mensajes = [m for m in respuesta.text.split("\n\n") if m]
+    tipos = [m.splitlines()[0] for m in mensajes]
+    assert tipos == ["event: sitio"] * 3 + ["event: resumen"]
+    datos = json.loads(mensajes[-1].splitlines()[1].removeprefix("data: "))
+    assert datos["total"] == 3 and "tipo" not in datos
+
+
+def test_stream_con_deadline_reporta_timeout(cliente, sitios_stream):
+    pool, cancelados, _ = sitios_stream
+
+    respuesta = cliente.get("/buscar_productos/stream", params={"keyword": "amoxicilina", "deadline_ms": 200})
+
+    eventos = _eventos(respuesta)
+    assert [(e["farmacia"], e["estado"]) for e in eventos[:-1]] == [("Rapida", "ok"), ("Media", "ok"), ("Lenta", "timeout")]
+    assert eventos[-1]["tipo"] == "resumen"
+    assert cancelados == ["Lenta"] and pool.prestados == 0
+
+
+def test_stream_desconexion_libera_contextos_y_tareas(cliente, sitios_stream):
+    pool, cancelados, _ = sitios_stream
+
+    # TestClient no sabe cortar a mitad del stream: se llama a la app ASGI a mano
+    async def probar():
+        enviado = asyncio.Event()
+        cuerpos = []
+        pedidos = iter([{"type": "http.request", "body": b"", "more_body": False}])
+
+        async def recibir():
+            for pedido in pedidos:
+                return pedido
+            # El cliente se va después del primer evento
+            await enviado.wait()
+            return {"type": "http.disconnect"}
+
+        async def enviar(mensaje):
+            if mensaje["type"] == "http.response.body" and mensaje.get("body"):
+                cuerpos.append(mensaje["body"])
+                enviado.set()
+
+        alcance = {
+            "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET", "scheme": "http",
+            "path": "/buscar_productos/stream", "raw_path": b"/buscar_productos/stream",
+            "query_string": b"keyword=vitamina+c", "headers": [(b"host", b"test")],
+            "client": ("test", 1), "server": ("test", 80), "root_path": "",
+        }
+        inicio = time.monotonic()
+        await asyncio.wait_for(app(alcance, recibir, enviar), 2.0)
+        transcurrido = time.monotonic() - inicio
+        await asyncio.sleep(0)
+        pendientes = [t for t in asyncio.all_tasks() if t is not asyncio.current_task()]
+        return cuerpos, transcurrido, pendientes
+
+    antes = _gauge("busquedas_en_curso", endpoint="buscar_productos_stream")
+    cuerpos, transcurrido, pendientes = asyncio.run(probar())
+
+    assert transcurrido < 1.0
+    assert json.loads(cuerpos[0])["farmacia"] == "Rapida"
+    assert not any(b'"resumen"' in cuerpo for cuerpo in cuerpos)
+    # La Lenta se canceló y devolvió su contexto; no quedó nada corriendo
+    assert "Lenta" in cancelados
+    assert pool.prestados == 0
+    assert pendientes == []
+    assert _gauge("busquedas_en_curso", endpoint="buscar_productos_stream") == antes
+    assert _gauge("scrapers_en_curso", farmacia="Lenta") == 0
@@ -0,0 +1,112 @@
+import asyncio
+import time
+
+from scrapers.cache import FRESCO, VENCIDO, CacheResultados
+
+
+class _Reloj:
+    """Reemplazo de time.monotonic que avanza a mano."""
+
+    def __init__(self):
+        self.ahora = 1000.0
+
+    def __call__(self) -> float:
+        return self.ahora
+
+
+def _cache(monkeypatch, **kwargs) -> tuple:
+    reloj = _Reloj()
+    monkeypatch.setattr(time, "monotonic", reloj)
+    opciones = {"ttl_s": 60, "stale_s": 120, "ttl_por_farmacia": {}}
+    opciones.update(kwargs)
+    return CacheResultados(**opciones), reloj
+
+
+def test_fresco_vencido_y_expirado(monkeypatch):
+    cache, reloj = _cache(monkeypatch)
+    cache.guardar("Paracetamol", 15, "A", [{"Producto": "x"}])
+
+    assert cache.obtener("paracetamol ", 15, "A")[2] == FRESCO
+    reloj.ahora += 61
+    productos, edad, frescura = cache.obtener("paracetamol", 15, "A")
+    assert (productos, frescura) == ([{"Producto": "x"}], VENCIDO)
+    assert edad == 61
+    reloj.ahora += 120
+    assert cache.obtener("paracetamol", 15, "A") is None
+    assert cache.estadisticas()["entradas"] == 0
+    assert (cache.aciertos, cache.aciertos_stale, cache.fallos) == (1, 1, 1)
+
+
+def test_ttl_por_farmacia(monkeypatch):
+    cache, reloj = _cache(monkeypatch, ttl_por_farmacia={"Lenta": 10})
+    cache.guardar("ibuprofeno", 15, "Lenta", [])
+    cache.guardar("ibuprofeno", 15, "Normal", [])
+    reloj.ahora += 30
+    assert cache.obtener("ibuprofeno", 15, "Lenta")[2] == VENCIDO
+    assert cache.obtener("ibuprofeno", 15, "Normal")[2] == FRESCO
+
+
+def test_contiene_no_cuenta_aciertos(monkeypatch):
+    cache, reloj = _cache(monkeypatch)
+    cache.guardar("ibuprofeno", 15, "A", [])
+    assert cache.contiene("IBUPROFENO", 15, "A")
+    assert not cache.contiene("ibuprofeno", 30, "A")
+    reloj.ahora += 181
+    assert not cache.contiene("ibuprofeno", 15, "A")
+    assert (cache.aciertos, cache.fallos) == (0, 0)
+
+
+def test_desalojo_lru_por_entradas(monkeypatch):
+    cache, _ = _cache(monkeypatch, max_entradas=2)
+    cache.guardar("a", 15, "A", [])
+    cache.guardar("b", 15, "A", [])
+    cache.obtener("a", 15, "A")  # 'a' pasa a ser la más reciente
+    cache.guardar("c", 15, "A", [])
+    assert cache.contiene("a", 15, "A") and cache.contiene("c", 15, "A")
+    assert not cache.contiene("b", 15, "A")
+    assert cache.desalojos == 1
+
+
+def test_desalojo_por_bytes_y_resultados_demasiado_grandes(monkeypatch):
+    productos = [{"Producto": "x" * 40}]
+    cache, _ = _cache(monkeypatch, max_bytes=120)
+    cache.guardar("a", 15, "A", productos)
+    cache.guardar("b", 15, "A", productos)
+    cache.guardar("c", 15, "A", productos)
+    assert cache.estadisticas()["bytes"] <= 120
+    assert not cache.contiene("a", 15, "A") and cache.contiene("c", 15, "A")
+
+    cache.guardar("grande", 15, "A", [{"Producto": "x" * 500}])
+    assert not cache.contiene("grande", 15, "A")
+
+
+def test_reemplazar_una_entrada_no_duplica_bytes(monkeypatch):
+    cache, _ = _cache(monkeypatch)
+    cache.guardar("a", 15, "A", [{"Producto": "uno"}])
+    bytes_antes = cache.estadisticas()["bytes"]
+    cache.guardar("a", 15, "A", [{"Producto": "uno"}])
+    assert cache.estadisticas()["bytes"] == bytes_antes
+    assert cache.estadisticas()["entradas"] == 1
+
+
+def test_un_solo_refresco_en_curso_por_clave():
+    cache = CacheResultados()
+    lanzados = []
+
+    async def probar():
+        liberar = asyncio.Event()
+
+        async def refresco():
+            lanzados.append(1)
+            await liberar.wait()
+
+        cache.refrescar("a", 15, "A", refresco)
+        cache.refrescar("a", 15, "A", refresco)
+        await asyncio.sleep(0)
+        assert cache.estadisticas()["refrescos_en_curso"] == 1
+        liberar.set()
+        await asyncio.sleep(0.01)
+        assert cache.estadisticas()["refrescos_en_curso"] == 0
+
+    asyncio.run(probar())
+    assert lanzados == [1]
@@ -0,0 +1,125 @@
+import asyncio
+
+import pytest
+
+from scrapers.coalescencia import Coalescedor
+
+
+def test_peticiones_iguales_comparten_la_tarea():
+    async def probar():
+        coalescedor = Coalescedor("prueba")
+        llamadas = []
+        liberar = asyncio.Event()
+
+        async def trabajo():
+            llamadas.append(1)
+            await liberar.wait()
+            return ["producto"]
+
+        esperas = [asyncio.create_task(coalescedor.ejecutar("paracetamol", trabajo)) for _ in range(3)]
+        await asyncio.sleep(0)
+        assert coalescedor.en_curso("paracetamol")
+        liberar.set()
+        resultados = await asyncio.gather(*esperas)
+
+        assert resultados == [["producto"]] * 3
+        assert llamadas == [1]
+        assert not coalescedor.en_curso("paracetamol")
+        assert coalescedor.estadisticas() == {"en_curso": 0, "ejecuciones": 1, "coalescidas": 2, "canceladas": 0}
+
+    asyncio.run(probar())
+
+
+def test_claves_distintas_no_se_mezclan():
+    async def probar():
+        coalescedor = Coalescedor("prueba")
+
+        async def trabajo(valor):
+            await asyncio.sleep(0)
+            return valor
+
+        resultados = await asyncio.gather(
+            coalescedor.ejecutar("a", lambda: trabajo("a")),
+            coalescedor.ejecutar("b", lambda: trabajo("b")),
+        )
+        assert resultados == ["a", "b"]
+        assert coalescedor.ejecuciones == 2
+
+    asyncio.run(probar())
+
+
+def test_cancelar_una_espera_no_cancela_la_tarea():
+    async def probar():
+        coalescedor = Coalescedor("prueba")
+        liberar = asyncio.Event()
+
+        async def trabajo():
+            await liberar.wait()
+            return "ok"
+
+        primera = asyncio.create_task(coalescedor.ejecutar("k", trabajo))
+        segunda = asyncio.create_task(coalescedor.ejecutar("k", trabajo))
+        await asyncio.sleep(0)
+
+        primera.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await primera
+        assert coalescedor.en_curso("k")
+
+        liberar.set()
+        assert await segunda == "ok"
+        assert coalescedor.canceladas == 0
+
+    asyncio.run(probar())
+
+
+def test_sin_esperas_se_cancela_la_tarea():
+    async def probar():
+        coalescedor = Coalescedor("prueba")
+        cancelado = asyncio.Event()
+
+        async def trabajo():
+            try:
+                await asyncio.sleep(60)
+            except asyncio.CancelledError:
+                cancelado.set()
+                raise
+
+        esperas = [asyncio.create_task(coalescedor.ejecutar("k", trabajo)) for _ in range(2)]
+        await asyncio.sleep(0)
+        for espera in esperas:
+            espera.cancel()
+        await asyncio.gather(*esperas, return_exceptions=True)
+        await asyncio.wait_for(cancelado.wait(), 1)
+        await asyncio.sleep(0)
+
+        assert not coalescedor.en_curso("k")
+        assert coalescedor.canceladas == 1
+
+    asyncio.run(probar())
+
+
+def test_la_excepcion_llega_a_todas_las_esperas():
+    async def probar():
+        coalescedor = Coalescedor("prueba")
+
+        async def trabajo():
+            await asyncio.sleep(0)
+            raise RuntimeError("sitio caído")
+
+        resultados = await asyncio.gather(
+            coalescedor.ejecutar("k", trabajo),
+            coalescedor.ejecutar("k", trabajo),
+            return_exceptions=True,
+        )
+        assert [str(r) for r in resultados] == ["sitio caído"] * 2
+        assert all(isinstance(r, RuntimeError) for r in resultados)
+        assert not coalescedor.en_curso("k")
+
+        # Terminada la tarea, la misma clave vuelve a ejecutarse
+        async def otra():
+            return "ok"
+        assert await coalescedor.ejecutar("k", otra) == "ok"
+        assert coalescedor.ejecuciones == 2
+
+    asyncio.run(probar())
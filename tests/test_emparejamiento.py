@@ -0,0 +1,77 @@
+from scrapers.emparejamiento import agrupar_productos, emparejar, firma
+
+
+def _producto(nombre: str, farmacia: str, precio: str) -> dict:
+    return {"Producto": nombre, "Farmacia": farmacia, "Precio_Oferta": precio, "Precio_Regular": "No disponible"}
+
+
+def _grupos(productos: list) -> list:
+    return sorted(sorted(p["Producto"] for p in g["productos"]) for g in agrupar_productos(productos))
+
+
+def test_firma_normaliza_concentracion_y_unidades():
+    f = firma("PANADOL Antigripal 500 MG Tabletas Caja x 100")
+    assert f.base == "panadol antigripal"
+    assert f.concentracion == ("500mg",)
+    assert f.unidades == 100
+
+
+def test_firma_convierte_gramos_a_miligramos():
+    assert firma("Paracetamol 1g x 100").concentracion == ("1000mg",)
+    assert firma("Paracetamol 0,5 g").concentracion == ("500mg",)
+    assert firma("Paracetamol 1g").concentracion == firma("Paracetamol 1000mg").concentracion
+
+
+def test_agrupa_el_mismo_producto_de_distintas_farmacias():
+    productos = [
+        _producto("Panadol Antigripal 500mg x 100", "Inkafarma", "S/ 20.00"),
+        _producto("PANADOL ANTIGRIPAL 500 MG TABLETAS CAJA X 100", "Mifarma", "S/ 18.50"),
+        _producto("Ibuprofeno 400mg x 10", "Mifarma", "S/ 5.00"),
+    ]
+    grupos = agrupar_productos(productos)
+    assert len(grupos) == 2
+    panadol = grupos[0]
+    assert panadol["farmacias"] == 2
+    assert panadol["precio_min_centimos"] == 1850
+    assert panadol["precio_max_centimos"] == 2000
+    assert panadol["mejor_farmacia"] == "Mifarma"
+
+
+def test_sin_unidades_no_une_presentaciones_distintas():
+    productos = [
+        _producto("Panadol Antigripal 500mg x 12", "Inkafarma", "S/ 6.00"),
+        _producto("Panadol Antigripal 500mg", "Mifarma", "S/ 7.00"),
+        _producto("Panadol Antigripal 500mg x 100", "BoticasPeru", "S/ 40.00"),
+    ]
+    for grupo in agrupar_productos(productos):
+        assert len({p["Producto"] for p in grupo["productos"]} & {
+            "Panadol Antigripal 500mg x 12", "Panadol Antigripal 500mg x 100"}) <= 1
+    assert ["Panadol Antigripal 500mg x 100"] in _grupos(productos)
+
+
+def test_sin_concentracion_no_une_concentraciones_distintas():
+    productos = [
+        _producto("Paracetamol 500mg x 100", "Inkafarma", "S/ 10.00"),
+        _producto("Paracetamol x 100", "Mifarma", "S/ 11.00"),
+        _producto("Paracetamol 1g x 100", "BoticasPeru", "S/ 25.00"),
+    ]
+    for grupo in agrupar_productos(productos):
+        concentraciones = {firma(p["Producto"]).concentracion for p in grupo["productos"]} - {()}
+        assert len(concentraciones) <= 1
+    assert len(agrupar_productos(productos)) == 2
+
+
+def test_gramos_y_miligramos_equivalentes_se_agrupan():
+    productos = [
+        _producto("Paracetamol 1g x 100", "Inkafarma", "S/ 25.00"),
+        _producto("Paracetamol 1000mg x 100", "Mifarma", "S/ 24.00"),
+    ]
+    assert len(agrupar_productos(productos)) == 1
+
+
+def test_emparejar_devuelve_todos_los_indices_una_vez():
+    nombres = ["Panadol 500mg x 10", "Panadol 500 mg x10", "Aspirina 100mg", "Aspirina 100 mg", "Bismutol"]
+    grupos = emparejar([firma(n) for n in nombres], 0.6)
+    assert sorted(i for g in grupos for i in g) == list(range(len(nombres)))
+    assert [0, 1] in grupos and [2, 3] in grupos
+
@@ -0,0 +1,95 @@
+import asyncio
+import time
+
+from playwright.async_api import TimeoutError as PlaywrightTimeoutError
+
+from scrapers.espera import esperar_productos
+
+
+class _Pagina:
+    """
+    Página falsa con scroll infinito: `conteos[i]` es cuántas tarjetas hay
+    después del i-ésimo scroll (se repite el último al acabarse la lista).
+    Las tarjetas nuevas tardan `carga_s` en aparecer tras cada scroll.
+    """
+
+    def __init__(self, conteos: list, carga_s: float = 0.0, hay_tarjetas: bool = True):
+        self.conteos = conteos
+        self.carga_s = carga_s
+        self.hay_tarjetas = hay_tarjetas
+        self.scrolls = 0
+
+    def conteo(self) -> int:
+        return self.conteos[min(self.scrolls, len(self.conteos) - 1)]
+
+    async def wait_for_selector(self, selector, state=None, timeout=None):
+        if not self.hay_tarjetas:
+            await asyncio.sleep(timeout / 1000)
+            raise PlaywrightTimeoutError(f"Timeout {timeout}ms exceeded.")
+
+    async def evaluate(self, expresion, arg=None):
+        if expresion.startswith("window.scrollTo"):
+            self.scrolls += 1
+            return None
+        return self.conteo()
+
+    async def wait_for_function(self, expresion, arg=None, timeout=None):
+        _, anterior = arg
+        if self.conteo() > anterior and self.carga_s * 1000 < timeout:
+            await asyncio.sleep(self.carga_s)
+            return True
+        await asyncio.sleep(timeout / 1000)
+        raise PlaywrightTimeoutError(f"Timeout {timeout}ms exceeded.")
+
+
+def _esperar(pagina, max_items=15, techo_s=5.0, **kwargs) -> tuple:
+    inicio = time.monotonic()
+    conteo = asyncio.run(esperar_productos(pagina, ".tarjeta", max_items, techo_s, espera_crecimiento_ms=50, **kwargs))
+    return conteo, time.monotonic() - inicio
+
+
+def test_termina_al_llegar_a_max_items():
+    pagina = _Pagina([6, 12, 18, 24, 30])
+    conteo, _ = _esperar(pagina, max_items=15)
+    assert conteo == 18
+    assert pagina.scrolls == 2
+
+
+def test_sin_scroll_si_ya_hay_suficientes():
+    pagina = _Pagina([20])
+    assert _esperar(pagina, max_items=15)[0] == 20
+    assert pagina.scrolls == 0
+
+
+def test_termina_cuando_el_conteo_se_estabiliza():
+    # Crece dos veces y después ningún scroll trae tarjetas nuevas
+    pagina = _Pagina([4, 8, 10])
+    conteo, transcurrido = _esperar(pagina, max_items=50, rondas_estables=2)
+    assert conteo == 10
+    # Dos scrolls que crecieron y dos seguidos sin cambios
+    assert pagina.scrolls == 4
+    assert transcurrido < 0.5
+
+
+def test_una_ronda_sin_cambios_no_corta_si_despues_crece():
+    # El segundo scroll no trae nada, pero el tercero sí: se reinicia la cuenta de rondas estables
+    pagina = _Pagina([4, 8, 8, 12])
+    conteo, _ = _esperar(pagina, max_items=50, rondas_estables=2)
+    assert conteo == 12
+    assert pagina.scrolls == 5
+
+
+def test_techo_corta_aunque_siga_creciendo():
+    # Cada scroll trae una tarjeta más, pero tarda 30ms en cargar
+    pagina = _Pagina(list(range(1, 1000)), carga_s=0.03)
+    conteo, transcurrido = _esperar(pagina, max_items=1000, techo_s=0.2)
+    assert 0.2 <= transcurrido < 0.35
+    assert 3 <= conteo < 10
+
+
+def test_sin_tarjetas_devuelve_cero_al_llegar_al_techo():
+    pagina = _Pagina([0], hay_tarjetas=False)
+    conteo, transcurrido = _esperar(pagina, techo_s=0.1)
+    assert conteo == 0
+    assert pagina.scrolls == 0
+    assert transcurrido < 0.3
@@ -0,0 +1,54 @@
+import json
+import shutil
+import subprocess
+
+import pytest
+
+from scrapers.extraccion_js import SCRIPT_EXTRACCION
+from scrapers.parsers import ESPEC_FARMACIAUNIVERSAL, ESPEC_INKAFARMA, ESPEC_MIFARMA, ESPECS
+
+
+def _regexes(valor):
+    """Todas las descripciones {"fuente", "flags"} dentro de args_js."""
+    if isinstance(valor, dict):
+        if set(valor) == {"fuente", "flags"}:
+            yield valor
+        else:
+            for v in valor.values():
+                yield from _regexes(v)
+    elif isinstance(valor, list):
+        for v in valor:
+            yield from _regexes(v)
+
+
+def test_args_js_describe_la_espec_como_json():
+    for espec in ESPECS.values():
+        json.dumps(espec.args_js)
+        assert espec.args_js["candidatos"] == [c.selector for c in espec.candidatos]
+        assert len(espec.args_js["oferta"]) == len(espec.oferta)
+
+
+def test_args_js_de_reglas_por_clase_y_precios_vtex():
+    args = ESPEC_INKAFARMA.args_js
+    assert args["nombreReglas"] == [{"tags": "h1, h2, h3, h4", "clase": {"fuente": "name|title", "flags": "i"}}]
+    assert args["oferta"][0]["texto"]["tags"] == "*"
+    assert args["quitarRegularDeOferta"] and args["descartarRegularIgual"]
+    assert ESPEC_MIFARMA.args_js == args
+
+    vtex = ESPEC_FARMACIAUNIVERSAL.args_js
+    assert vtex["tarjeta"] == {"tag": "article", "clase": None}
+    assert set(vtex["oferta"][0]) == {"entero", "fraccion"}
+    assert vtex["nombreQuitar"]["flags"] == "i"
+
+
+@pytest.mark.skipif(shutil.which("node") is None, reason="sin node")
+def test_script_y_regex_validos_en_javascript():
+    regexes = [r for espec in ESPECS.values() for r in _regexes(espec.args_js)]
+    programa = (
+        f"const f = {SCRIPT_EXTRACCION};\n"
+        f"for (const r of {json.dumps(regexes)}) new RegExp(r.fuente, r.flags + 'g');\n"
+        "console.log(typeof f);"
+    )
+    salida = subprocess.run(["node", "-e", programa], capture_output=True, text=True, timeout=30)
+    assert salida.returncode == 0, salida.stderr
+    assert salida.stdout.strip() == "function"
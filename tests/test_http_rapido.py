@@ -0,0 +1,144 @@
+import asyncio
+import os
+
+import httpx
+import pytest
+
+from herramientas.servidor_farmacias import FIXTURES_DIR
+from scrapers import http_rapido
+from scrapers.parsers import ESPEC_BOTICASPERU, ESPEC_FARMACIAUNIVERSAL
+
+BASE_VTEX = "http://farmacias.test/farmaciauniversal"
+BASE_MAGENTO = "http://farmacias.test/boticasperu"
+
+
+# Las respuestas son los fixtures sintéticos de herramientas/fixtures/ (escritos
+# a mano con la forma de cada plataforma, no capturas de los sitios): estas
+# pruebas cubren el fetcher y el respaldo, no el marcado real de cada farmacia.
+def _fixture(nombre: str) -> str:
+    with open(os.path.join(FIXTURES_DIR, nombre), encoding="utf-8") as f:
+        return f.read()
+
+
+@pytest.fixture
+def servidor(monkeypatch):
+    """
+    Cliente HTTP compartido con un MockTransport: `servidor.responder` se
+    reemplaza en cada prueba y `servidor.pedidos` guarda lo pedido.
+    """
+    class Servidor:
+        pedidos = []
+
+        @staticmethod
+        def responder(request):
+            return httpx.Response(404)
+
+    def manejar(request):
+        Servidor.pedidos.append(request)
+        return Servidor.responder(request)
+
+    monkeypatch.setattr(http_rapido, "_cliente", httpx.AsyncClient(transport=httpx.MockTransport(manejar)))
+    monkeypatch.setattr(http_rapido, "HTTP_RAPIDO", 1)
+    yield Servidor
+    asyncio.run(http_rapido.cerrar_cliente())
+
+
+def test_vtex_arma_los_productos_de_una_respuesta_sintetica(servidor):
+    servidor.responder = lambda request: httpx.Response(200, text=_fixture("farmaciauniversal_api_sintetico.json"))
+
+    productos = asyncio.run(http_rapido.buscar_vtex_http(ESPEC_FARMACIAUNIVERSAL, "paracetamol", 15, BASE_VTEX))
+
+    pedido = servidor.pedidos[0]
+    assert pedido.url.path == "/farmaciauniversal/api/catalog_system/pub/products/search"
+    assert dict(pedido.url.params) == {"ft": "paracetamol", "_from": "0", "_to": "14"}
+    assert [p["Producto"] for p in productos] == [
+        "Paracetamol 500mg Tableta x 100", "Panadol Antigripal x 12 Tabletas", "Paracetamol Jarabe 120mg/5ml Frasco 60ml",
+    ]
+    primero, segundo, tercero = productos
+    assert (primero["Precio_Oferta"], primero["Precio_Regular"]) == ("S/ 8.50", "S/ 10.00")
+    assert primero["Enlace"] == f"{BASE_VTEX}/paracetamol-500mg-tableta-x-100/p"
+    assert primero["Farmacia"] == "Farmacia Universal"
+    # Sin descuento no hay precio regular; sin precio ni imagen, "No disponible"
+    assert segundo["Precio_Regular"] == "No disponible"
+    assert (tercero["Precio_Oferta"], tercero["Imagen_URL"]) == ("No disponible", "No disponible")
+
+
+def test_vtex_pagina_de_a_50(servidor):
+    def responder(request):
+        desde, hasta = int(request.url.params["_from"]), int(request.url.params["_to"])
+        # El catálogo tiene 120 productos; la API rechaza rangos de más de 50
+        if hasta - desde + 1 > 50:
+            return httpx.Response(400, text="The maximum number of items per page is 50")
+        items = [
+            {"productName": f"Producto {i}", "linkText": f"producto-{i}",
+             "items": [{"sellers": [{"commertialOffer": {"Price": 1.0}}]}]}
+            for i in range(desde, min(hasta + 1, 120))
+        ]
+        return httpx.Response(200, json=items)
+
+    servidor.responder = responder
+    productos = asyncio.run(http_rapido.buscar_vtex_http(ESPEC_FARMACIAUNIVERSAL, "vitamina", 100, BASE_VTEX))
+    assert len(productos) == 100
+    assert productos[-1]["Producto"] == "Producto 99"
+    assert [(p.url.params["_from"], p.url.params["_to"]) for p in servidor.pedidos] == [("0", "49"), ("50", "99")]
+
+    servidor.pedidos.clear()
+    productos = asyncio.run(http_rapido.buscar_vtex_http(ESPEC_FARMACIAUNIVERSAL, "vitamina", 200, BASE_VTEX))
+    assert len(productos) == 120
+    # La tercera página vino incompleta: no se pide una cuarta
+    assert len(servidor.pedidos) == 3
+
+
+def test_magento_parsea_una_pagina_sintetica(servidor):
+    servidor.responder = lambda request: httpx.Response(200, text=_fixture("boticasperu_sintetico.html"))
+
+    productos = asyncio.run(http_rapido.buscar_magento_http(ESPEC_BOTICASPERU, "paracetamol", 5, BASE_MAGENTO))
+
+    pedido = servidor.pedidos[0]
+    assert pedido.url.path == "/boticasperu/catalogsearch/result/"
+    assert pedido.url.params["q"] == "paracetamol"
+    assert 0 < len(productos) <= 5
+    assert all(p["Farmacia"] == "BoticasPeru" and p["Precio_Oferta"].startswith("S/ ") for p in productos)
+
+
+@pytest.mark.parametrize("respuesta", [
+    httpx.Response(200, json=[]),
+    httpx.Response(503, text="Service Unavailable"),
+    httpx.Response(200, text="<html>no es JSON</html>"),
+    httpx.Response(200, json={"error": "formato inesperado"}),
+], ids=["vacia", "503", "no_json", "no_lista"])
+def test_respaldo_con_playwright(servidor, respuesta):
+    servidor.responder = lambda request: respuesta
+    llamadas = []
+
+    async def playwright(keyword, max_items):
+        llamadas.append((keyword, max_items))
+        return [{"Producto": "desde Playwright"}]
+
+    fetcher = lambda keyword, max_items: http_rapido.buscar_vtex_http(ESPEC_FARMACIAUNIVERSAL, keyword, max_items, BASE_VTEX)
+    buscar = http_rapido.con_respaldo_http(fetcher, playwright, "Farmacia Universal")
+
+    assert asyncio.run(buscar("paracetamol", 10)) == [{"Producto": "desde Playwright"}]
+    assert llamadas == [("paracetamol", 10)]
+
+
+def test_sin_respaldo_si_http_trae_productos(servidor):
+    servidor.responder = lambda request: httpx.Response(200, text=_fixture("farmaciauniversal_api_sintetico.json"))
+
+    async def playwright(keyword, max_items):
+        raise AssertionError("no debería abrir el navegador")
+
+    fetcher = lambda keyword, max_items: http_rapido.buscar_vtex_http(ESPEC_FARMACIAUNIVERSAL, keyword, max_items, BASE_VTEX)
+    buscar = http_rapido.con_respaldo_http(fetcher, playwright, "Farmacia Universal")
+    assert len(asyncio.run(buscar("paracetamol", 10))) == 3
+
+
+def test_con_http_rapido_apagado_va_directo_a_playwright(servidor, monkeypatch):
+    monkeypatch.setattr(http_rapido, "HTTP_RAPIDO", 0)
+
+    async def playwright(keyword, max_items):
+        return []
+
+    buscar = http_rapido.con_respaldo_http(lambda k, m: None, playwright, "Farmacia Universal")
+    assert asyncio.run(buscar("paracetamol", 10)) == []
+    assert servidor.pedidos == []
@@ -0,0 +1,104 @@
+import asyncio
+import time
+
+from scrapers.cache import CacheResultados
+from scrapers.indice import FUENTE_INDICE, IndicePrecios
+from scrapers.planificador import ESTADO_ERROR, ESTADO_OK, ResultadoSitio
+
+
+def _resultado(farmacia: str, productos: int, estado: str = ESTADO_OK) -> ResultadoSitio:
+    return ResultadoSitio(farmacia, estado, [{"Producto": f"Paracetamol {i}", "Enlace": f"/{farmacia}/{i}"}
+                                             for i in range(productos)])
+
+
+def _indice(tmp_path, fresco_s: float = 1800, ttl_por_farmacia: dict = None) -> IndicePrecios:
+    cache = CacheResultados(ttl_s=600, ttl_por_farmacia=ttl_por_farmacia or {})
+    return IndicePrecios(str(tmp_path / "indice.db"), fresco_s=fresco_s, cache=cache)
+
+
+def test_responde_desde_el_indice_si_todas_las_farmacias_estan_frescas(tmp_path):
+    indice = _indice(tmp_path)
+
+    async def probar():
+        await indice.guardar("Paracetamol", 5, [_resultado("A", 3), _resultado("B", 2)])
+        resultados = await indice.buscar("PARACETAMOL ", 5, ["A", "B"])
+        assert [(r.farmacia, len(r.productos), r.fuente) for r in resultados] == [
+            ("A", 3, FUENTE_INDICE), ("B", 2, FUENTE_INDICE)]
+        assert await indice.buscar("paracetamol", 5, ["A", "B", "C"]) is None
+        # Se guardaron 5 y se llenó el cupo: con 10 puede haber más
+        await indice.guardar("ibuprofeno", 5, [_resultado("A", 5)])
+        assert await indice.buscar("ibuprofeno", 10, ["A"]) is None
+        assert len((await indice.buscar("ibuprofeno", 3, ["A"]))[0].productos) == 3
+
+    asyncio.run(probar())
+    indice.cerrar()
+
+
+def test_solo_guarda_resultados_en_vivo_que_respondieron(tmp_path):
+    indice = _indice(tmp_path)
+
+    async def probar():
+        await indice.guardar("paracetamol", 5, [_resultado("A", 2), _resultado("B", 0, ESTADO_ERROR)])
+        assert await indice.buscar("paracetamol", 5, ["A"]) is not None
+        assert await indice.buscar("paracetamol", 5, ["B"]) is None
+
+    asyncio.run(probar())
+    indice.cerrar()
+
+
+def test_frescura_limitada_por_el_ttl_de_la_cache(tmp_path, monkeypatch):
+    indice = _indice(tmp_path, fresco_s=1800, ttl_por_farmacia={"A": 300})
+    assert indice.fresco("A") == 300
+    assert indice.fresco("B") == 600
+
+    async def probar():
+        await indice.guardar("paracetamol", 5, [_resultado("A", 1), _resultado("B", 1)])
+        ahora = time.time()
+        monkeypatch.setattr(time, "time", lambda: ahora + 400)
+        assert await indice.buscar("paracetamol", 5, ["B"]) is not None
+        assert await indice.buscar("paracetamol", 5, ["A"]) is None
+
+    asyncio.run(probar())
+    indice.cerrar()
+
+
+def test_indice_inactivo_sin_ruta():
+    indice = IndicePrecios("")
+    assert not indice.activo
+    assert asyncio.run(indice.buscar("paracetamol", 5, ["A"])) is None
+    indice.registrar_consulta("paracetamol")
+    assert indice.estadisticas()["consultas_sin_volcar"] == 0
+
+
+def test_contador_de_consultas_acotado(tmp_path):
+    indice = IndicePrecios(str(tmp_path / "indice.db"), max_consultas=2)
+    for keyword in ("paracetamol", "Paracetamol ", "ibuprofeno", "aspirina", "naproxeno"):
+        indice.registrar_consulta(keyword)
+    assert indice.estadisticas()["consultas_sin_volcar"] == 3
+    assert indice.consultas_descartadas == 2
+
+    asyncio.run(indice.volcar_consultas())
+    indice.registrar_consulta("aspirina")
+    assert indice.estadisticas()["consultas_sin_volcar"] == 1
+    assert asyncio.run(indice.populares(5)) == ["paracetamol", "ibuprofeno"]
+    indice.cerrar()
+
+
+def test_guardar_vuelca_las_consultas_cada_volcar_s(tmp_path, monkeypatch):
+    reloj = [1000.0]
+    monkeypatch.setattr(time, "monotonic", lambda: reloj[0])
+    indice = IndicePrecios(str(tmp_path / "indice.db"), volcar_s=60)
+
+    async def probar():
+        indice.registrar_consulta("paracetamol")
+        await indice.guardar("paracetamol", 5, [_resultado("A", 1)])
+        assert indice.estadisticas()["consultas_sin_volcar"] == 1
+
+        reloj[0] += 60
+        # Aunque todo venga de la caché (nada que guardar), se vuelca
+        await indice.guardar("paracetamol", 5, [])
+        assert indice.estadisticas()["consultas_sin_volcar"] == 0
+        assert await indice.populares(5) == ["paracetamol"]
+
+    asyncio.run(probar())
+    indice.cerrar()
@@ -0,0 +1,87 @@
+import pytest
+
+from scrapers.farmacia_scrapers import SITIOS
+from scrapers.modelo import (
+    CAMPO_DESCUENTO,
+    ORDEN_DESCUENTO,
+    ORDEN_PRECIO,
+    ORDEN_PRECIO_DESC,
+    Farmacia,
+    a_centimos,
+    descuento_pct,
+    ordenar_y_filtrar,
+)
+from scrapers.parsers import ESPECS
+
+
+def _producto(nombre, oferta, regular="No disponible", farmacia="Inkafarma") -> dict:
+    return {"Producto": nombre, "Precio_Oferta": oferta, "Precio_Regular": regular, "Farmacia": farmacia}
+
+
+def _productos() -> list:
+    return [
+        _producto("a", "S/ 12.30", "S/ 15.00"),
+        _producto("b", "No disponible", farmacia="Mifarma"),
+        _producto("c", "S/ 1,250.00", "S/ 1,250.00", farmacia="Mifarma"),
+        _producto("d", "S/ 4.50", "S/ 9.00", farmacia="BoticasPeru"),
+        _producto("e", "S/ 0.99"),
+    ]
+
+
+def _nombres(productos) -> list:
+    return [p["Producto"] for p in productos]
+
+
+def test_a_centimos():
+    assert a_centimos("S/ 12.30") == 1230
+    assert a_centimos("S/ 1,250.5") == 125050
+    assert a_centimos(4.1) == 410
+    assert a_centimos("No disponible") is None
+    assert a_centimos(None) is None
+
+
+def test_descuento_pct():
+    assert descuento_pct(450, 900) == 50
+    assert descuento_pct(1000, 900) == 0
+    assert descuento_pct(None, 900) is None
+
+
+def test_ordenes_dejan_sin_dato_al_final():
+    productos = _productos()
+    assert _nombres(ordenar_y_filtrar(productos, ORDEN_PRECIO)) == ["e", "d", "a", "c", "b"]
+    assert _nombres(ordenar_y_filtrar(productos, ORDEN_PRECIO_DESC)) == ["c", "a", "d", "e", "b"]
+    ordenados = ordenar_y_filtrar(productos, ORDEN_DESCUENTO)
+    assert _nombres(ordenados) == ["d", "a", "c", "b", "e"]
+    assert [p[CAMPO_DESCUENTO] for p in ordenados] == [50, 18, 0, None, None]
+
+
+def test_top_con_heap_igual_a_ordenar_y_cortar():
+    productos = _productos()
+    for orden in (ORDEN_PRECIO, ORDEN_PRECIO_DESC, ORDEN_DESCUENTO):
+        assert ordenar_y_filtrar(productos, orden, top=2) == ordenar_y_filtrar(productos, orden)[:2]
+    assert _nombres(ordenar_y_filtrar(productos, top=2)) == ["a", "b"]
+
+
+def test_filtros_de_rango_y_farmacia():
+    productos = _productos()
+    assert _nombres(ordenar_y_filtrar(productos, precio_min_centimos=400, precio_max_centimos=1230)) == ["a", "d"]
+    assert _nombres(ordenar_y_filtrar(productos, precio_max_centimos=100)) == ["e"]
+    assert _nombres(ordenar_y_filtrar(productos, farmacias=["Mifarma", "BoticasPeru"])) == ["b", "c", "d"]
+
+
+def test_no_reordena_la_lista_original():
+    productos = _productos()
+    ordenar_y_filtrar(productos, ORDEN_PRECIO, top=1)
+    assert _nombres(productos) == ["a", "b", "c", "d", "e"]
+
+
+def test_orden_desconocido():
+    with pytest.raises(ValueError):
+        ordenar_y_filtrar(_productos(), "nombre")
+
+
+def test_farmacias_salen_del_registro_de_especs():
+    assert [f.value for f in Farmacia] == list(ESPECS) == list(SITIOS)
+    assert Farmacia("Boticas y Salud") is Farmacia.BOTICASYSALUD
+    productos = _productos()
+    assert _nombres(ordenar_y_filtrar(productos, farmacias=[Farmacia.BOTICASPERU])) == ["d"]
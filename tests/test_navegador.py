@@ -0,0 +1,136 @@
+import asyncio
+
+from scrapers.navegador import PoolNavegadores, _Navegador, _SesionSitio
+
+
+class _Browser:
+    def on(self, evento, callback):
+        pass
+
+    def is_connected(self) -> bool:
+        return True
+
+    async def close(self):
+        pass
+
+
+class _Page:
+    def is_closed(self) -> bool:
+        return False
+
+
+class _Context:
+    def __init__(self, page):
+        self.pages = [page]
+        self.cerrado = False
+
+    async def close(self):
+        self.cerrado = True
+
+
+def _pool_con_sesion(farmacia: str = "Inkafarma"):
+    pool = PoolNavegadores(sesiones_calientes=True, sesion_usos_max=10, sesion_vida_s=600)
+    pool._playwright = object()  # iniciado, sin lanzar Chromium
+    page = _Page()
+    sesion = _SesionSitio(_Navegador(_Browser()), _Context(page), page)
+    pool._sesiones[farmacia] = sesion
+    return pool, sesion
+
+
+def test_la_sesion_caliente_se_reutiliza():
+    pool, sesion = _pool_con_sesion()
+
+    async def probar():
+        for _ in range(2):
+            async with pool.pagina("Inkafarma") as page:
+                assert page is sesion.page
+
+    asyncio.run(probar())
+    assert pool._sesiones["Inkafarma"] is sesion
+    assert sesion.usos == 2 and not sesion.context.cerrado
+
+
+def test_descartar_durante_el_prestamo_la_cierra_al_soltarla():
+    pool, sesion = _pool_con_sesion()
+
+    async def probar():
+        async with pool.pagina("Inkafarma") as page:
+            await pool.descartar_sesion(page, "búsqueda vacía")
+            assert not sesion.context.cerrado
+        assert "Inkafarma" not in pool._sesiones
+        assert sesion.context.cerrado
+        assert sesion.navegador.activos == 0
+
+    asyncio.run(probar())
+
+
+def test_descartar_una_sesion_libre_la_cierra_enseguida():
+    pool, sesion = _pool_con_sesion()
+    asyncio.run(pool.descartar_sesion(sesion.page))
+    assert "Inkafarma" not in pool._sesiones
+    assert sesion.context.cerrado
+
+
+def test_descartar_una_pagina_ajena_no_hace_nada():
+    pool, sesion = _pool_con_sesion()
+    asyncio.run(pool.descartar_sesion(_Page()))
+    assert pool._sesiones["Inkafarma"] is sesion
+    assert not sesion.context.cerrado
+
+
+class _PaginaBusqueda(_Page):
+    def __init__(self):
+        self.contenidos = 0
+
+    async def goto(self, url, wait_until=None, timeout=None):
+        pass
+
+    async def content(self) -> str:
+        self.contenidos += 1
+        return "<html></html>"
+
+
+def _scraper_con_sesion(monkeypatch, tarjetas: int, productos):
+    """Pool global con una sesión caliente y la espera / extracción reemplazadas."""
+    from scrapers import farmacia_scrapers, navegador
+    from scrapers.parsers import ESPEC_INKAFARMA
+
+    pool, sesion = _pool_con_sesion()
+    page = sesion.page = _PaginaBusqueda()
+    sesion.context.pages = [page]
+    monkeypatch.setattr(navegador, "_pool", pool)
+    ocupada_al_descartar = []
+
+    async def esperar(*args, **kwargs):
+        return tarjetas
+
+    async def extraer(*args, **kwargs):
+        return productos
+
+    async def desafio(page):
+        ocupada_al_descartar.append(sesion.ocupada)
+        return False
+
+    monkeypatch.setattr(farmacia_scrapers, "esperar_productos", esperar)
+    monkeypatch.setattr(farmacia_scrapers, "extraer_en_navegador", extraer)
+    monkeypatch.setattr(farmacia_scrapers, "es_desafio", desafio)
+    scrapear = lambda: farmacia_scrapers.scrape_sitio_playwright(ESPEC_INKAFARMA, "paracetamol", 5)
+    return pool, sesion, scrapear, ocupada_al_descartar
+
+
+def test_grilla_que_no_carga_descarta_la_sesion_mientras_esta_prestada(monkeypatch):
+    pool, sesion, scrapear, ocupada_al_descartar = _scraper_con_sesion(monkeypatch, tarjetas=0, productos=[])
+    assert asyncio.run(scrapear()) == []
+    assert ocupada_al_descartar == [True]
+    assert "Inkafarma" not in pool._sesiones
+    assert sesion.context.cerrado
+
+
+def test_busqueda_sin_resultados_conserva_la_sesion(monkeypatch):
+    pool, sesion, scrapear, ocupada_al_descartar = _scraper_con_sesion(monkeypatch, tarjetas=3, productos=[])
+    assert asyncio.run(scrapear()) == []
+    assert ocupada_al_descartar == []
+    assert pool._sesiones["Inkafarma"] is sesion
+    assert not sesion.context.cerrado
+    # El extractor JS corrió y no encontró nada: no se repite con BS4
+    assert sesion.page.contenidos == 0
@@ -0,0 +1,288 @@
+import asyncio
+import time
+from contextlib import aclosing
+
+import pytest
+
+from scrapers import farmacia_scrapers, planificador
+from scrapers.cache import cache_resultados
+from scrapers.indice import indice_precios
+from scrapers.modelo import CAMPO_OFERTA_CENTIMOS
+from scrapers.planificador import (
+    ESTADO_ERROR,
+    ESTADO_OK,
+    ESTADO_TIMEOUT,
+    ESTADO_VACIO,
+    LimitadorSitios,
+    concurrencia_efectiva,
+    ejecutar_lote,
+    ejecutar_sitios,
+)
+from scrapers.salud import salud_farmacias
+
+
+def _scraper(farmacia: str, demora_s: float, registro: dict = None):
+    """Scraper falso que tarda `demora_s` y anota en `registro` si llegó a terminar o lo cancelaron."""
+    async def scrapear(keyword, max_items):
+        try:
+            await asyncio.sleep(demora_s)
+        except asyncio.CancelledError:
+            if registro is not None:
+                registro[farmacia] = "cancelado"
+            raise
+        if registro is not None:
+            registro[farmacia] = "terminado"
+        return [{"Producto": f"{keyword} {farmacia}", "Farmacia": farmacia, "Precio_Oferta": "S/ 1.00"}]
+    return scrapear
+
+
+async def _todos(generador) -> list:
+    return [r async for r in generador]
+
+
+@pytest.fixture(autouse=True)
+def aislar_estado(monkeypatch):
+    """Sin índice ni caché compartida, y sin circuitos abiertos por los timeouts de otra prueba."""
+    monkeypatch.setattr(indice_precios, "ruta", "")
+    cache_resultados.limpiar()
+    salud_farmacias.reiniciar()
+    yield
+    cache_resultados.limpiar()
+    salud_farmacias.reiniciar()
+
+
+# ---------- presupuesto (deadline_ms) ----------
+
+def test_deadline_devuelve_lo_que_alcanzo_a_terminar(monkeypatch):
+    registro = {}
+    monkeypatch.setattr(farmacia_scrapers, "SITIOS", {
+        "Rapida": _scraper("Rapida", 0.02, registro),
+        "Lenta": _scraper("Lenta", 2.0, registro),
+    })
+
+    async def probar():
+        inicio = time.monotonic()
+        respuesta = await farmacia_scrapers.comparar_precios_detallado("paracetamol", 5, usar_cache=False, deadline_ms=200)
+        return respuesta, time.monotonic() - inicio
+
+    respuesta, transcurrido = asyncio.run(probar())
+
+    assert transcurrido < 0.5
+    assert [p["Farmacia"] for p in respuesta["productos"]] == ["Rapida"]
+    sitios = {s["farmacia"]: s for s in respuesta["sitios"]}
+    assert sitios["Rapida"]["estado"] == ESTADO_OK
+    assert sitios["Lenta"]["estado"] == ESTADO_TIMEOUT
+    assert sitios["Lenta"]["productos"] == 0
+    assert 0.2 <= sitios["Lenta"]["tiempo_s"] < 0.5
+    # El scraper lento no siguió corriendo después de responder
+    assert registro == {"Rapida": "terminado", "Lenta": "cancelado"}
+
+
+def test_sin_deadline_espera_a_todos(monkeypatch):
+    monkeypatch.setattr(farmacia_scrapers, "SITIOS", {"Rapida": _scraper("Rapida", 0.02), "Lenta": _scraper("Lenta", 0.3)})
+
+    respuesta = asyncio.run(farmacia_scrapers.comparar_precios_detallado("paracetamol", 5, usar_cache=False, deadline_ms=0))
+
+    assert [s["estado"] for s in respuesta["sitios"]] == [ESTADO_OK, ESTADO_OK]
+    assert len(respuesta["productos"]) == 2
+
+
+def test_deadline_es_un_presupuesto_total_no_por_sitio():
+    # Con un sitio a la vez, los que esperan turno también gastan el presupuesto:
+    # A termina a los 0.15s, B terminaría a los 0.30s y C a los 0.45s.
+    registro = {}
+    sitios = {f: _scraper(f, 0.15, registro) for f in ("A", "B", "C")}
+
+    async def probar():
+        inicio = time.monotonic()
+        resultados = await _todos(ejecutar_sitios(sitios, "ibuprofeno", 5, concurrencia=1, deadline_s=0.25))
+        return resultados, time.monotonic() - inicio
+
+    resultados, transcurrido = asyncio.run(probar())
+
+    assert transcurrido < 0.35
+    assert {r.farmacia: r.estado for r in resultados} == {"A": ESTADO_OK, "B": ESTADO_TIMEOUT, "C": ESTADO_TIMEOUT}
+    assert [r.farmacia for r in resultados][0] == "A"
+    assert registro == {"A": "terminado", "B": "cancelado"}
+
+
+def test_deadline_cuenta_desde_inicio():
+    # La petición llegó hace 0.2s (p. ej. esperando turno): solo le quedan 0.1s
+    sitios = {"A": _scraper("A", 0.15)}
+
+    async def probar():
+        inicio = time.monotonic()
+        resultados = await _todos(ejecutar_sitios(sitios, "ibuprofeno", 5, deadline_s=0.3, inicio=inicio - 0.2))
+        return resultados, time.monotonic() - inicio
+
+    (resultado,), transcurrido = asyncio.run(probar())
+
+    assert resultado.estado == ESTADO_TIMEOUT
+    assert transcurrido < 0.15
+    assert resultado.tiempo_s >= 0.3
+
+
+# ---------- ejecutar_sitios ----------
+
+def test_un_sitio_que_falla_no_afecta_a_los_demas():
+    async def roto(keyword, max_items):
+        raise RuntimeError("selector no encontrado")
+
+    async def vacio(keyword, max_items):
+        return []
+
+    sitios = {
+        "Bien": _scraper("Bien", 0.01),
+        "Rota": roto,
+        "Vacia": vacio,
+        "Colgada": _scraper("Colgada", 2.0),
+    }
+
+    resultados = asyncio.run(_todos(ejecutar_sitios(sitios, "paracetamol", 5, concurrencia=4, timeout_s=0.1)))
+
+    por_sitio = {r.farmacia: r for r in resultados}
+    assert {f: r.estado for f, r in por_sitio.items()} == {
+        "Bien": ESTADO_OK, "Rota": ESTADO_ERROR, "Vacia": ESTADO_VACIO, "Colgada": ESTADO_TIMEOUT,
+    }
+    assert por_sitio["Rota"].error == "selector no encontrado"
+    assert por_sitio["Colgada"].error == "Sin respuesta en 0.1s"
+    assert [p["Producto"] for p in por_sitio["Bien"].productos] == ["paracetamol Bien"]
+    # Los precios se normalizan a céntimos al salir del planificador
+    assert por_sitio["Bien"].productos[0][CAMPO_OFERTA_CENTIMOS] == 100
+    assert all(r.productos == [] for f, r in por_sitio.items() if f != "Bien")
+
+
+def test_resultados_en_orden_de_llegada():
+    sitios = {"Lenta": _scraper("Lenta", 0.1), "Media": _scraper("Media", 0.05), "Rapida": _scraper("Rapida", 0.0)}
+
+    resultados = asyncio.run(_todos(ejecutar_sitios(sitios, "paracetamol", 5, concurrencia=3)))
+
+    assert [r.farmacia for r in resultados] == ["Rapida", "Media", "Lenta"]
+
+
+def _medir_concurrencia(sitios_n: int, **kwargs) -> int:
+    """Máximo de scrapers corriendo a la vez en ejecutar_sitios."""
+    corriendo = {"ahora": 0, "maximo": 0}
+
+    async def scraper(keyword, max_items):
+        corriendo["ahora"] += 1
+        corriendo["maximo"] = max(corriendo["maximo"], corriendo["ahora"])
+        await asyncio.sleep(0.02)
+        corriendo["ahora"] -= 1
+        return []
+
+    sitios = {f"S{i}": scraper for i in range(sitios_n)}
+    resultados = asyncio.run(_todos(ejecutar_sitios(sitios, "paracetamol", 5, **kwargs)))
+    assert len(resultados) == sitios_n
+    return corriendo["maximo"]
+
+
+def test_concurrencia_efectiva():
+    assert concurrencia_efectiva(5, memoria_mb=0) == 5
+    assert concurrencia_efectiva(5, memoria_mb=1000, mb_por_sitio=300) == 3
+    assert concurrencia_efectiva(2, memoria_mb=1000, mb_por_sitio=300) == 2
+    # Nunca menos de uno, aunque la RAM no alcance para un sitio
+    assert concurrencia_efectiva(5, memoria_mb=100, mb_por_sitio=300) == 1
+    assert concurrencia_efectiva(0) == 1
+
+
+def test_concurrencia_respeta_el_limite(monkeypatch):
+    assert _medir_concurrencia(6, concurrencia=2) == 2
+    assert _medir_concurrencia(3, concurrencia=10) == 3
+
+    # Sin `concurrencia` explícita manda concurrencia_efectiva() (p. ej. el presupuesto de RAM)
+    monkeypatch.setattr(planificador, "concurrencia_efectiva", lambda: concurrencia_efectiva(5, 1000, 400))
+    assert _medir_concurrencia(6) == 2
+
+
+# ---------- lotes: LimitadorSitios y ejecutar_lote ----------
+
+def _arranques(limitador, farmacias: list, duracion_s: float = 0.0) -> dict:
+    """Toma un turno por cada farmacia de la lista (todas a la vez) y devuelve los arranques y el máximo en paralelo."""
+    registro = {"arranques": [], "ahora": 0, "maximo": 0}
+
+    async def usar(farmacia):
+        async with limitador.turno(farmacia):
+            registro["arranques"].append((farmacia, time.monotonic()))
+            registro["ahora"] += 1
+            registro["maximo"] = max(registro["maximo"], registro["ahora"])
+            await asyncio.sleep(duracion_s)
+            registro["ahora"] -= 1
+
+    async def probar():
+        await asyncio.gather(*(usar(f) for f in farmacias))
+
+    asyncio.run(probar())
+    return registro
+
+
+def test_limitador_separa_los_arranques_contra_un_sitio():
+    limitador = LimitadorSitios(concurrencia=10, por_sitio=1, intervalo_s=0.1)
+    registro = _arranques(limitador, ["A", "A", "A", "B"])
+
+    arranques_a = [t for f, t in registro["arranques"] if f == "A"]
+    assert len(arranques_a) == 3
+    assert all(b - a >= 0.09 for a, b in zip(arranques_a, arranques_a[1:]))
+    # Otro sitio no espera el intervalo de A
+    (arranque_b,) = [t for f, t in registro["arranques"] if f == "B"]
+    assert arranque_b - arranques_a[0] < 0.05
+
+
+def test_limitador_por_sitio_y_global():
+    # Dos a la vez por farmacia...
+    limitador = LimitadorSitios(concurrencia=10, por_sitio=2, intervalo_s=0)
+    assert _arranques(limitador, ["A"] * 5, duracion_s=0.03)["maximo"] == 2
+
+    # ...y como mucho tres en total, aunque sean farmacias distintas
+    limitador = LimitadorSitios(concurrencia=3, por_sitio=2, intervalo_s=0)
+    assert _arranques(limitador, ["A", "B", "C", "D", "E", "F"], duracion_s=0.03)["maximo"] == 3
+
+
+def test_lote_ventana_y_orden_de_llegada():
+    demoras = {"k1": 0.15, "k2": 0.05, "k3": 0.0, "k4": 0.0}
+    arranques = {}
+    inicio = time.monotonic()
+
+    async def scraper(keyword, max_items):
+        arranques.setdefault(keyword, time.monotonic() - inicio)
+        await asyncio.sleep(demoras[keyword])
+        return [{"Producto": keyword, "Precio_Oferta": "S/ 1.00"}]
+
+    async def probar():
+        limitador = LimitadorSitios(concurrencia=10, por_sitio=10, intervalo_s=0)
+        lote = ejecutar_lote({"A": scraper, "B": scraper}, list(demoras), 5, limitador, ventana=2)
+        return [(keyword, resultados) async for keyword, resultados in lote]
+
+    entregados = asyncio.run(probar())
+
+    # Se entrega cada keyword apenas terminan todas sus farmacias, no en el orden pedido
+    assert [keyword for keyword, _ in entregados] == ["k2", "k3", "k4", "k1"]
+    assert all([r.farmacia for r in resultados] == ["A", "B"] for _, resultados in entregados)
+    assert all(r.estado == ESTADO_OK for _, resultados in entregados for r in resultados)
+    # Con ventana 2, k3 arranca recién cuando termina k2 (no al principio)
+    assert arranques["k1"] < 0.03 and arranques["k2"] < 0.03
+    assert arranques["k3"] >= 0.045
+
+
+def test_lote_cancela_lo_pendiente_al_dejar_de_iterar():
+    estados = {}
+
+    async def scraper(keyword, max_items):
+        try:
+            await asyncio.sleep(0.0 if keyword == "rapido" else 1.0)
+        except asyncio.CancelledError:
+            estados[keyword] = "cancelado"
+            raise
+        return []
+
+    async def probar():
+        limitador = LimitadorSitios(concurrencia=10, por_sitio=10, intervalo_s=0)
+        lote = ejecutar_lote({"A": scraper}, ["rapido", "lento"], 5, limitador, ventana=2)
+        async with aclosing(lote):
+            keyword, _ = await lote.__anext__()
+        return keyword
+
+    inicio = time.monotonic()
+    assert asyncio.run(probar()) == "rapido"
+    assert time.monotonic() - inicio < 0.5
+    assert estados == {"lento": "cancelado"}
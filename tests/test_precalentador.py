@@ -0,0 +1,58 @@
+import asyncio
+
+from scrapers.admision import ControlAdmision
+from scrapers.precalentador import Precalentador
+
+
+class _IndiceFalso:
+    activo = True
+    fresco_s = 600
+
+    def fresco(self, farmacia):
+        return self.fresco_s
+
+    async def volcar_consultas(self):
+        pass
+
+    async def populares(self, limite, min_consultas):
+        return []
+
+    async def edad(self, keyword, farmacias):
+        return None
+
+
+def test_cada_keyword_ocupa_un_turno():
+    async def probar():
+        control = ControlAdmision(max_busquedas=1, max_cola=0, espera_s=1)
+        en_curso = []
+
+        async def buscar(keyword, max_items):
+            en_curso.append(control.en_curso)
+
+        precalentador = Precalentador(buscar, ["A"], indice=_IndiceFalso(), control=control,
+                                      keywords=["paracetamol", "ibuprofeno"])
+        await precalentador.ciclo()
+        assert en_curso == [1, 1]
+        assert control.admitidas == 2
+        assert precalentador.refrescados == 2
+
+    asyncio.run(probar())
+
+
+def test_sin_turno_deja_el_resto_para_el_siguiente_ciclo():
+    async def probar():
+        control = ControlAdmision(max_busquedas=1, max_cola=0, espera_s=1)
+        buscados = []
+
+        async def buscar(keyword, max_items):
+            buscados.append(keyword)
+
+        precalentador = Precalentador(buscar, ["A"], indice=_IndiceFalso(), control=control,
+                                      keywords=["paracetamol", "ibuprofeno"])
+        async with control.admitir():  # una búsqueda de usuario ocupa el único turno
+            await precalentador.ciclo()
+        assert buscados == []
+        assert precalentador.refrescados == 0
+        assert sum(control.rechazos.values()) == 0
+
+    asyncio.run(probar())
@@ -0,0 +1,141 @@
+import asyncio
+
+from scrapers.recursos import CacheScripts, FiltroRecursos, tiene_hash
+
+SCRIPT_CON_HASH = "https://inkafarma.pe/main.3f9a1c2b7d.js"
+SCRIPT_SIN_HASH = "https://inkafarma.pe/config.js"
+
+
+class _Frame:
+    parent_frame = None
+
+
+class _Request:
+    def __init__(self, url: str, resource_type: str):
+        self.url = url
+        self.resource_type = resource_type
+        self.method = "GET"
+        self.frame = _Frame()
+
+    def is_navigation_request(self) -> bool:
+        return self.resource_type == "document"
+
+
+class _Respuesta:
+    status = 200
+    headers = {
+        "cache-control": "public, max-age=31536000",
+        "content-type": "text/javascript",
+        "access-control-allow-origin": "*",
+        "set-cookie": "sesion=1",
+    }
+
+    async def body(self) -> bytes:
+        return b"console.log(1)"
+
+
+class _Route:
+    def __init__(self, url: str, resource_type: str = "script", falla_fetch: bool = False, falla_continue: bool = False):
+        self.request = _Request(url, resource_type)
+        self.falla_fetch = falla_fetch
+        self.falla_continue = falla_continue
+        self.acciones = []
+        self.cumplido = None
+
+    async def abort(self):
+        self.acciones.append("abort")
+
+    async def continue_(self):
+        self.acciones.append("continue")
+        if self.falla_continue:
+            raise RuntimeError("Target page, context or browser has been closed")
+
+    async def fetch(self):
+        self.acciones.append("fetch")
+        if self.falla_fetch:
+            raise TimeoutError("Timeout 30000ms exceeded")
+        return _Respuesta()
+
+    async def fulfill(self, **kwargs):
+        self.acciones.append("fulfill-disco" if "path" in kwargs else "fulfill")
+        self.cumplido = kwargs
+
+
+def _filtro(tmp_path, sitio: str = "https://inkafarma.pe/buscador?keyword=x") -> FiltroRecursos:
+    filtro = FiltroRecursos(CacheScripts(str(tmp_path), max_bytes=1024 * 1024))
+    asyncio.run(filtro(_Route(sitio, "document")))
+    return filtro
+
+
+def test_tiene_hash():
+    assert tiene_hash(SCRIPT_CON_HASH)
+    assert tiene_hash("https://x.pe/chunk-5d1e0f9a7b.js?v=1")
+    assert not tiene_hash(SCRIPT_SIN_HASH)
+    assert not tiene_hash("https://x.pe/app.js?v=3f9a1c2b7d")
+
+
+def test_script_con_hash_se_guarda_y_luego_se_sirve_desde_disco(tmp_path):
+    filtro = _filtro(tmp_path)
+    assert filtro.farmacia == "Inkafarma"
+    primera, segunda = _Route(SCRIPT_CON_HASH), _Route(SCRIPT_CON_HASH)
+    asyncio.run(filtro(primera))
+    asyncio.run(filtro(segunda))
+    assert primera.acciones == ["fetch", "fulfill"]
+    assert segunda.acciones == ["fulfill-disco"]
+
+
+def test_script_sin_hash_pasa_sin_interceptar(tmp_path):
+    filtro = _filtro(tmp_path)
+    route = _Route(SCRIPT_SIN_HASH)
+    asyncio.run(filtro(route))
+    assert route.acciones == ["continue"]
+    assert filtro.cache.estadisticas()["guardados"] == 0
+
+
+def test_fallo_al_descargar_deja_pasar_la_peticion(tmp_path):
+    filtro = _filtro(tmp_path)
+    route = _Route(SCRIPT_CON_HASH, falla_fetch=True)
+    asyncio.run(filtro(route))
+    assert route.acciones == ["fetch", "continue"]
+
+
+def test_fallo_al_dejar_pasar_no_rompe_el_manejador(tmp_path):
+    # Página cerrada entre medio: continue_() también falla y no debe propagarse
+    filtro = _filtro(tmp_path)
+    route = _Route(SCRIPT_CON_HASH, falla_fetch=True, falla_continue=True)
+    asyncio.run(filtro(route))
+    assert route.acciones == ["fetch", "continue"]
+
+
+def test_desde_disco_repite_las_cabeceras_cors(tmp_path):
+    # Script de un CDN de otro host cargado con <script crossorigin>
+    filtro = _filtro(tmp_path, "https://www.farmaciauniversal.com/paracetamol?_q=paracetamol")
+    assert filtro.farmacia == "Farmacia Universal"
+    url = "https://farmaciauniversal.vtexassets.com/_v/public/assets/v1/bundle/js/app.0a1b2c3d4e.js"
+    asyncio.run(filtro(_Route(url)))
+
+    # Otra instancia sobre el mismo directorio (p. ej. tras reiniciar) recupera las cabeceras
+    for cache in (filtro.cache, CacheScripts(str(tmp_path), max_bytes=1024 * 1024)):
+        route = _Route(url)
+        asyncio.run(FiltroRecursos(cache)._script(route, url))
+        assert route.acciones == ["fulfill-disco"]
+        assert route.cumplido["headers"] == {"content-type": "text/javascript", "access-control-allow-origin": "*"}
+
+
+def test_script_sin_cabeceras_guardadas_se_descarga_de_nuevo(tmp_path):
+    # Archivo de una versión anterior de la caché, sin su .json
+    (tmp_path / CacheScripts.nombre(SCRIPT_CON_HASH)).write_bytes(b"console.log(0)")
+    filtro = _filtro(tmp_path)
+    route = _Route(SCRIPT_CON_HASH)
+    asyncio.run(filtro(route))
+    assert route.acciones == ["fetch", "fulfill"]
+    assert filtro.cache.estadisticas()["guardados"] == 1
+
+
+def test_bloquea_imagenes_y_analitica(tmp_path):
+    filtro = _filtro(tmp_path)
+    imagen = _Route("https://inkafarma.pe/logo.png", "image")
+    gtm = _Route("https://www.googletagmanager.com/gtm.js?id=1")
+    asyncio.run(filtro(imagen))
+    asyncio.run(filtro(gtm))
+    assert imagen.acciones == gtm.acciones == ["abort"]
@@ -0,0 +1,107 @@
+import time
+
+from scrapers.salud import ABIERTO, CERRADO, SEMIABIERTO, RegistroSalud
+
+
+class _Reloj:
+    """Reemplazo de time.monotonic que avanza a mano."""
+
+    def __init__(self):
+        self.ahora = 1000.0
+
+    def __call__(self) -> float:
+        return self.ahora
+
+
+def _registro(monkeypatch, **kwargs) -> tuple:
+    reloj = _Reloj()
+    monkeypatch.setattr(time, "monotonic", reloj)
+    opciones = {"fallos": 3, "abierto_s": 30, "ventana": 10}
+    opciones.update(kwargs)
+    return RegistroSalud(**opciones), reloj
+
+
+def _estado(registro, farmacia="A") -> str:
+    return registro.estado()[farmacia]["estado"]
+
+
+def test_se_abre_tras_fallos_seguidos(monkeypatch):
+    registro, _ = _registro(monkeypatch)
+    registro.registrar("A", False, 1.0)
+    registro.registrar("A", False, 1.0)
+    assert _estado(registro) == CERRADO and registro.permitir("A")
+
+    registro.registrar("A", False, 1.0)
+    assert _estado(registro) == ABIERTO
+    assert not registro.permitir("A")
+    assert registro.estado()["A"]["omitidos"] == 1
+    assert registro.estado()["A"]["aperturas"] == 1
+
+
+def test_un_acierto_reinicia_los_fallos(monkeypatch):
+    registro, _ = _registro(monkeypatch)
+    for ok in (False, False, True, False, False):
+        registro.registrar("A", ok, 1.0)
+    assert _estado(registro) == CERRADO
+    assert registro.estado()["A"]["fallos_seguidos"] == 2
+
+
+def test_semiabierto_deja_pasar_una_sola_prueba(monkeypatch):
+    registro, reloj = _registro(monkeypatch)
+    for _ in range(3):
+        registro.registrar("A", False, 1.0)
+    reloj.ahora += 10
+    assert registro.reintento_en("A") == 20
+    assert not registro.permitir("A")
+
+    reloj.ahora += 20
+    assert registro.permitir("A")
+    assert _estado(registro) == SEMIABIERTO
+    assert not registro.permitir("A")
+
+    registro.registrar("A", True, 2.0)
+    assert _estado(registro) == CERRADO
+    assert registro.permitir("A")
+
+
+def test_prueba_fallida_reabre_el_circuito(monkeypatch):
+    registro, reloj = _registro(monkeypatch)
+    for _ in range(3):
+        registro.registrar("A", False, 1.0)
+    reloj.ahora += 30
+    assert registro.permitir("A")
+
+    registro.registrar("A", False, 1.0)
+    assert _estado(registro) == ABIERTO
+    assert registro.reintento_en("A") == 30
+    assert registro.estado()["A"]["aperturas"] == 2
+
+
+def test_abandonar_libera_la_prueba(monkeypatch):
+    registro, reloj = _registro(monkeypatch)
+    for _ in range(3):
+        registro.registrar("A", False, 1.0)
+    reloj.ahora += 30
+    assert registro.permitir("A")
+    assert not registro.permitir("A")
+
+    registro.abandonar("A")
+    assert registro.permitir("A")
+    assert _estado(registro) == SEMIABIERTO
+
+
+def test_resumen_y_reinicio(monkeypatch):
+    registro, _ = _registro(monkeypatch, ventana=4)
+    for ok, latencia in ((True, 1.0), (True, 3.0), (False, 9.0), (True, 2.0), (False, 5.0)):
+        registro.registrar("A", ok, latencia)
+    registro.registrar("B", True, 1.0)
+
+    resumen = registro.estado()["A"]
+    assert resumen["muestras"] == 4
+    assert resumen["tasa_error"] == 0.5
+    assert resumen["latencia_p50_s"] == 3.0
+
+    registro.reiniciar("A")
+    assert list(registro.estado()) == ["B"]
+    registro.reiniciar()
+    assert registro.estado() == {}
@@ -0,0 +1,99 @@
+import random
+
+from scrapers.sugerencias import MAX_SUGERENCIAS, TIPO_KEYWORD, TIPO_PRODUCTO, IndiceSugerencias
+from scrapers.texto import normalizar_keyword
+
+
+def _productos(*nombres) -> list:
+    return [{"Producto": nombre} for nombre in nombres]
+
+
+def test_prefijo_sin_acentos_ni_mayusculas():
+    indice = IndiceSugerencias(min_prefijo=2)
+    indice.registrar("Paracetamol", _productos("Panadol Antigripal", "Paracetamol 500mg"))
+    indice.registrar("jarabe", _productos("Jarabe para la tos"))
+
+    textos = [s["texto"] for s in indice.sugerir("PÁRA")]
+    assert sorted(textos) == ["Paracetamol", "Paracetamol 500mg"]
+    assert [s["texto"] for s in indice.sugerir("pan")] == ["Panadol Antigripal"]
+    assert indice.sugerir("zz") == []
+
+
+def test_prefijo_corto_no_sugiere():
+    indice = IndiceSugerencias(min_prefijo=3)
+    indice.registrar("paracetamol", _productos("Paracetamol 500mg"))
+    assert indice.sugerir("pa") == []
+    assert indice.sugerir("par")
+
+
+def test_sin_productos_no_registra():
+    indice = IndiceSugerencias(min_prefijo=2)
+    indice.registrar("paracetamol", [])
+    indice.registrar("  ", _productos("Paracetamol 500mg"))
+    assert len(indice) == 0
+
+
+def test_orden_por_popularidad_y_keywords_primero():
+    indice = IndiceSugerencias(min_prefijo=2)
+    indice.registrar("ibuprofeno", _productos("Ibuprofeno 400mg"))
+    indice.registrar("ibuprofeno", _productos("Ibuprofeno 400mg", "Ibuprofeno 600mg"))
+    indice.registrar("dolor", _productos("Ibuprofeno 600mg", "Ibupirac"))
+
+    sugerencias = indice.sugerir("ibu")
+    assert [(s["texto"], s["popularidad"]) for s in sugerencias] == [
+        ("ibuprofeno", 2), ("Ibuprofeno 400mg", 2), ("Ibuprofeno 600mg", 2), ("Ibupirac", 1),
+    ]
+    assert sugerencias[0]["tipo"] == TIPO_KEYWORD
+    assert sugerencias[1]["tipo"] == TIPO_PRODUCTO
+    # Cada producto sugiere el último keyword con el que apareció
+    assert sugerencias[2]["keyword"] == "dolor"
+
+
+def test_producto_buscado_pasa_a_keyword():
+    indice = IndiceSugerencias(min_prefijo=2)
+    indice.registrar("dolor", _productos("Panadol"))
+    indice.registrar("panadol", _productos("Panadol Forte"))
+
+    sugerencia = indice.sugerir("panadol", limite=1)[0]
+    assert (sugerencia["tipo"], sugerencia["keyword"], sugerencia["popularidad"]) == (TIPO_KEYWORD, "panadol", 2)
+
+
+def test_tops_incrementales_igual_a_recorrer_todo():
+    rng = random.Random(7)
+    palabras = ["para", "paracetamol", "pana", "panadol", "pasta", "pastilla", "pañal", "pa"]
+    indice = IndiceSugerencias(min_prefijo=1)
+    prefijos = ["p", "pa", "par", "pan", "pas", "pañ"]
+
+    for i in range(300):
+        keyword = rng.choice(palabras)
+        nombres = {f"{rng.choice(palabras)} {rng.randint(1, 30)}" for _ in range(rng.randint(1, 4))}
+        indice.registrar(keyword, _productos(*nombres))
+        if i % 25 == 0:
+            for prefijo in prefijos:
+                indice.sugerir(prefijo)  # deja los tops en memoria para que se actualicen al registrar
+
+    for prefijo in prefijos:
+        clave = normalizar_keyword(prefijo)
+        todas = [e for c, e in indice._entradas.items() if c.startswith(clave)]
+        esperado = sorted((e.orden() for e in todas), reverse=True)[:MAX_SUGERENCIAS]
+        obtenido = [e.orden() for e in indice._tops[clave]]
+        assert obtenido == esperado
+    assert indice.aciertos_tops > 0
+
+
+def test_desalojo_descarta_lo_menos_popular():
+    indice = IndiceSugerencias(max_entradas=10, min_prefijo=2)
+    for _ in range(5):
+        indice.registrar("aspirina", _productos("Aspirina 100mg"))
+    assert indice.sugerir("asp")  # top en memoria que debe invalidarse si pierde entradas
+    for i in range(10):
+        indice.registrar(f"producto {i:02d}", _productos(f"otro {i:02d}"))
+
+    assert len(indice) <= 10
+    assert indice.desalojos > 0
+    textos = [s["texto"] for s in indice.sugerir("asp")]
+    assert textos == ["aspirina", "Aspirina 100mg"]
+    # Los pesos se reducen a la mitad al desalojar
+    assert indice.sugerir("aspirina", limite=1)[0]["popularidad"] < 5
+    for top in indice._tops.values():
+        assert all(normalizar_keyword(e.texto) in indice._entradas for e in top)
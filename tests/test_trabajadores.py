@@ -0,0 +1,75 @@
+import asyncio
+import json
+
+from prometheus_client import REGISTRY
+
+from scrapers.metricas import medir_etapa, registrar_etapas
+from scrapers.trabajadores import ClienteTrabajadores, Despachador, _enviar
+
+
+class _DespachadorSinProcesos(Despachador):
+    """Despachador que no lanza procesos: el trabajador se conecta desde la prueba."""
+
+    async def _lanzar_trabajador(self):
+        pass
+
+
+async def _trabajador_falso(direccion: str, recibidos: list):
+    reader, writer = await asyncio.open_unix_connection(direccion)
+    await _enviar(writer, {"rol": "trabajador"})
+    while linea := await reader.readline():
+        mensaje = json.loads(linea)
+        recibidos.append(mensaje)
+        if "farmacia" in mensaje:
+            await _enviar(writer, {
+                "id": mensaje["id"],
+                "productos": [{"Producto": mensaje["keyword"], "Farmacia": mensaje["farmacia"]}],
+                "etapas": [[mensaje["farmacia"], "goto", 0.2]],
+            })
+
+
+def _cuenta_etapa(farmacia: str, etapa: str) -> float:
+    return REGISTRY.get_sample_value("scraper_etapa_segundos_sum", {"farmacia": farmacia, "etapa": etapa}) or 0.0
+
+
+def test_registrar_etapas_junta_solo_las_del_bloque():
+    with medir_etapa("Fuera", "goto"):
+        pass
+    with registrar_etapas() as etapas:
+        with medir_etapa("Inkafarma", "goto"):
+            pass
+    assert [(f, e) for f, e, _ in etapas] == [("Inkafarma", "goto")]
+
+
+def test_cliente_recibe_productos_etapas_y_reciclar_llega_a_los_trabajadores(tmp_path):
+    direccion = str(tmp_path / "trabajadores.sock")
+
+    async def probar():
+        despachador = _DespachadorSinProcesos(direccion, procesos=1)
+        corriendo = asyncio.create_task(despachador.correr())
+        while despachador._servidor is None:
+            await asyncio.sleep(0.01)
+        recibidos = []
+        trabajador = asyncio.create_task(_trabajador_falso(direccion, recibidos))
+        while not despachador._trabajadores:
+            await asyncio.sleep(0.01)
+
+        cliente = ClienteTrabajadores(direccion, procesos=1)
+        await cliente.iniciar()
+        antes = _cuenta_etapa("Pruebafarma", "goto")
+        productos = await cliente.scraper("Pruebafarma")("paracetamol", 5)
+        assert productos == [{"Producto": "paracetamol", "Farmacia": "Pruebafarma"}]
+        assert abs(_cuenta_etapa("Pruebafarma", "goto") - antes - 0.2) < 1e-9
+
+        await cliente.reciclar()
+        while not any(m.get("reciclar") for m in recibidos):
+            await asyncio.sleep(0.01)
+        assert despachador.estadisticas()["reciclajes"] == 1
+
+        await cliente.cerrar()
+        despachador.detener()
+        await corriendo
+        trabajador.cancel()
+        await asyncio.gather(trabajador, return_exceptions=True)
+
+    asyncio.run(asyncio.wait_for(probar(), 10))